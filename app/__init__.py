@@ -0,0 +1,6 @@
+from dotenv import load_dotenv
+
+# Load .env before any app module reads its settings with os.getenv at import
+# time (app.database reads DATABASE_URL, app.routers.auth reads SECRET_KEY).
+# Variables already set in the environment win.
+load_dotenv()
@@ -0,0 +1,319 @@
+"""Async counterparts of app.crud for the ASYNC_DB=1 request path.
+
+Function names and semantics mirror app.crud one-to-one; only the session type
+(AsyncSession) and the `await`s differ.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, models, rollups, schemas
+from app.cart_store import get_cart_store
+from app.database import SessionLocal
+from app.crud import PRODUCT_VALIDATOR_COLUMNS, cart_add_statement, product_columns
+from app.flash_sale import flash_sale
+from app.models import Order, OrderStatus, Product, CartItem
+from app.product_cache import product_cache
+from app.schemas import ProductCreate, ProductUpdate
+from app.search import get_search_backend
+
+
+# ---------------------- User CRUD ----------------------
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+
+# ---------------------- Product CRUD ----------------------
+
+async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, search: str = None):
+    query = select(Product)
+    if search:
+        query = get_search_backend().apply(query, search)
+    else:
+        query = query.order_by(Product.id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def get_products_after(db: AsyncSession, after_id: int | None = None, limit: int = 100, search: str = None):
+    query = select(Product)
+    if search:
+        query = get_search_backend().apply(query, search, ranked=False)
+    if after_id is not None:
+        query = query.where(Product.id > after_id)
+    result = await db.execute(query.order_by(Product.id).limit(limit + 1))
+    return result.scalars().all()
+
+async def get_product_rows(db: AsyncSession, skip: int = 0, limit: int = 100, search: str = None,
+                           fields: tuple = None):
+    """Column-projected page as dicts (sparse fieldsets, see app.fieldsets)."""
+    query = select(*product_columns(fields))
+    if search:
+        query = get_search_backend().apply(query, search)
+    else:
+        query = query.order_by(Product.id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [dict(row) for row in result.mappings()]
+
+async def get_product_rows_after(db: AsyncSession, after_id: int | None = None, limit: int = 100,
+                                 search: str = None, fields: tuple = None):
+    query = select(*product_columns(fields))
+    if search:
+        query = get_search_backend().apply(query, search, ranked=False)
+    if after_id is not None:
+        query = query.where(Product.id > after_id)
+    result = await db.execute(query.order_by(Product.id).limit(limit + 1))
+    return [dict(row) for row in result.mappings()]
+
+async def get_product(db: AsyncSession, product_id: int):
+    return await db.get(Product, product_id)
+
+async def get_product_validator(db: AsyncSession, product_id: int):
+    result = await db.execute(select(*PRODUCT_VALIDATOR_COLUMNS).where(Product.id == product_id))
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
+
+async def get_products_validator(db: AsyncSession, skip: int = 0, limit: int = 100, search: str = None):
+    query = select(*PRODUCT_VALIDATOR_COLUMNS)
+    if search:
+        query = get_search_backend().apply(query, search)
+    else:
+        query = query.order_by(Product.id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [dict(row) for row in result.mappings()]
+
+async def get_products_after_validator(db: AsyncSession, after_id: int | None = None, limit: int = 100,
+                                       search: str = None):
+    query = select(*PRODUCT_VALIDATOR_COLUMNS)
+    if search:
+        query = get_search_backend().apply(query, search, ranked=False)
+    if after_id is not None:
+        query = query.where(Product.id > after_id)
+    result = await db.execute(query.order_by(Product.id).limit(limit + 1))
+    return [dict(row) for row in result.mappings()]
+
+async def create_product(db: AsyncSession, product: ProductCreate):
+    db_product = Product(**product.model_dump())
+    db.add(db_product)
+    await db.flush()
+    await db.run_sync(lambda session: get_search_backend().index(session, db_product))
+    await db.commit()
+    product_cache.on_product_created(db_product.id)
+    return db_product
+
+async def update_product(db: AsyncSession, db_product: Product, updates: ProductUpdate):
+    update_data = updates.model_dump(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(db_product, key, value)
+    if "name" in update_data or "description" in update_data:
+        await db.flush()
+        await db.run_sync(lambda session: get_search_backend().index(session, db_product))
+    await db.commit()
+    await db.refresh(db_product)  # version is bumped in SQL, so it is not known until read back
+    if "stock" in update_data:
+        flash_sale.reset(db_product.id)
+    product_cache.on_product_changed(db_product.id)
+    return db_product
+
+async def delete_product(db: AsyncSession, db_product: Product):
+    product_id = db_product.id
+    await db.run_sync(lambda session: get_search_backend().remove(session, product_id))
+    await db.delete(db_product)
+    await db.commit()
+    flash_sale.disable(product_id, return_stock=False)
+    product_cache.on_product_deleted(product_id)
+
+
+# ---------------------- Cart CRUD ----------------------
+# With a write-behind cart store the cart calls run the sync app.crud versions in
+# the threadpool: a cold cart load opens a sync session and the store takes
+# threading locks, neither of which may block the event loop.
+
+async def _in_sync_session(fn, *args):
+    """Run the sync app.crud `fn` on its own sync session in the threadpool."""
+    def call():
+        with SessionLocal() as session:
+            return fn(session, *args)
+    return await run_in_threadpool(call)
+
+async def get_cart_items(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(CartItem)
+        .options(joinedload(CartItem.product))
+        .where(CartItem.user_id == user_id)
+    )
+    return result.scalars().all()
+
+async def get_cart_item(db: AsyncSession, user_id: int, product_id: int):
+    result = await db.execute(
+        select(CartItem)
+        .options(joinedload(CartItem.product))
+        .where(CartItem.user_id == user_id, CartItem.product_id == product_id)
+    )
+    return result.scalars().first()
+
+async def add_cart_item(db: AsyncSession, user_id: int, product_id: int, quantity: int = 1):
+    if get_cart_store() is not None:
+        return await _in_sync_session(crud.add_cart_item, user_id, product_id, quantity)
+    stmt = cart_add_statement(db)
+    if stmt is None:
+        return await _add_cart_item_orm(db, user_id, product_id, quantity)
+    row = (await db.execute(stmt, {"uid": user_id, "pid": product_id, "qty": quantity})).mappings().first()
+    if row is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Product not found")
+    await db.commit()
+    return schemas.CartItemOut(**row)
+
+async def _add_cart_item_orm(db: AsyncSession, user_id: int, product_id: int, quantity: int):
+    item = await get_cart_item(db, user_id, product_id)
+    product = await db.get(Product, product_id)
+
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    if item:
+        item.quantity += quantity
+        item.price = product.price
+    else:
+        item = CartItem(
+            user_id=user_id,
+            product_id=product_id,
+            quantity=quantity,
+            price=product.price
+        )
+        db.add(item)
+
+    await db.commit()
+    return schemas.CartItemOut(
+        id=item.id,
+        product_id=item.product_id,
+        quantity=item.quantity,
+        price=item.price,
+        product_name=product.name
+    )
+
+async def update_cart_item(db: AsyncSession, user_id: int, product_id: int, quantity: int):
+    if get_cart_store() is not None:
+        return await _in_sync_session(crud.update_cart_item, user_id, product_id, quantity)
+    item = await get_cart_item(db, user_id, product_id)
+    if item:
+        item.quantity = quantity
+        await db.commit()
+        return schemas.CartItemOut(
+            id=item.id, product_id=item.product_id, quantity=item.quantity, price=item.price,
+            product_name=item.product.name if item.product else None,
+        )
+    return None
+
+async def remove_cart_item(db: AsyncSession, user_id: int, product_id: int):
+    if get_cart_store() is not None:
+        return await _in_sync_session(crud.remove_cart_item, user_id, product_id)
+    item = await get_cart_item(db, user_id, product_id)
+    if item:
+        await db.delete(item)
+        await db.commit()
+
+async def apply_cart_batch(db: AsyncSession, user_id: int, operations: list[schemas.CartOperation]):
+    if get_cart_store() is not None:
+        return await _in_sync_session(crud.apply_cart_batch, user_id, operations)
+    # the bulk statements of crud.apply_cart_batch, run on the async connection
+    return await db.run_sync(crud.apply_cart_batch, user_id, operations)
+
+async def get_cart_rows(db: AsyncSession, user_id: int, fields: tuple = None):
+    if get_cart_store() is not None:
+        return await _in_sync_session(crud.get_cart_rows, user_id, fields)
+    # same query as crud.get_cart_rows, run on the async connection
+    return await db.run_sync(crud.get_cart_rows, user_id, fields)
+
+async def has_cart_items(db: AsyncSession, user_id: int) -> bool:
+    if get_cart_store() is not None:
+        return await _in_sync_session(crud.has_cart_items, user_id)
+    result = await db.execute(select(CartItem.id).where(CartItem.user_id == user_id).limit(1))
+    return result.first() is not None
+
+
+# ---------------------- Order CRUD ----------------------
+
+async def create_order(db: AsyncSession, user_id: int):
+    """Async twin of crud.create_order: one transaction, conditional stock reservation."""
+    store = get_cart_store()
+    if store is None:
+        return await _create_order(db, user_id)
+    # the flush before checkout commits through the sync engine; keep it off the event loop
+    await run_in_threadpool(store.begin_checkout, [user_id])
+    try:
+        return await _create_order(db, user_id, store)
+    finally:
+        store.end_checkout([user_id])
+
+async def _create_order(db: AsyncSession, user_id: int, store=None):
+    cart_items = await get_cart_items(db, user_id)
+    if not cart_items:
+        return None
+
+    quantities = crud.cart_quantities(cart_items)
+    ordered = {item.product_id: item.quantity for item in cart_items}
+    # refills write through the sync engine; keep them off the event loop
+    flash, regular = await _in_sync_session(crud.reserve_flash_stock, quantities)
+    try:
+        order = await db.run_sync(crud.write_order, user_id, cart_items, regular)
+        order_id = order.id
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await run_in_threadpool(flash_sale.release, flash)
+        if isinstance(e, crud.StockShortage):
+            raise await db.run_sync(crud.stock_shortage_error, e.quantities) from None
+        raise
+    product_cache.on_product_changed(*quantities)
+    if store is not None:
+        await run_in_threadpool(store.checked_out, user_id, ordered)
+    return await get_order(db, order_id)
+
+async def get_order_rows(db: AsyncSession, user_id: int | None = None, skip: int = 0, limit: int | None = None,
+                         fields: tuple = None):
+    return await db.run_sync(crud.get_order_rows, user_id, skip, limit, fields)
+
+async def get_order_rows_after(db: AsyncSession, user_id: int | None = None, after_id: int | None = None,
+                               limit: int = 100, fields: tuple = None):
+    return await db.run_sync(crud.get_order_rows_after, user_id, after_id, limit, fields)
+
+def _orders_with_items():
+    return select(Order).options(selectinload(Order.items))
+
+async def get_orders(db: AsyncSession, user_id: int, skip: int = 0, limit: int | None = None):
+    query = _orders_with_items().where(Order.user_id == user_id).order_by(Order.id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def get_orders_after(db: AsyncSession, user_id: int | None = None, after_id: int | None = None, limit: int = 100):
+    query = _orders_with_items()
+    if user_id is not None:
+        query = query.where(Order.user_id == user_id)
+    if after_id is not None:
+        query = query.where(Order.id > after_id)
+    result = await db.execute(query.order_by(Order.id).limit(limit + 1))
+    return result.scalars().all()
+
+async def get_order(db: AsyncSession, order_id: int):
+    result = await db.execute(_orders_with_items().where(Order.id == order_id))
+    return result.scalars().first()
+
+async def update_order_status(db: AsyncSession, order_id: int, status: OrderStatus):
+    order = await get_order(db, order_id)
+    if order:
+        previous = order.status
+        order.status = status
+        day = order.created_at.date() if order.created_at else None
+        await db.run_sync(rollups.move_order, order.id, day, previous, status)
+        await db.commit()
+    return order
+
+async def get_all_orders(db: AsyncSession, skip: int = 0, limit: int | None = None):
+    result = await db.execute(_orders_with_items().order_by(Order.id).offset(skip).limit(limit))
+    return result.scalars().all()
@@ -0,0 +1,160 @@
+"""Streaming NDJSON/CSV parsing and serialization for bulk catalog import/export.
+
+Parsing works on an async byte stream (the request body) and never holds more
+than one record plus the current chunk of validated rows in memory.
+"""
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Iterable
+
+from pydantic import ValidationError
+
+from app.schemas import ProductCreate
+from app.serialization import dumps
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+# Stop collecting per-row error details after this many (failures are still counted)
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", 1000))
+
+PRODUCT_EXPORT_FIELDS = ["id", "name", "description", "price", "image_url", "stock"]
+# CSV order export is one line per order item, with the order columns repeated
+ORDER_EXPORT_FIELDS = [
+    "order_id", "user_id", "status", "total_price", "created_at", "product_id", "quantity", "price",
+]
+
+
+def detect_format(content_type: str | None, explicit: str | None) -> str:
+    if explicit:
+        return explicit
+    if content_type and "csv" in content_type:
+        return "csv"
+    return "ndjson"
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Yield decoded lines (newline included) from a chunked byte stream."""
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig") + "\n"
+    if buffer:
+        yield buffer.decode("utf-8-sig")
+
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Yield (line_number, record, error) for each non-blank NDJSON line."""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, f"invalid JSON: {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Yield (line_number, record, error) for each CSV record after the header.
+
+    A record is complete once it contains an even number of quote characters,
+    which keeps quoted fields with embedded newlines intact.
+    """
+    header = None
+    pending = ""
+    line_number = 0
+    start_line = 1
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            start_line = line_number
+        pending += line
+        if pending.count('"') % 2:
+            continue
+        record_text, pending = pending, ""
+        if not record_text.strip():
+            continue
+        values = next(csv.reader(io.StringIO(record_text)))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start_line, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield start_line, {k: (v if v != "" else None) for k, v in zip(header, values)}, None
+    if pending.strip():
+        yield start_line, None, "unterminated quoted field"
+
+
+def validate_product_row(record: dict) -> tuple[dict | None, list | None]:
+    """Validate one import record against ProductCreate; returns (row, errors).
+
+    An optional integer `id` makes the row an upsert of that product.
+    """
+    try:
+        product = ProductCreate.model_validate(record)
+    except ValidationError as e:
+        return None, [{"field": ".".join(map(str, err["loc"])), "error": err["msg"]} for err in e.errors()]
+    row = product.model_dump()
+    if record.get("id") not in (None, ""):
+        try:
+            row["id"] = int(record["id"])
+        except (TypeError, ValueError):
+            return None, [{"field": "id", "error": "value is not a valid integer"}]
+    return row, None
+
+
+# Flush serialized rows to the client in ~64 KB pieces rather than per row
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+
+def ndjson_lines(rows: Iterable[dict]) -> Iterable[bytes]:
+    parts, size = [], 0
+    for row in rows:
+        line = dumps(row) + b"\n"
+        parts.append(line)
+        size += len(line)
+        if size >= EXPORT_FLUSH_BYTES:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def csv_lines(rows: Iterable[dict], fields: list[str]) -> Iterable[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_FLUSH_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def flatten_order_items(orders: Iterable[dict]) -> Iterable[dict]:
+    """Turn nested export orders into one flat row per item (ORDER_EXPORT_FIELDS)."""
+    for order in orders:
+        base = {
+            "order_id": order["id"],
+            "user_id": order["user_id"],
+            "status": order["status"],
+            "total_price": order["total_price"],
+            "created_at": order["created_at"],
+        }
+        if not order["items"]:
+            yield base
+        for item in order["items"]:
+            yield {**base, **item}
@@ -0,0 +1,492 @@
+"""Write-behind cart storage.
+
+Carts change far more often than they are checked out. With CART_STORE=memory,
+cart reads and writes go to an in-process copy of each cart and only reach
+`cart_items` in the background. The flusher runs every CART_FLUSH_INTERVAL
+seconds and writes every changed cart in one transaction. Carts are also
+flushed at shutdown, and checkout flushes the user's cart before reading it.
+A crash loses at most the last interval's cart edits. It never loses orders.
+
+The default is CART_STORE=sql, which turns the store off: every cart change
+commits to `cart_items` directly. An in-process store only fits a
+single-worker deployment, because each worker would hold its own copy of a
+cart.
+
+A cart is loaded from `cart_items` the first time it is touched. Clean carts
+are dropped in LRU order beyond CART_STORE_SIZE. A cart stays pinned while
+it is dirty or being flushed. Line ids come from the database: a new line has
+id None until its first flush, which matches rows on (user_id, product_id).
+
+CART_STORE=kv keeps carts in a key-value store instead. The store must
+provide GET/SET/DELETE/SADD/SREM/SMEMBERS; a `redis.Redis` client fits.
+`LocalKeyValueClient` is an in-process stand-in with the same interface.
+Pass a real client with `set_cart_store(WriteBehindCartStore(KeyValueCarts(client)))`.
+The per-cart locks are still per process.
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy import bindparam, select
+
+from app.models import CartItem
+from app.serialization import dumps
+
+CART_STORE = os.getenv("CART_STORE", "sql")  # sql | memory | kv
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", 2))
+CART_STORE_SIZE = int(os.getenv("CART_STORE_SIZE", 100000))
+
+logger = logging.getLogger("app.cart_store")
+
+_cart_items = CartItem.__table__
+_LOCK_STRIPES = 256
+_FLUSH_CHUNK = 500
+
+
+# ---------------------- Cart backends ----------------------
+
+class CartBackend:
+    """Where live carts are kept between flushes.
+
+    A cart is a dict of product_id -> line, where a line is a dict with id
+    (None until flushed), product_id, quantity and price. Callers hold the
+    cart's lock around get/put, and they put back every cart they change.
+    """
+
+    def get(self, user_id: int) -> dict | None:
+        raise NotImplementedError
+
+    def put(self, user_id: int, lines: dict) -> None:
+        raise NotImplementedError
+
+    def mark_dirty(self, *user_ids: int) -> None:
+        raise NotImplementedError
+
+    def dirty(self) -> set:
+        raise NotImplementedError
+
+    def take_dirty(self, user_ids) -> set:
+        """Clear the dirty mark of `user_ids` and pin them; returns the ones that had it."""
+        raise NotImplementedError
+
+    def release(self, user_ids) -> None:
+        """Unpin carts taken by take_dirty once their flush has committed or been re-marked."""
+
+    def size(self) -> int | None:
+        """Carts held, or None if the backend cannot tell cheaply."""
+        return None
+
+
+class MemoryCarts(CartBackend):
+    """Carts as plain dicts in this process, clean ones evicted in LRU order."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._carts: OrderedDict = OrderedDict()
+        self._dirty: set = set()
+        self._pinned: set = set()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> dict | None:
+        with self._lock:
+            lines = self._carts.get(user_id)
+            if lines is not None:
+                self._carts.move_to_end(user_id)
+            return lines
+
+    def put(self, user_id: int, lines: dict) -> None:
+        with self._lock:
+            self._carts[user_id] = lines
+            self._carts.move_to_end(user_id)
+            excess = len(self._carts) - self.maxsize
+            if excess > 0:
+                stale = []
+                for uid in self._carts:  # oldest first; dirty and flushing carts stay
+                    if len(stale) == excess:
+                        break
+                    if uid not in self._dirty and uid not in self._pinned:
+                        stale.append(uid)
+                for uid in stale:
+                    del self._carts[uid]
+
+    def mark_dirty(self, *user_ids: int) -> None:
+        with self._lock:
+            self._dirty.update(user_ids)
+
+    def dirty(self) -> set:
+        with self._lock:
+            return set(self._dirty)
+
+    def take_dirty(self, user_ids) -> set:
+        with self._lock:
+            taken = self._dirty.intersection(user_ids)
+            self._dirty -= taken
+            self._pinned |= taken
+            return taken
+
+    def release(self, user_ids) -> None:
+        with self._lock:
+            self._pinned.difference_update(user_ids)
+
+    def size(self) -> int | None:
+        return len(self._carts)
+
+
+class LocalKeyValueClient:
+    """In-process stand-in for the Redis commands KeyValueCarts uses."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, value, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and key in self._data:
+                return False
+            self._data[key] = value if isinstance(value, bytes) else str(value).encode()
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def sadd(self, key: str, *members) -> int:
+        with self._lock:
+            members = {str(member).encode() for member in members}
+            current = self._data.setdefault(key, set())
+            added = len(members - current)
+            current.update(members)
+            return added
+
+    def srem(self, key: str, *members) -> int:
+        with self._lock:
+            current = self._data.get(key, set())
+            members = {str(member).encode() for member in members}
+            removed = len(members & current)
+            current -= members
+            return removed
+
+    def smembers(self, key: str) -> set:
+        with self._lock:
+            return set(self._data.get(key, set()))
+
+
+class KeyValueCarts(CartBackend):
+    """Carts serialized as JSON under cart:<user_id> in a key-value store."""
+
+    def __init__(self, client, prefix: str = "cart"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def get(self, user_id: int) -> dict | None:
+        raw = self.client.get(self._key(user_id))
+        if raw is None:
+            return None
+        return {line["product_id"]: line for line in json.loads(raw)}
+
+    def put(self, user_id: int, lines: dict) -> None:
+        self.client.set(self._key(user_id), dumps(list(lines.values())))
+
+    def mark_dirty(self, *user_ids: int) -> None:
+        if user_ids:
+            self.client.sadd(f"{self.prefix}:dirty", *user_ids)
+
+    def dirty(self) -> set:
+        return {int(member) for member in self.client.smembers(f"{self.prefix}:dirty")}
+
+    def take_dirty(self, user_ids) -> set:
+        return {user_id for user_id in user_ids if self.client.srem(f"{self.prefix}:dirty", user_id)}
+
+
+# ---------------------- Write-behind store ----------------------
+
+class WriteBehindCartStore:
+    def __init__(self, backend: CartBackend, flush_interval: float = CART_FLUSH_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._sessions = None
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        # users whose cart is being written to cart_items / checked out right now
+        self._flushing: set = set()
+        self._checkouts: Counter = Counter()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.flushes = 0
+        self.flushed_carts = 0
+        self.flush_errors = 0
+
+    def bind(self, session_factory) -> None:
+        """Use `session_factory` for cart loads and flushes (defaults to app.database.SessionLocal)."""
+        self._sessions = session_factory
+
+    def _session(self):
+        if self._sessions is None:
+            from app.database import SessionLocal
+            self._sessions = SessionLocal
+        return self._sessions()
+
+    def _lock(self, user_id: int) -> threading.Lock:
+        return self._locks[hash(user_id) % _LOCK_STRIPES]
+
+    def _load(self, user_id: int) -> dict:
+        """The live cart; call with the cart's lock held. Reads cart_items on a miss."""
+        lines = self.backend.get(user_id)
+        if lines is None:
+            # own short session: the caller's may hold a snapshot older than the last checkout
+            db = self._session()
+            try:
+                rows = db.execute(
+                    select(_cart_items.c.id, _cart_items.c.product_id, _cart_items.c.quantity, _cart_items.c.price)
+                    .where(_cart_items.c.user_id == user_id)
+                    .order_by(_cart_items.c.id)
+                ).mappings().all()
+            finally:
+                db.close()
+            lines = {row["product_id"]: dict(row) for row in rows}
+            self.backend.put(user_id, lines)
+        return lines
+
+    # ---- cart access ----
+
+    def lines(self, user_id: int) -> list[dict]:
+        """A copy of the user's cart lines, oldest first."""
+        with self._lock(user_id):
+            return [dict(line) for line in self._load(user_id).values()]
+
+    def update(self, user_id: int, change):
+        """Run `change(lines)` on the live cart and return its result.
+
+        `change` edits the product_id -> line dict in place; new lines get
+        id None. It returns None when it changed nothing. It must validate
+        before editing: an exception can leave a half-applied change in memory.
+        """
+        with self._lock(user_id):
+            lines = self._load(user_id)
+            result = change(lines)
+            if result is not None:
+                self.backend.put(user_id, lines)
+                self.backend.mark_dirty(user_id)
+            return result
+
+    # ---- checkout ----
+
+    def begin_checkout(self, user_ids) -> None:
+        """Flush these carts now and keep the background flusher off them until end_checkout.
+
+        Otherwise a flush holding an older snapshot could write checked-out lines back.
+        """
+        with self._cond:
+            self._checkouts.update(user_ids)
+        self._flush(user_ids, wait=True)
+
+    def checked_out(self, user_id: int, ordered: dict) -> None:
+        """Take an order's lines (product_id -> quantity) out of the cart; call after it committed.
+
+        Quantity added to a line while the order was being written stays in the cart.
+        """
+        with self._lock(user_id):
+            lines = self.backend.get(user_id)
+            if lines is None:
+                return
+            for product_id, quantity in ordered.items():
+                line = lines.get(product_id)
+                if line is not None:
+                    line["quantity"] -= quantity
+                    if line["quantity"] <= 0:
+                        del lines[product_id]
+            self.backend.put(user_id, lines)
+
+    def end_checkout(self, user_ids) -> None:
+        with self._cond:
+            self._checkouts.subtract(user_ids)
+            self._checkouts += Counter()  # drop zero counts
+
+    @contextmanager
+    def checkout(self, user_ids):
+        self.begin_checkout(user_ids)
+        try:
+            yield
+        finally:
+            self.end_checkout(user_ids)
+
+    # ---- flushing ----
+
+    def _claim(self, user_ids, wait: bool) -> list[int]:
+        with self._cond:
+            if wait:
+                while self._flushing.intersection(user_ids):
+                    self._cond.wait()
+                claimed = set(user_ids)
+            else:
+                claimed = {uid for uid in user_ids if uid not in self._flushing and not self._checkouts[uid]}
+            self._flushing |= claimed
+            return sorted(claimed)
+
+    def _release(self, user_ids) -> None:
+        with self._cond:
+            self._flushing.difference_update(user_ids)
+            self._cond.notify_all()
+
+    def _flush(self, user_ids, wait: bool) -> int:
+        claimed = self._claim(user_ids, wait)
+        if not claimed:
+            return 0
+        dirty = set()
+        try:
+            dirty = self.backend.take_dirty(claimed)
+            if not dirty:
+                return 0
+            carts = {}
+            for user_id in sorted(dirty):
+                with self._lock(user_id):
+                    lines = self.backend.get(user_id)
+                    if lines is not None:
+                        carts[user_id] = {product_id: dict(line) for product_id, line in lines.items()}
+            db = self._session()
+            try:
+                ids = {}
+                users = sorted(carts)
+                for start in range(0, len(users), _FLUSH_CHUNK):
+                    ids.update(self._write(db, {user_id: carts[user_id] for user_id in users[start:start + _FLUSH_CHUNK]}))
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.backend.mark_dirty(*dirty)
+                self.flush_errors += 1
+                raise
+            finally:
+                db.close()
+            self._assign_ids(carts, ids)
+            self.flushes += 1
+            self.flushed_carts += len(carts)
+            return len(carts)
+        finally:
+            self.backend.release(dirty)
+            self._release(claimed)
+
+    @staticmethod
+    def _write(db, carts: dict) -> dict:
+        """Make cart_items match `carts` (user_id -> lines); returns (user_id, product_id) -> row id.
+
+        Rows are matched on (user_id, product_id), so the database assigns
+        every id and a stale id held in memory is never written.
+        """
+        def existing():
+            return {
+                (row.user_id, row.product_id): row.id
+                for row in db.execute(
+                    select(_cart_items.c.id, _cart_items.c.user_id, _cart_items.c.product_id)
+                    .where(_cart_items.c.user_id.in_(list(carts)))
+                )
+            }
+
+        rows = existing()
+        deletes = [row_id for (user_id, product_id), row_id in rows.items() if product_id not in carts[user_id]]
+        updates, inserts = [], []
+        for user_id, lines in carts.items():
+            for product_id, line in lines.items():
+                values = {"quantity": line["quantity"], "price": line["price"]}
+                if (user_id, product_id) in rows:
+                    updates.append({"line_id": rows[user_id, product_id], **values})
+                else:
+                    inserts.append({"user_id": user_id, "product_id": product_id, **values})
+        if deletes:
+            db.execute(_cart_items.delete().where(_cart_items.c.id.in_(deletes)))
+        if updates:
+            db.execute(
+                _cart_items.update()
+                .where(_cart_items.c.id == bindparam("line_id"))
+                .values(quantity=bindparam("quantity"), price=bindparam("price")),
+                updates,
+            )
+        if inserts:
+            db.execute(_cart_items.insert(), inserts)
+            return existing()
+        return rows
+
+    def _assign_ids(self, carts: dict, ids: dict) -> None:
+        """Give flushed lines their row ids, unless the line was removed and re-added since."""
+        for user_id, flushed in carts.items():
+            with self._lock(user_id):
+                lines = self.backend.get(user_id)
+                if lines is None:
+                    continue
+                changed = False
+                for product_id, line in lines.items():
+                    row_id = ids.get((user_id, product_id))
+                    if row_id is not None and product_id in flushed and line["id"] != row_id:
+                        line["id"] = row_id
+                        changed = True
+                if changed:
+                    self.backend.put(user_id, lines)
+
+    def flush(self, wait: bool = False) -> int:
+        """Write every changed cart to cart_items; returns how many were written.
+
+        With wait=False (the background flusher) carts that are being checked
+        out or flushed elsewhere are skipped until the next round.
+        """
+        return self._flush(self.backend.dirty(), wait)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="cart-flusher", daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.flush(wait=True)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # the carts stay dirty and are retried next round
+                logger.exception("cart flush failed")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "carts": self.backend.size(),
+            "dirty": len(self.backend.dirty()),
+            "flushes": self.flushes,
+            "flushed_carts": self.flushed_carts,
+            "flush_errors": self.flush_errors,
+        }
+
+
+def _from_env() -> WriteBehindCartStore | None:
+    if CART_STORE == "memory":
+        return WriteBehindCartStore(MemoryCarts(CART_STORE_SIZE))
+    if CART_STORE == "kv":
+        return WriteBehindCartStore(KeyValueCarts(LocalKeyValueClient()))
+    return None
+
+
+_store = _from_env()
+
+
+def set_cart_store(store: WriteBehindCartStore | None) -> None:
+    global _store
+    _store = store
+
+
+def get_cart_store() -> WriteBehindCartStore | None:
+    """The active write-behind store, or None when carts are written straight to SQL."""
+    return _store
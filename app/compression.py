@@ -0,0 +1,158 @@
+"""Response compression as ASGI middleware: brotli when the client accepts it and
+the `brotli` package is installed (`pip install brotli`), gzip otherwise.
+
+    COMPRESSION_ENABLED=1          turn compression on/off
+    COMPRESSION_MIN_SIZE=1024      smaller bodies are sent as they are
+    COMPRESSION_ENCODINGS=br,gzip  server preference, first one the client accepts wins
+    COMPRESSION_GZIP_LEVEL=6
+    COMPRESSION_BROTLI_QUALITY=4   low qualities are fast enough for dynamic responses
+
+Only text-like types (JSON, NDJSON, CSV, text/*) are compressed. Streaming
+responses such as the exports are buffered up to the threshold and then
+compressed chunk by chunk. The compressed body is a different byte sequence,
+so a strong ETag is sent as weak (as nginx does). app.conditional compares
+ETags weakly, so If-None-Match still matches.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_ENCODINGS = tuple(
+    name.strip() for name in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",") if name.strip()
+)
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+
+_COMPRESSIBLE = (b"application/json", b"application/x-ndjson", b"text/")
+
+
+def _accepted(scope) -> set:
+    for name, value in scope["headers"]:
+        if name == b"accept-encoding":
+            accepted = set()
+            for part in value.decode("latin-1").lower().split(","):
+                coding, _, params = part.strip().partition(";")
+                if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                    accepted.add(coding.strip())
+            return accepted
+    return set()
+
+
+def choose_encoding(scope, encodings: tuple = COMPRESSION_ENCODINGS) -> str | None:
+    accepted = _accepted(scope)
+    for coding in encodings:
+        if coding == "br" and brotli is None:
+            continue
+        if coding in accepted or "*" in accepted:
+            return coding
+    return None
+
+
+class _Compressor:
+    def __init__(self, coding: str):
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        # SYNC_FLUSH so every streamed chunk reaches the client without waiting for more
+        return self._brotli.flush() if self._brotli else self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(scope)
+
+        start = None
+        buffered = []
+        size = 0
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, size, compressor
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                eligible = (
+                    message["status"] not in (204, 304)
+                    and b"content-encoding" not in headers
+                    and content_type.startswith(_COMPRESSIBLE)
+                )
+                if not eligible:
+                    await send(message)
+                    start = False
+                    return
+                start = message
+                start["headers"] = [(k, v) for k, v in message.get("headers", []) if k != b"vary"] + [
+                    (b"vary", _vary(headers.get(b"vary")))
+                ]
+                if coding is None:
+                    await send(start)
+                    start = False
+                return
+            if start is False:  # passing through
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                buffered.append(body)
+                size += len(body)
+                if size < self.min_size:
+                    if more:
+                        return
+                    # complete and too small: send it as it is
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(buffered)})
+                    return
+                compressor = _Compressor(coding)
+                await send(_compressed_start(start, coding))
+                body = b"".join(buffered)
+                buffered.clear()
+            data = compressor.compress(body) + (compressor.flush() if more else compressor.finish())
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _vary(existing: bytes | None) -> bytes:
+    if not existing:
+        return b"Accept-Encoding"
+    if b"accept-encoding" in existing.lower():
+        return existing
+    return existing + b", Accept-Encoding"
+
+
+def _compressed_start(start: dict, coding: str) -> dict:
+    headers = []
+    for name, value in start["headers"]:
+        if name == b"content-length":
+            continue
+        if name == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        headers.append((name, value))
+    headers.append((b"content-encoding", coding.encode()))
+    return {**start, "headers": headers}
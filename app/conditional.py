@@ -0,0 +1,105 @@
+"""Conditional GET for catalog reads: ETag / Last-Modified validators and Cache-Control.
+
+Every write to a product row bumps `products.version` and `updated_at`, both
+in the ORM and in Core UPDATEs (see the column defaults on models.Product). A
+single product's ETag is its id and version. A list page's ETag is a hash of
+the page parameters and the (id, version) pairs on the page. Neither one needs
+the response body to be serialized. Flash-sale allocations change the stock a
+product read shows without writing the row, so for those products the escrow
+count is part of the version, and no Last-Modified is sent. The routes check `If-None-Match` (or
+`If-Modified-Since` when no ETag is sent) against a validator query that only
+reads id/version/updated_at, or against the product cache, and answer 304
+before the full rows are loaded.
+
+List pages only send an ETag. The newest `updated_at` on a page does not move
+when a product is deleted from it, or when a row with an older stamp lands on
+it, so a Last-Modified for a page could turn a stale copy into a 304. The
+page ETag covers the ids on the page and changes in both cases.
+
+The Cache-Control value of each route is set by an environment variable:
+
+    CACHE_CONTROL_PRODUCT_LIST    GET /products             (default: public, max-age=0, must-revalidate)
+    CACHE_CONTROL_PRODUCT_DETAIL  GET /products/{id}        (default: public, max-age=0, must-revalidate)
+
+An empty value leaves the header off.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+from app.flash_sale import flash_sale
+
+_REVALIDATE = "public, max-age=0, must-revalidate"
+
+CACHE_CONTROL = {
+    "products.list": os.getenv("CACHE_CONTROL_PRODUCT_LIST", _REVALIDATE),
+    "products.detail": os.getenv("CACHE_CONTROL_PRODUCT_DETAIL", _REVALIDATE),
+}
+
+
+def _field(row, name: str):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _version(row) -> str:
+    escrow = flash_sale.escrowed(_field(row, "id"))
+    return f'{_field(row, "version")}e{escrow}' if escrow else str(_field(row, "version"))
+
+
+def product_etag(product) -> str:
+    """Strong ETag of one product (a row dict or ORM instance)."""
+    return f'"p{_field(product, "id")}v{_version(product)}"'
+
+
+def product_modified(product) -> datetime | None:
+    """Last-Modified of one product; None in flash-sale mode, where allocations do not move updated_at."""
+    return None if flash_sale.is_active(_field(product, "id")) else _field(product, "updated_at")
+
+
+def page_etag(key: tuple, rows, next_cursor: str | None = None) -> str:
+    """Strong ETag of a list page; `key` holds every parameter that shapes the page."""
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=12)
+    for row in rows:
+        digest.update(f"{_field(row, 'id')}:{_version(row)};".encode())
+    if next_cursor:
+        digest.update(next_cursor.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _http_date(stamp: datetime) -> str:
+    # updated_at is stored as naive UTC (datetime.utcnow)
+    return format_datetime(stamp.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, modified: datetime | None = None) -> bool:
+    """True when the client's copy is current (RFC 9110: If-None-Match wins over If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def cache_headers(route: str, etag: str, modified: datetime | None = None) -> dict:
+    headers = {"ETag": etag}
+    if modified is not None:
+        headers["Last-Modified"] = _http_date(modified)
+    if CACHE_CONTROL.get(route):
+        headers["Cache-Control"] = CACHE_CONTROL[route]
+    return headers
+
+
+def not_modified(route: str, etag: str, modified: datetime | None = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(route, etag, modified))
@@ -1,7 +1,15 @@
+from datetime import datetime
+
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app import models, schemas
+from sqlalchemy import Integer, String, bindparam, func, literal_column, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app import models, rollups, schemas
+from app.cache import MISSING
+from app.cart_store import get_cart_store
+from app.flash_sale import flash_sale
+from app.pagination import split_page
+from app.product_cache import CachedPage, product_cache
+from app.search import get_search_backend
 from app.utils import hash_password
 from app.models import Order, OrderItem, OrderStatus, Product, CartItem
 from app.schemas import ProductCreate, ProductUpdate
@@ -9,8 +17,9 @@ from app.schemas import ProductCreate, ProductUpdate
 
 # ---------------------- User CRUD ----------------------
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_pw = hash_password(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str | None = None):
+    """Create a user; pass `hashed_password` when the caller already hashed it."""
+    hashed_pw = hashed_password or hash_password(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -25,46 +34,307 @@ def create_user(db: Session, user: schemas.UserCreate):
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
+def update_user_password(db: Session, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    db.commit()
+    return db_user
+
 
 # ---------------------- Product CRUD ----------------------
 
-def get_products(db: Session, skip: int = 0, limit: int = 100, search: str = None):
-    query = db.query(Product)
+# Column order of the product list fast path; the same fields as ProductOut
+PRODUCT_COLUMNS = (
+    Product.id, Product.name, Product.description, Product.price, Product.image_url, Product.stock,
+    Product.version, Product.updated_at,
+)
+# Just enough to build ETag / Last-Modified for a product or page (app.conditional)
+PRODUCT_VALIDATOR_COLUMNS = (Product.id, Product.version, Product.updated_at)
+
+def product_columns(fields: tuple | None = None) -> tuple:
+    """PRODUCT_COLUMNS narrowed to a sparse fieldset (app.fieldsets); the validator columns always stay."""
+    if fields is None:
+        return PRODUCT_COLUMNS
+    wanted = set(fields).union(column.key for column in PRODUCT_VALIDATOR_COLUMNS)
+    return tuple(column for column in PRODUCT_COLUMNS if column.key in wanted)
+
+def _products_page(query, skip: int, limit: int, search: str | None):
     if search:
-        search = f"%{search.lower()}%"
-        query = query.filter(or_(
-            Product.name.ilike(search),
-            Product.description.ilike(search)
-        ))
-    return query.offset(skip).limit(limit).all()
+        # ranked by relevance; see app.search for the index backends
+        query = get_search_backend().apply(query, search)
+    else:
+        query = query.order_by(Product.id)
+    return query.offset(skip).limit(limit)
+
+def _products_after(query, after_id: int | None, limit: int, search: str | None):
+    if search:
+        query = get_search_backend().apply(query, search, ranked=False)
+    if after_id is not None:
+        query = query.filter(Product.id > after_id)
+    return query.order_by(Product.id).limit(limit + 1)
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, search: str = None):
+    return _products_page(db.query(Product), skip, limit, search).all()
+
+def get_products_after(db: Session, after_id: int | None = None, limit: int = 100, search: str = None):
+    """Keyset page of products ordered by id; fetches `limit + 1` rows so the caller can tell if more exist."""
+    return _products_after(db.query(Product), after_id, limit, search).all()
+
+def get_product_rows(db: Session, skip: int = 0, limit: int = 100, search: str = None, fields: tuple = None):
+    """Same page as get_products, as plain dicts read straight from column tuples."""
+    query = db.query(*product_columns(fields))
+    return [row._asdict() for row in _products_page(query, skip, limit, search)]
+
+def get_product_rows_after(db: Session, after_id: int | None = None, limit: int = 100, search: str = None,
+                           fields: tuple = None):
+    query = db.query(*product_columns(fields))
+    return [row._asdict() for row in _products_after(query, after_id, limit, search)]
+
+def get_product_row(db: Session, product_id: int):
+    row = db.query(*PRODUCT_COLUMNS).filter(Product.id == product_id).first()
+    return row._asdict() if row is not None else None
 
 def get_product(db: Session, product_id: int):
     return db.query(Product).filter(Product.id == product_id).first()
 
 def create_product(db: Session, product: ProductCreate):
-    db_product = Product(**product.dict())
+    db_product = Product(**product.model_dump())
     db.add(db_product)
+    db.flush()
+    get_search_backend().index(db, db_product)
     db.commit()
     db.refresh(db_product)
+    product_cache.on_product_created(db_product.id)
     return db_product
 
 def update_product(db: Session, db_product: Product, updates: ProductUpdate):
-    update_data = updates.dict(exclude_unset=True)
+    update_data = updates.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_product, key, value)
+    if "name" in update_data or "description" in update_data:
+        db.flush()
+        get_search_backend().index(db, db_product)
     db.commit()
     db.refresh(db_product)
+    if "stock" in update_data:
+        # an absolute stock value supersedes whatever a flash sale holds in escrow
+        flash_sale.reset(db_product.id)
+    product_cache.on_product_changed(db_product.id)
     return db_product
 
 def delete_product(db: Session, db_product: Product):
+    product_id = db_product.id
+    get_search_backend().remove(db, product_id)
     db.delete(db_product)
     db.commit()
+    flash_sale.disable(product_id, return_stock=False)
+    product_cache.on_product_deleted(product_id)
+
+
+# ---------------------- Bulk Product Import/Export ----------------------
+
+_PRODUCT_UPSERT_COLUMNS = ("name", "description", "price", "image_url", "stock")
+
+def _product_upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise HTTPException(status_code=400, detail=f"Upsert by id is not supported on {dialect}")
+    stmt = insert(Product.__table__)
+    # ON CONFLICT DO UPDATE does not apply column onupdate defaults; bump the version here
+    return stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={
+            **{column: stmt.excluded[column] for column in _PRODUCT_UPSERT_COLUMNS},
+            "version": Product.__table__.c.version + 1,
+            "updated_at": datetime.utcnow(),
+        }
+    )
+
+def bulk_upsert_products(db: Session, rows: list[dict]):
+    """Write one chunk of validated import rows with a single commit.
+
+    Rows carrying an `id` are upserted, the rest inserted. Returns (inserted, updated).
+    """
+    new_rows = [row for row in rows if "id" not in row]
+    upserts = [row for row in rows if "id" in row]
+    max_id_before = db.query(func.max(Product.id)).scalar() or 0
+    existing = set()
+    try:
+        if new_rows:
+            db.execute(Product.__table__.insert(), new_rows)
+        if upserts:
+            upsert_ids = [row["id"] for row in upserts]
+            existing = {pid for (pid,) in db.query(Product.id).filter(Product.id.in_(upsert_ids))}
+            db.execute(_product_upsert_statement(db), upserts)
+        touched = {row["id"] for row in upserts}
+        touched.update(pid for (pid,) in db.query(Product.id).filter(Product.id > max_id_before))
+        get_search_backend().index_many(db, sorted(touched))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    flash_sale.reset(*(row["id"] for row in upserts))
+    # a bulk write touches arbitrary pages; start the catalog cache over
+    product_cache.clear()
+    return len(rows) - len(existing), len(existing)
+
+def iter_product_rows(db: Session, batch_size: int = 1000):
+    """Stream every product as a dict using a server-side cursor."""
+    query = (
+        db.query(*PRODUCT_COLUMNS)
+        .order_by(Product.id)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        yield row._asdict()
+
+
+# ---------------------- Cached catalog reads ----------------------
+# Read paths for GET /products; return product row dicts from app.product_cache.
+
+def get_product_cached(db: Session, product_id: int):
+    cached = product_cache.get_product(product_id)
+    if cached is not MISSING:
+        return cached
+    generation = product_cache.generation
+    product = get_product_row(db, product_id)
+    if product is None:
+        return None
+    product_cache.put_product(product, generation)
+    return product
+
+def get_products_cached_by_id(db: Session, product_ids) -> dict:
+    """product_id -> cached row, or None when it does not exist. The misses are read with one IN query."""
+    products, missing = {}, []
+    for product_id in set(product_ids):
+        cached = product_cache.get_product(product_id)
+        if cached is MISSING:
+            missing.append(product_id)
+        else:
+            products[product_id] = cached
+    if missing:
+        generation = product_cache.generation
+        for row in db.query(*PRODUCT_COLUMNS).filter(Product.id.in_(missing)):
+            product = row._asdict()
+            product_cache.put_product(product, generation)
+            products[product["id"]] = product
+    return {product_id: products.get(product_id) for product_id in product_ids}
+
+def get_products_cached(db: Session, skip: int = 0, limit: int = 100, fields: tuple = None):
+    """A cached page of full rows; on a miss with `fields`, an uncached projection of just those columns."""
+    key = ("offset", skip, limit)
+    cached = product_cache.get_page(key)
+    if cached is not MISSING:
+        return list(cached.items)
+    if fields is not None:
+        return get_product_rows(db, skip=skip, limit=limit, fields=fields)
+    generation = product_cache.generation
+    items = get_product_rows(db, skip=skip, limit=limit)
+    product_cache.put_page(key, CachedPage(
+        items=tuple(items),
+        ids=frozenset(p["id"] for p in items),
+        last_id=items[-1]["id"] if items else None,
+        full=len(items) == limit,
+        offset_mode=True,
+    ), generation)
+    return items
+
+def get_products_after_cached(db: Session, after_id: int | None = None, limit: int = 100, fields: tuple = None):
+    """Cached keyset page; returns (items, next_cursor). `fields` as in get_products_cached."""
+    key = ("cursor", after_id, limit)
+    cached = product_cache.get_page(key)
+    if cached is not MISSING:
+        return list(cached.items), cached.next_cursor
+    if fields is not None:
+        return split_page(get_product_rows_after(db, after_id=after_id, limit=limit, fields=fields), limit)
+    generation = product_cache.generation
+    items, next_cursor = split_page(get_product_rows_after(db, after_id=after_id, limit=limit), limit)
+    product_cache.put_page(key, CachedPage(
+        items=tuple(items),
+        ids=frozenset(p["id"] for p in items),
+        last_id=items[-1]["id"] if items else None,
+        full=next_cursor is not None,
+        offset_mode=False,
+        next_cursor=next_cursor,
+    ), generation)
+    return items, next_cursor
+
+# Validators for conditional GET: the cached rows when present, otherwise a
+# query over PRODUCT_VALIDATOR_COLUMNS that skips the wide columns.
+
+def get_product_validator(db: Session, product_id: int):
+    cached = product_cache.get_product(product_id)
+    if cached is not MISSING:
+        return cached
+    row = db.query(*PRODUCT_VALIDATOR_COLUMNS).filter(Product.id == product_id).first()
+    return row._asdict() if row is not None else None
+
+def get_products_validator(db: Session, skip: int = 0, limit: int = 100, search: str = None):
+    if not search:
+        cached = product_cache.get_page(("offset", skip, limit))
+        if cached is not MISSING:
+            return cached.items
+    return [row._asdict() for row in _products_page(db.query(*PRODUCT_VALIDATOR_COLUMNS), skip, limit, search)]
+
+def get_products_after_validator(db: Session, after_id: int | None = None, limit: int = 100, search: str = None):
+    """Returns (rows, next_cursor) like get_products_after_cached."""
+    if not search:
+        cached = product_cache.get_page(("cursor", after_id, limit))
+        if cached is not MISSING:
+            return cached.items, cached.next_cursor
+    rows = _products_after(db.query(*PRODUCT_VALIDATOR_COLUMNS), after_id, limit, search)
+    return split_page([row._asdict() for row in rows], limit)
 
 
 # ---------------------- Cart CRUD ----------------------
+# With a write-behind cart store (app.cart_store, CART_STORE=memory/kv) the add/
+# update/remove/batch/read functions below work on the in-memory cart; get_cart_items
+# and get_carts always read cart_items and are used by checkout after a flush.
+
+def _store_lines_out(db: Session, lines: list[dict]) -> list[dict]:
+    products = get_products_cached_by_id(db, [line["product_id"] for line in lines])
+    return [
+        {**line, "product_name": products[line["product_id"]]["name"] if products[line["product_id"]] else None}
+        for line in lines
+    ]
+
+def _products_or_404(db: Session, product_ids) -> dict:
+    products = get_products_cached_by_id(db, product_ids)
+    missing = sorted(pid for pid, product in products.items() if product is None)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Product not found: {', '.join(map(str, missing))}")
+    return products
+
+def has_cart_items(db: Session, user_id: int) -> bool:
+    store = get_cart_store()
+    if store is not None:
+        return bool(store.lines(user_id))
+    return db.query(CartItem.id).filter(CartItem.user_id == user_id).first() is not None
 
 def get_cart_items(db: Session, user_id: int):
-    return db.query(CartItem).filter(CartItem.user_id == user_id).all()
+    # product is read for every line (name, stock), so load it in the same query
+    return (
+        db.query(CartItem)
+        .options(joinedload(CartItem.product))
+        .filter(CartItem.user_id == user_id)
+        .all()
+    )
+
+def get_carts(db: Session, user_ids) -> dict:
+    """Cart lines for several users in one query, keyed by user id."""
+    carts = {}
+    for item in (
+        db.query(CartItem)
+        .options(joinedload(CartItem.product))
+        .filter(CartItem.user_id.in_(set(user_ids)))
+        .order_by(CartItem.id)
+    ):
+        carts.setdefault(item.user_id, []).append(item)
+    return carts
 
 def get_cart_item(db: Session, user_id: int, product_id: int):
     return db.query(CartItem).filter(
@@ -72,7 +342,66 @@ def get_cart_item(db: Session, user_id: int, product_id: int):
         CartItem.product_id == product_id
     ).first()
 
+def cart_add_statement(db):
+    """One-statement add-to-cart: INSERT ... SELECT price ... ON CONFLICT DO UPDATE ... RETURNING.
+
+    Adds `qty` of product `pid` to user `uid`'s line (creating it if needed) and
+    snapshots the current price. Returns the line with its product name, or no
+    row when the product does not exist. None on dialects without ON CONFLICT.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    cart, products = CartItem.__table__, Product.__table__
+    stmt = insert(cart).from_select(
+        ["user_id", "product_id", "quantity", "price"],
+        select(bindparam("uid", type_=Integer), products.c.id, bindparam("qty", type_=Integer), products.c.price)
+        .where(products.c.id == bindparam("pid"))
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"],
+        set_={"quantity": cart.c.quantity + stmt.excluded.quantity, "price": stmt.excluded.price}
+    )
+    return stmt.returning(
+        cart.c.id, cart.c.product_id, cart.c.quantity, cart.c.price,
+        # written out: SQLAlchemy would add cart_items to a select()'s FROM instead of correlating it
+        literal_column(
+            "(SELECT products.name FROM products WHERE products.id = cart_items.product_id)", String
+        ).label("product_name"),
+    )
+
 def add_cart_item(db: Session, user_id: int, product_id: int, quantity: int = 1):
+    store = get_cart_store()
+    if store is not None:
+        product = get_product_cached(db, product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+
+        def add(lines):
+            line = lines.get(product_id)
+            if line is None:
+                line = lines[product_id] = {"id": None, "product_id": product_id, "quantity": 0}
+            line["quantity"] += quantity
+            line["price"] = product["price"]  # ✅ update price snapshot
+            return dict(line)
+
+        return schemas.CartItemOut(**store.update(user_id, add), product_name=product["name"])
+
+    stmt = cart_add_statement(db)
+    if stmt is None:
+        return _add_cart_item_orm(db, user_id, product_id, quantity)
+    row = db.execute(stmt, {"uid": user_id, "pid": product_id, "qty": quantity}).mappings().first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Product not found")
+    db.commit()
+    return schemas.CartItemOut(**row)
+
+def _add_cart_item_orm(db: Session, user_id: int, product_id: int, quantity: int):
     item = get_cart_item(db, user_id, product_id)
     product = db.query(Product).filter(Product.id == product_id).first()
     
@@ -102,77 +431,425 @@ def add_cart_item(db: Session, user_id: int, product_id: int, quantity: int = 1)
     )
 
 def update_cart_item(db: Session, user_id: int, product_id: int, quantity: int):
+    """Set a line's quantity; returns the line as CartItemOut, or None if it is not in the cart."""
+    store = get_cart_store()
+    if store is not None:
+        def set_quantity(lines):
+            line = lines.get(product_id)
+            if line is None:
+                return None
+            line["quantity"] = quantity
+            return dict(line)
+
+        line = store.update(user_id, set_quantity)
+        return schemas.CartItemOut(**_store_lines_out(db, [line])[0]) if line else None
+
     item = get_cart_item(db, user_id, product_id)
     if item:
         item.quantity = quantity
         db.commit()
         db.refresh(item)
-    return item
+        return schemas.CartItemOut(
+            id=item.id, product_id=item.product_id, quantity=item.quantity, price=item.price,
+            product_name=item.product.name if item.product else None,
+        )
+    return None
 
 def remove_cart_item(db: Session, user_id: int, product_id: int):
+    store = get_cart_store()
+    if store is not None:
+        store.update(user_id, lambda lines: lines.pop(product_id, None))
+        return
     item = get_cart_item(db, user_id, product_id)
     if item:
         db.delete(item)
         db.commit()
 
 
+def apply_cart_batch(db: Session, user_id: int, operations: list[schemas.CartOperation]):
+    """Apply add/set/remove operations to a cart in one transaction.
+
+    Products and existing cart lines are each fetched with a single IN query;
+    the resulting deletes, updates and inserts are issued as bulk statements.
+    """
+    for op in operations:
+        if op.op == schemas.CartOperationType.SET and op.quantity is None:
+            raise HTTPException(status_code=400, detail="'set' requires a quantity")
+    product_ids = {op.product_id for op in operations}
+    wanted = {op.product_id for op in operations if op.op != schemas.CartOperationType.REMOVE}
+    store = get_cart_store()
+    if store is not None:
+        return _apply_cart_batch_in_store(db, store, user_id, operations, _products_or_404(db, wanted))
+
+    products = {
+        row.id: row
+        for row in db.query(Product.id, Product.price).filter(Product.id.in_(wanted))
+    } if wanted else {}
+    missing = sorted(wanted - products.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Product not found: {', '.join(map(str, missing))}")
+
+    lines = {}
+    duplicate_ids = []
+    for item in db.query(CartItem.id, CartItem.product_id, CartItem.quantity).filter(
+        CartItem.user_id == user_id, CartItem.product_id.in_(product_ids)
+    ).order_by(CartItem.id):
+        if item.product_id in lines:
+            # legacy duplicate line: fold it into the first one
+            lines[item.product_id]["quantity"] += item.quantity
+            duplicate_ids.append(item.id)
+        else:
+            lines[item.product_id] = {"id": item.id, "quantity": item.quantity}
+
+    quantities = {pid: line["quantity"] for pid, line in lines.items()}
+    for op in operations:
+        if op.op == schemas.CartOperationType.ADD:
+            quantities[op.product_id] = quantities.get(op.product_id, 0) + (1 if op.quantity is None else op.quantity)
+        elif op.op == schemas.CartOperationType.SET:
+            quantities[op.product_id] = op.quantity
+        else:
+            quantities[op.product_id] = 0
+
+    deletes = list(duplicate_ids)
+    updates, inserts = [], []
+    for pid, quantity in quantities.items():
+        line = lines.get(pid)
+        if quantity <= 0:
+            if line:
+                deletes.append(line["id"])
+        elif line:
+            updates.append({"line_id": line["id"], "quantity": quantity, "price": products[pid].price})
+        else:
+            inserts.append({"user_id": user_id, "product_id": pid, "quantity": quantity, "price": products[pid].price})
+
+    cart_items = CartItem.__table__
+    try:
+        if deletes:
+            db.execute(cart_items.delete().where(cart_items.c.id.in_(deletes)))
+        if updates:
+            db.execute(
+                cart_items.update()
+                .where(cart_items.c.id == bindparam("line_id"))
+                .values(quantity=bindparam("quantity"), price=bindparam("price")),
+                updates
+            )
+        if inserts:
+            db.execute(cart_items.insert(), inserts)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return get_cart(db, user_id)
+
+def _apply_cart_batch_in_store(db: Session, store, user_id: int, operations, products: dict):
+    def apply(lines):
+        for op in operations:
+            line = lines.get(op.product_id)
+            if op.op == schemas.CartOperationType.REMOVE:
+                lines.pop(op.product_id, None)
+                continue
+            if line is None:
+                line = lines[op.product_id] = {"id": None, "product_id": op.product_id, "quantity": 0}
+            if op.op == schemas.CartOperationType.ADD:
+                line["quantity"] += 1 if op.quantity is None else op.quantity
+            else:
+                line["quantity"] = op.quantity
+            line["price"] = products[op.product_id]["price"]
+            if line["quantity"] <= 0:
+                del lines[op.product_id]
+        return True
+
+    store.update(user_id, apply)
+    return get_cart(db, user_id)
+
+_CART_COLUMNS = (CartItem.id, CartItem.product_id, CartItem.quantity, CartItem.price)
+
+def get_cart_rows(db: Session, user_id: int, fields: tuple = None):
+    """Cart lines as CartItemOut-shaped dicts, product name joined in SQL.
+
+    With a sparse fieldset only those columns are read, and products are
+    joined only for product_name.
+    """
+    store = get_cart_store()
+    if store is not None:
+        return _store_lines_out(db, store.lines(user_id))
+    columns = [column for column in _CART_COLUMNS if fields is None or column.key in fields]
+    query = db.query(*columns)
+    if fields is None or "product_name" in fields:
+        query = query.add_columns(Product.name.label("product_name")).outerjoin(
+            Product, Product.id == CartItem.product_id
+        )
+    query = query.filter(CartItem.user_id == user_id).order_by(CartItem.id)
+    return [row._asdict() for row in query]
+
+def get_cart(db: Session, user_id: int):
+    """The full cart with product names and its total."""
+    items = get_cart_rows(db, user_id)
+    return schemas.CartOut(items=items, total=sum(item["price"] * item["quantity"] for item in items))
+
 # ---------------------- Order CRUD ----------------------
 
 def create_order(db: Session, user_id: int):
-    cart_items = db.query(CartItem).filter(CartItem.user_id == user_id).all()
+    """Check out the user's cart in a single transaction.
+
+    Stock is reserved with a conditional `stock = stock - :q WHERE stock >= :q`
+    update, so concurrent checkouts can never oversell; if any line cannot be
+    reserved the whole transaction (order, items, stock, cart) is rolled back.
+    Products in flash-sale mode are allocated from app.flash_sale instead and
+    handed back if the transaction does not commit. A write-behind cart is
+    flushed first and kept out of background flushes until the order is written.
+    """
+    store = get_cart_store()
+    if store is None:
+        return _create_order(db, user_id)
+    with store.checkout([user_id]):
+        return _create_order(db, user_id, store)
+
+def _create_order(db: Session, user_id: int, store=None):
+    cart_items = get_cart_items(db, user_id)
     if not cart_items:
         return None
 
-    # ✅ Stock check
+    quantities = cart_quantities(cart_items)
+    ordered = {item.product_id: item.quantity for item in cart_items}  # read before commit expires the lines
+    flash, regular = reserve_flash_stock(db, quantities)
+    try:
+        order = write_order(db, user_id, cart_items, regular)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        flash_sale.release(flash)
+        if isinstance(e, StockShortage):
+            raise stock_shortage_error(db, e.quantities) from None
+        raise
+    product_cache.on_product_changed(*quantities)
+    if store is not None:
+        store.checked_out(user_id, ordered)
+    return order
+
+
+# Checkout building blocks, shared by create_order and the group-commit writer (app.group_commit)
+
+class StockShortage(Exception):
+    """Raised by write_order when a conditional stock update did not match every product."""
+
+    def __init__(self, quantities: dict):
+        super().__init__(quantities)
+        self.quantities = quantities
+
+def cart_quantities(cart_items) -> dict:
+    # Same product may appear on several cart lines
+    quantities = {}
     for item in cart_items:
-        if item.product.stock < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Not enough stock for product: {item.product.name}"
-            )
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+def reserve_flash_stock(db: Session, quantities: dict) -> tuple[dict, dict]:
+    """Allocate flash-sale products up front; returns (flash, regular) quantities."""
+    flash, regular = flash_sale.split(quantities)
+    if flash:
+        short_ids = flash_sale.reserve(flash)
+        if short_ids:
+            raise _not_enough_stock(db, short_ids)
+    return flash, regular
+
+def order_rollup(order: Order, cart_items) -> tuple:
+    """(day, status, items) for rollups.record_orders."""
+    return order.created_at.date(), OrderStatus.PENDING, [
+        (item.product_id, item.quantity, item.price) for item in cart_items
+    ]
+
+def write_order(db: Session, user_id: int, cart_items, regular: dict, record_rollup: bool = True):
+    """Reserve `regular` stock, write the order, its items and rollups, clear the cart.
+
+    With record_rollup=False the caller adds the order to the rollups itself
+    (the group-commit writer does it once per batch).
+
+    Does not commit. Raises StockShortage or HTTPException(409); the caller
+    must then roll back (the transaction or a savepoint).
+    """
+    if regular:
+        products = Product.__table__
+        reserve_stock = (
+            products.update()
+            .where(products.c.id == bindparam("pid"), products.c.stock >= bindparam("qty"))
+            .values(stock=products.c.stock - bindparam("qty"))
+        )
+        result = db.execute(reserve_stock, [{"pid": pid, "qty": qty} for pid, qty in regular.items()])
+        if result.rowcount != len(regular):
+            raise StockShortage(regular)
 
     # ✅ Use CartItem price snapshot
     total_price = sum(item.price * item.quantity for item in cart_items)
-
-    order = Order(user_id=user_id, total_price=total_price)
+    order = Order(user_id=user_id, total_price=total_price, created_at=datetime.utcnow())
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    db.flush()
+
+    db.execute(OrderItem.__table__.insert(), [
+        {
+            "order_id": order.id,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "price": item.price,
+        }
+        for item in cart_items
+    ])
+    if record_rollup:
+        rollups.record_order(db, *order_rollup(order, cart_items))
+
+    # Delete exactly the lines that were checked out, not ones added meanwhile.
+    # Fewer rows than expected means a parallel checkout already took this cart.
+    cleared = db.query(CartItem).filter(
+        CartItem.id.in_([item.id for item in cart_items])
+    ).delete(synchronize_session=False)
+    if cleared != len(cart_items):
+        raise HTTPException(status_code=409, detail="Cart changed during checkout, please retry")
+    return order
 
-    # ✅ Create order items and update stock
-    for item in cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
-        )
-        db.add(order_item)
+def stock_shortage_error(db: Session, quantities: dict) -> HTTPException:
+    """After rolling back: name the products whose stock cannot cover `quantities`."""
+    return _not_enough_stock(db, [
+        row.id
+        for row in db.query(Product.id, Product.stock).filter(Product.id.in_(quantities))
+        if row.stock is None or row.stock < quantities[row.id]
+    ])
+
+def _not_enough_stock(db: Session, product_ids: list[int]) -> HTTPException:
+    names = [name for (name,) in db.query(Product.name).filter(Product.id.in_(product_ids)).order_by(Product.id)]
+    return HTTPException(
+        status_code=400,
+        detail=f"Not enough stock for product: {', '.join(names) or 'unavailable'}"
+    )
 
-        # ✅ Update stock
-        item.product.stock -= item.quantity
 
-    # ✅ Clear cart
-    for item in cart_items:
-        db.delete(item)
+_ORDER_COLUMNS = (Order.id, Order.user_id, Order.status, Order.total_price, Order.created_at)
 
-    db.commit()
-    return order
+def _orders_with_items(db: Session):
+    # schemas.Order serializes items; one extra IN query per page instead of one per order
+    return db.query(Order).options(selectinload(Order.items))
 
+def get_orders(db: Session, user_id: int, skip: int = 0, limit: int | None = None):
+    query = _orders_with_items(db).filter(Order.user_id == user_id).order_by(Order.id)
+    return query.offset(skip).limit(limit).all()
 
-def get_orders(db: Session, user_id: int):
-    return db.query(Order).filter(Order.user_id == user_id).all()
+def get_orders_after(db: Session, user_id: int | None = None, after_id: int | None = None, limit: int = 100):
+    """Keyset page of orders ordered by id. `user_id=None` means all users (admin view)."""
+    query = _orders_with_items(db)
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    if after_id is not None:
+        query = query.filter(Order.id > after_id)
+    return query.order_by(Order.id).limit(limit + 1).all()
+
+def _order_columns(fields: tuple | None) -> list:
+    return [column for column in _ORDER_COLUMNS if fields is None or column.key in fields]
+
+def get_order_rows(db: Session, user_id: int | None = None, skip: int = 0, limit: int | None = None,
+                   fields: tuple = None):
+    """Orders with items as plain dicts (the fast list path). `user_id=None` means all users.
+
+    With a sparse fieldset only those order columns are read, and items only if asked for.
+    """
+    query = db.query(*_order_columns(fields))
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    orders = query.order_by(Order.id).offset(skip).limit(limit).all()
+    return list(_orders_with_item_rows(db, orders, fields))
+
+def get_order_rows_after(db: Session, user_id: int | None = None, after_id: int | None = None, limit: int = 100,
+                         fields: tuple = None):
+    """Keyset variant of get_order_rows; fetches `limit + 1` orders."""
+    query = db.query(*_order_columns(fields))
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    if after_id is not None:
+        query = query.filter(Order.id > after_id)
+    return list(_orders_with_item_rows(db, query.order_by(Order.id).limit(limit + 1).all(), fields))
 
 def get_order(db: Session, order_id: int):
-    return db.query(Order).filter(Order.id == order_id).first()
+    return _orders_with_items(db).filter(Order.id == order_id).first()
 
 def update_order_status(db: Session, order_id: int, status: OrderStatus):
     order = db.query(Order).filter(Order.id == order_id).first()
     if order:
+        previous = order.status
         order.status = status
+        # same transaction as the status change, so reports never see half of it
+        rollups.move_order(db, order.id, order.created_at.date() if order.created_at else None, previous, status)
         db.commit()
         db.refresh(order)
     return order
 
-def get_all_orders(db: Session):
-    return db.query(Order).all()
+def get_all_orders(db: Session, skip: int = 0, limit: int | None = None):
+    return _orders_with_items(db).order_by(Order.id).offset(skip).limit(limit).all()
+
+
+def iter_orders_for_export(
+    db: Session,
+    start=None,
+    end=None,
+    status: OrderStatus | None = None,
+    user_id: int | None = None,
+    batch_size: int = 1000,
+):
+    """Stream orders (with their items) as dicts for the admin export.
+
+    Orders come from a server-side cursor; items are loaded with one IN query
+    per batch of `batch_size` orders, so memory is bounded by the batch.
+    """
+    query = db.query(*_ORDER_COLUMNS)
+    if start is not None:
+        query = query.filter(Order.created_at >= start)
+    if end is not None:
+        query = query.filter(Order.created_at < end)
+    if status is not None:
+        query = query.filter(Order.status == status)
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    query = query.order_by(Order.id).execution_options(stream_results=True).yield_per(batch_size)
+
+    batch = []
+    for row in query:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from _orders_with_item_rows(db, batch)
+            batch = []
+    if batch:
+        yield from _orders_with_item_rows(db, batch)
+
+def _orders_with_item_rows(db: Session, orders: list, fields: tuple = None):
+    if not orders:
+        return
+    items_by_order = {}
+    if fields is None or "items" in fields:
+        item_rows = (
+            db.query(OrderItem.id, OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+            .filter(OrderItem.order_id.in_([order.id for order in orders]))
+            .order_by(OrderItem.order_id, OrderItem.id)
+        )
+        for item in item_rows:
+            items_by_order.setdefault(item.order_id, []).append(
+                {"id": item.id, "product_id": item.product_id, "quantity": item.quantity, "price": item.price}
+            )
+    if fields is not None:
+        # sparse rows: only the selected columns exist on `order`
+        for order in orders:
+            row = order._asdict()
+            if "status" in row:
+                row["status"] = getattr(row["status"], "value", row["status"])
+            if row.get("created_at") is not None:
+                row["created_at"] = row["created_at"].isoformat()
+            if "items" in fields:
+                row["items"] = items_by_order.get(order.id, [])
+            yield row
+        return
+    for order in orders:
+        status = order.status
+        yield {
+            "id": order.id,
+            "user_id": order.user_id,
+            "status": getattr(status, "value", status),
+            "total_price": order.total_price,
+            "created_at": order.created_at.isoformat() if order.created_at else None,
+            "items": items_by_order.get(order.id, []),
+        }
@@ -1,17 +1,124 @@
-from sqlalchemy import create_engine
+import os
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
 from fastapi import HTTPException
+from app.metrics import instrument_engine
+
+# Database URL (SQLite by default; any SQLAlchemy URL works)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ecommerce.db")
+
+# Pool / engine settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 1000))
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+# SQLite pragmas applied to every new connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64000)),  # negative = KiB, i.e. 64 MB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "temp_store": "MEMORY",
+}
+
+
+class PoolStats:
+    """Checkout counters and time spent waiting for a pooled connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0              # checkouts that had to block for a free connection
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def record(self, elapsed: float, waited: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += elapsed
+            if waited:
+                self.waits += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times every checkout into `pool_stats`."""
+
+    # a checkout slower than this counts as having waited for a connection
+    wait_threshold = 0.001
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except SQLAlchemyError:
+            pool_stats.record_timeout()
+            raise
+        elapsed = time.perf_counter() - started
+        pool_stats.record(elapsed, elapsed > self.wait_threshold)
+        return connection
+
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url) -> dict:
+    """create_engine/create_async_engine keyword arguments for `url`."""
+    options = {
+        "echo": DB_ECHO,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "query_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if is_sqlite(url):
+        database = make_url(url).database
+        if not database or database == ":memory:":
+            # in-memory databases live and die with their single connection
+            return options
+        options["connect_args"] = {"check_same_thread": False}
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 
-# Database URL (using SQLite in this example)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./ecommerce.db"
 
 # Set up SQLAlchemy engine and session maker
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+if is_sqlite(SQLALCHEMY_DATABASE_URL):
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+instrument_engine(engine)
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-# Function to get the database session
+# The one session dependency every router uses
 def get_db():
     db = SessionLocal()
     try:
@@ -19,8 +126,91 @@ def get_db():
     except SQLAlchemyError as e:
         db.rollback()  # Rollback if there's an error
         raise HTTPException(status_code=500, detail=str(e))
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
+
+def get_pool_status() -> dict:
+    """Live pool occupancy plus cumulative checkout/wait counters."""
+    pool = engine.pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "checkouts": pool_stats.checkouts,
+        "waits": pool_stats.waits,
+        "wait_seconds": round(pool_stats.wait_seconds, 4),
+        "timeouts": pool_stats.timeouts,
+    }
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    return status
+
 # Base class for model definitions
 Base = declarative_base()
+
+
+# ---------------------- Async mode ----------------------
+# Enabled with ASYNC_DB=1. The async engine opens the same database as
+# DATABASE_URL through an async driver (sqlite -> aiosqlite, postgresql ->
+# asyncpg). ASYNC_DATABASE_URL overrides it, e.g. to pick another driver.
+ASYNC_DB = os.getenv("ASYNC_DB", "0") == "1"
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_url(url) -> str:
+    """`url` with its driver swapped for the async one; unknown backends are returned unchanged."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return str(url)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(SQLALCHEMY_DATABASE_URL)
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """Create the async engine on first use so the async driver stays optional."""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+        options = engine_options(ASYNC_SQLALCHEMY_DATABASE_URL)
+        # async engines bring their own adapted pool and driver arguments
+        options.pop("connect_args", None)
+        options.pop("poolclass", None)
+        _async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **options)
+        if is_sqlite(ASYNC_SQLALCHEMY_DATABASE_URL):
+            event.listen(_async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+        instrument_engine(_async_engine.sync_engine)
+        _async_session_factory = sessionmaker(
+            bind=_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+async def get_async_db():
+    get_async_engine()
+    db = _async_session_factory()
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await db.close()
@@ -0,0 +1,35 @@
+"""Sparse fieldsets for list endpoints: `?fields=id,name,price`.
+
+The product, cart and order lists accept a comma-separated `fields` list.
+The crud functions select only those columns (plus whatever the response
+needs internally, such as the version for ETags). Order items are only
+queried when `items` is asked for. The routes then drop the extra keys with
+`trim`. `id` is always returned. An unknown field name is a 400, and leaving
+out `fields` returns full rows as before.
+"""
+from fastapi import HTTPException
+
+PRODUCT_FIELDS = ("id", "name", "description", "price", "image_url", "stock", "version", "updated_at")
+CART_FIELDS = ("id", "product_id", "quantity", "price", "product_name")
+ORDER_FIELDS = ("id", "user_id", "status", "total_price", "created_at", "items")
+
+
+def parse_fields(fields: str | None, allowed: tuple) -> tuple | None:
+    """The requested fields in `allowed` order with id first, or None for all of them."""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(requested.difference(allowed))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}; choose from {', '.join(allowed)}",
+        )
+    requested.add("id")
+    return tuple(name for name in allowed if name in requested)
+
+
+def trim(rows, fields: tuple | None) -> list:
+    if fields is None:
+        return rows if isinstance(rows, list) else list(rows)
+    return [{name: row[name] for name in fields} for row in rows]
@@ -0,0 +1,222 @@
+"""Flash-sale stock allocation for a handful of hot products.
+
+A normal checkout reserves stock with a conditional UPDATE on the product row,
+so every order for the same product serializes on that row's write lock (and
+on SQLite, on the single database writer). For products switched into
+flash-sale mode, stock is instead moved out of `products.stock` into an
+in-process escrow in chunks of FLASH_SALE_CHUNK units with one grouped
+UPDATE, and individual orders are allocated from the escrow under a
+per-product lock. The product row is written once per chunk, not per order.
+
+Escrowed units are already subtracted from `products.stock`, so several
+worker processes can run the same flash sale without overselling. They are
+still for sale, so product reads add this process's escrow back onto
+`stock` (`with_escrow`), and the product's ETag carries the escrow count.
+Unsold escrow is returned to the row when the sale is disabled and at
+shutdown; a crash loses escrowed units (undersell), never oversells.
+"""
+import os
+import threading
+
+from sqlalchemy import select
+
+from app.models import Product
+from app.product_cache import product_cache
+
+# Comma-separated product ids switched into flash-sale mode at startup
+FLASH_SALE_PRODUCTS = [int(pid) for pid in os.getenv("FLASH_SALE_PRODUCTS", "").split(",") if pid.strip()]
+FLASH_SALE_CHUNK = int(os.getenv("FLASH_SALE_CHUNK", 100))
+
+_products = Product.__table__
+
+
+class _Allocation:
+    __slots__ = ("lock", "active", "escrow", "allocated", "refills")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = True
+        self.escrow = 0        # units claimed from products.stock, not yet sold
+        self.allocated = 0
+        self.refills = 0
+
+
+class FlashSaleAllocator:
+    # a refill races other workers between reading and claiming stock
+    refill_attempts = 3
+
+    def __init__(self, chunk: int):
+        self.chunk = chunk
+        self._engine = None
+        self._allocations: dict[int, _Allocation] = {}
+        self._lock = threading.Lock()
+
+    def bind(self, engine) -> None:
+        """Use `engine` for escrow writes (defaults to app.database.engine)."""
+        self._engine = engine
+
+    def _get_engine(self):
+        if self._engine is None:
+            from app.database import engine
+            self._engine = engine
+        return self._engine
+
+    # ---- configuration ----
+
+    def is_active(self, product_id: int) -> bool:
+        return product_id in self._allocations
+
+    def escrowed(self, product_id: int) -> int:
+        """Unsold units held in escrow for the product (0 outside flash-sale mode)."""
+        allocation = self._allocations.get(product_id)
+        return allocation.escrow if allocation is not None else 0
+
+    def with_escrow(self, product):
+        """`product` (row dict or ORM instance) with its escrowed units counted as stock.
+
+        Returns the product unchanged outside flash-sale mode, otherwise a
+        dict copy, so cached rows and session instances are never modified.
+        """
+        product_id = product["id"] if isinstance(product, dict) else product.id
+        escrow = self.escrowed(product_id)
+        if not escrow:
+            return product
+        if isinstance(product, dict):
+            row = dict(product)
+        else:
+            row = {column.key: getattr(product, column.key) for column in _products.columns}
+        if row.get("stock") is not None:  # absent from sparse fieldsets without stock
+            row["stock"] += escrow
+        return row
+
+    def with_escrow_all(self, products) -> list:
+        if not self._allocations:
+            return products
+        return [self.with_escrow(product) for product in products]
+
+    def enable(self, product_id: int) -> None:
+        with self._lock:
+            self._allocations.setdefault(product_id, _Allocation())
+
+    def disable(self, product_id: int, return_stock: bool = True) -> None:
+        with self._lock:
+            allocation = self._allocations.pop(product_id, None)
+        if allocation is None:
+            return
+        with allocation.lock:
+            allocation.active = False
+            unsold, allocation.escrow = allocation.escrow, 0
+        if return_stock and unsold:
+            self._return_stock(product_id, unsold)
+
+    def reset(self, *product_ids: int) -> None:
+        """Drop escrow without returning it, after stock was set to an absolute value."""
+        for product_id in product_ids:
+            allocation = self._allocations.get(product_id)
+            if allocation is not None:
+                with allocation.lock:
+                    allocation.escrow = 0
+
+    def start(self) -> None:
+        for product_id in FLASH_SALE_PRODUCTS:
+            self.enable(product_id)
+
+    def shutdown(self) -> None:
+        for product_id in list(self._allocations):
+            self.disable(product_id)
+
+    # ---- allocation ----
+
+    def split(self, quantities: dict[int, int]) -> tuple[dict, dict]:
+        """Split checkout quantities into (flash-sale, regular) product maps."""
+        flash, regular = {}, {}
+        for product_id, quantity in quantities.items():
+            (flash if product_id in self._allocations else regular)[product_id] = quantity
+        return flash, regular
+
+    def reserve(self, quantities: dict[int, int]) -> list[int]:
+        """Allocate every quantity or none of them.
+
+        Returns the product ids that could not be covered; on success the list
+        is empty and the units must be given back with `release` if the order
+        is not committed.
+        """
+        taken, short = {}, []
+        for product_id in sorted(quantities):  # fixed order across threads
+            quantity = quantities[product_id]
+            allocation = self._allocations.get(product_id)
+            if allocation is None:
+                short.append(product_id)
+                continue
+            with allocation.lock:
+                if allocation.active and allocation.escrow < quantity:
+                    self._refill(product_id, allocation, quantity - allocation.escrow)
+                if not allocation.active or allocation.escrow < quantity:
+                    short.append(product_id)
+                    continue
+                allocation.escrow -= quantity
+                allocation.allocated += quantity
+            taken[product_id] = quantity
+        if short:
+            self.release(taken)
+        return short
+
+    def release(self, quantities: dict[int, int]) -> None:
+        """Give back units from a reservation whose order was not committed."""
+        for product_id, quantity in quantities.items():
+            allocation = self._allocations.get(product_id)
+            if allocation is not None:
+                with allocation.lock:
+                    if allocation.active:
+                        allocation.escrow += quantity
+                        allocation.allocated -= quantity
+                        continue
+            # sale ended meanwhile: the units belong back on the row
+            self._return_stock(product_id, quantity)
+
+    # ---- grouped stock writes ----
+
+    def _refill(self, product_id: int, allocation: _Allocation, needed: int) -> None:
+        """Claim at least `needed` (normally a whole chunk) units from products.stock."""
+        engine = self._get_engine()
+        for _ in range(self.refill_attempts):
+            with engine.begin() as conn:
+                stock = conn.execute(select(_products.c.stock).where(_products.c.id == product_id)).scalar() or 0
+                claim = min(max(needed, self.chunk), stock)
+                if claim < needed:
+                    return  # not enough left for this order; leave the remainder on the row
+                claimed = conn.execute(
+                    _products.update()
+                    .where(_products.c.id == product_id, _products.c.stock >= claim)
+                    .values(stock=_products.c.stock - claim)
+                ).rowcount
+            if claimed:
+                allocation.escrow += claim
+                allocation.refills += 1
+                product_cache.on_product_changed(product_id)
+                return
+
+    def _return_stock(self, product_id: int, quantity: int) -> None:
+        with self._get_engine().begin() as conn:
+            conn.execute(
+                _products.update()
+                .where(_products.c.id == product_id)
+                .values(stock=_products.c.stock + quantity)
+            )
+        product_cache.on_product_changed(product_id)
+
+    def stats(self) -> dict:
+        return {
+            "chunk": self.chunk,
+            "products": {
+                product_id: {
+                    "escrow": allocation.escrow,
+                    "allocated": allocation.allocated,
+                    "refills": allocation.refills,
+                }
+                for product_id, allocation in list(self._allocations.items())
+            },
+        }
+
+
+flash_sale = FlashSaleAllocator(FLASH_SALE_CHUNK)
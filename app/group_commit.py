@@ -0,0 +1,280 @@
+"""Group-commit checkout: queue orders, write many per transaction.
+
+With GROUP_COMMIT_CHECKOUT=1, `POST /orders/place_order` checks that the cart
+is not empty, queues a checkout ticket and answers 202 straight away. A single
+background writer thread drains the queue, waiting at most
+GROUP_COMMIT_MAX_WAIT_MS to collect up to GROUP_COMMIT_BATCH_SIZE tickets. It
+then places them all in one transaction, so a batch costs one commit (one
+fsync on SQLite) instead of one per order. Each order runs in its own
+SAVEPOINT, so a cart that is short of stock fails alone. Clients poll
+`GET /orders/checkout/{ticket}` for the outcome and the order id.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, rollups
+from app.cache import MISSING, LRUCache
+from app.cart_store import get_cart_store
+from app.flash_sale import flash_sale
+from app.product_cache import product_cache
+
+GROUP_COMMIT_CHECKOUT = os.getenv("GROUP_COMMIT_CHECKOUT", "0") == "1"
+GROUP_COMMIT_BATCH_SIZE = int(os.getenv("GROUP_COMMIT_BATCH_SIZE", 64))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", 5))
+GROUP_COMMIT_QUEUE_LIMIT = int(os.getenv("GROUP_COMMIT_QUEUE_LIMIT", 10000))
+# How long finished tickets stay pollable
+CHECKOUT_TICKET_TTL = float(os.getenv("CHECKOUT_TICKET_TTL", 3600))
+
+QUEUED, PLACED, FAILED = "queued", "placed", "failed"
+
+logger = logging.getLogger("app.group_commit")
+
+
+def writer_session_factory(url: str):
+    """Sessions for the writer thread.
+
+    pysqlite only opens a transaction at the first DML statement, which breaks
+    SAVEPOINT. On SQLite the writer therefore gets its own single-connection
+    engine that issues BEGIN IMMEDIATE itself (the approach from the
+    SQLAlchemy SQLite docs). Other databases share the app's engine.
+    """
+    from app.database import SessionLocal, apply_sqlite_pragmas, engine_options, is_sqlite
+    from app.metrics import instrument_engine
+
+    options = engine_options(url)
+    if not is_sqlite(url) or "poolclass" not in options:
+        return SessionLocal  # other databases, or an in-memory SQLite that cannot be shared
+    options.update(pool_size=1, max_overflow=0)
+    writer_engine = create_engine(url, **options)
+
+    @event.listens_for(writer_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, connection_record)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    instrument_engine(writer_engine)
+    return sessionmaker(bind=writer_engine, autoflush=False, autocommit=False)
+
+
+class GroupCommitWriter:
+    def __init__(self, read_sessions, write_sessions, batch_size: int, max_wait_ms: float,
+                 queue_limit: int = GROUP_COMMIT_QUEUE_LIMIT, ticket_ttl: float = CHECKOUT_TICKET_TTL):
+        self.read_sessions = read_sessions
+        self.write_sessions = write_sessions
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_limit)
+        # bounded like every other in-process store; tickets outlive the request by ticket_ttl
+        self.tickets = LRUCache(max(queue_limit * 10, 1000), ticket_ttl)
+        self._thread = None
+        self._stopping = threading.Event()
+        self.batches = 0
+        self.orders = 0
+
+    # ---- request side ----
+
+    def submit(self, user_id: int) -> dict:
+        ticket = {"ticket": uuid.uuid4().hex, "user_id": user_id, "status": QUEUED,
+                  "order_id": None, "detail": None, "status_code": None}
+        self.tickets.set(ticket["ticket"], ticket)
+        try:
+            self._queue.put_nowait(ticket)
+        except queue.Full:
+            self.tickets.delete(ticket["ticket"])
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Checkout queue is full, please retry",
+                headers={"Retry-After": "1"},
+            )
+        return ticket
+
+    def get_ticket(self, ticket_id: str, user_id: int | None = None) -> dict | None:
+        ticket = self.tickets.get(ticket_id)
+        if ticket is MISSING or (user_id is not None and ticket["user_id"] != user_id):
+            return None
+        return ticket
+
+    # ---- writer thread ----
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """Stop after placing everything already queued."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next_batch(self) -> list[dict]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self.process(batch)
+
+    def process(self, batch: list[dict]) -> None:
+        """Place a batch in one transaction; on an unexpected error fall back to one order at a time."""
+        store = get_cart_store()
+        if store is None:
+            self._process(batch)
+            return
+        # flush the batch's write-behind carts and keep the flusher off them meanwhile
+        with store.checkout([ticket["user_id"] for ticket in batch]):
+            self._process(batch)
+
+    def _process(self, batch: list[dict]) -> None:
+        pending = self._prepare(batch)
+        if not pending:
+            return
+        try:
+            placed, failed, touched = self._write(pending)
+        except Exception:
+            # the batch did not commit: no order exists, so the flash units go back and each cart is retried
+            for ticket, cart_items, flash, regular in pending:
+                flash_sale.release(flash)
+            for ticket, *_ in pending:
+                self._place_alone(ticket)
+            return
+        self._publish(placed, failed, touched)
+
+    def _fail(self, ticket: dict, error: HTTPException) -> None:
+        ticket.update(status=FAILED, detail=error.detail, status_code=error.status_code)
+
+    def _prepare(self, batch: list[dict]) -> list[tuple]:
+        """Read carts and take flash-sale stock before the write transaction holds the lock."""
+        pending = []
+        db = self.read_sessions()
+        try:
+            carts = crud.get_carts(db, [ticket["user_id"] for ticket in batch])
+            for ticket in batch:
+                # the first of two tickets for one user takes the cart; the second finds it gone
+                cart_items = carts.pop(ticket["user_id"], None)
+                if not cart_items:
+                    self._fail(ticket, HTTPException(status_code=400, detail="Cart is empty"))
+                    continue
+                try:
+                    flash, regular = crud.reserve_flash_stock(db, crud.cart_quantities(cart_items))
+                except HTTPException as e:
+                    self._fail(ticket, e)
+                    continue
+                pending.append((ticket, cart_items, flash, regular))
+        finally:
+            db.close()
+        return pending
+
+    def _write(self, pending: list[tuple]) -> tuple[list, list, set]:
+        """Write the batch and commit; returns (placed, failed, touched product ids)."""
+        placed, failed, touched, rollup = [], [], set(), []
+        db = self.write_sessions()
+        try:
+            for ticket, cart_items, flash, regular in pending:
+                savepoint = db.begin_nested()
+                try:
+                    order = crud.write_order(db, ticket["user_id"], cart_items, regular, record_rollup=False)
+                    savepoint.commit()
+                except (crud.StockShortage, HTTPException) as e:
+                    savepoint.rollback()
+                    error = crud.stock_shortage_error(db, e.quantities) if isinstance(e, crud.StockShortage) else e
+                    failed.append((ticket, error, flash))
+                    continue
+                placed.append((ticket, order.id, cart_items))
+                touched.update(crud.cart_quantities(cart_items))
+                rollup.append(crud.order_rollup(order, cart_items))
+            # one rollup upsert per table for the whole batch
+            rollups.record_orders(db, rollup)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return placed, failed, touched
+
+    def _publish(self, placed: list, failed: list, touched: set) -> None:
+        """Report a committed batch. The orders exist whatever fails here, so nothing is rolled back or retried."""
+        for ticket, error, flash in failed:
+            flash_sale.release(flash)
+            self._fail(ticket, error)
+        for ticket, order_id, cart_items in placed:
+            ticket.update(status=PLACED, order_id=order_id)
+        self.batches += 1
+        self.orders += len(placed)
+        try:
+            product_cache.on_product_changed(*touched)
+        except Exception:
+            logger.exception("product cache invalidation failed after a checkout batch")
+        store = get_cart_store()
+        if store is not None:
+            for ticket, order_id, cart_items in placed:
+                try:
+                    store.checked_out(ticket["user_id"], {item.product_id: item.quantity for item in cart_items})
+                except Exception:
+                    logger.exception("could not clear the write-behind cart of user %s", ticket["user_id"])
+
+    def _place_alone(self, ticket: dict) -> None:
+        db = self.read_sessions()
+        try:
+            order = crud.create_order(db, ticket["user_id"])
+            if order is None:
+                self._fail(ticket, HTTPException(status_code=400, detail="Cart is empty"))
+            else:
+                ticket.update(status=PLACED, order_id=order.id)
+        except HTTPException as e:
+            self._fail(ticket, e)
+        except Exception:
+            self._fail(ticket, HTTPException(status_code=500, detail="Checkout failed"))
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": GROUP_COMMIT_CHECKOUT,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "orders": self.orders,
+            "avg_batch": round(self.orders / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_writer = None
+
+
+def get_writer() -> GroupCommitWriter:
+    global _writer
+    if _writer is None:
+        from app.database import SQLALCHEMY_DATABASE_URL, SessionLocal
+
+        _writer = GroupCommitWriter(
+            SessionLocal, writer_session_factory(SQLALCHEMY_DATABASE_URL),
+            GROUP_COMMIT_BATCH_SIZE, GROUP_COMMIT_MAX_WAIT_MS,
+        )
+    return _writer
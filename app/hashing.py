@@ -0,0 +1,124 @@
+"""Bounded process pool for bcrypt hashing and verification.
+
+bcrypt is deliberately slow; running it on the request workers lets a login
+spike starve every other route. Work is shipped to a small dedicated process
+pool instead, and when more than `HASH_QUEUE_LIMIT` jobs are pending new ones
+are rejected with 503 rather than queued without bound.
+
+HASH_POOL_WORKERS=0 runs hashing on the threadpool (handy for tests/dev).
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from app import metrics, utils
+
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", 64))
+
+
+def _hash(password: str) -> str:
+    return utils.hash_password(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify, and if the stored hash uses outdated settings return a fresh one."""
+    if not utils.verify_password(password, hashed_password):
+        return False, None
+    if utils.pwd_context.needs_update(hashed_password):
+        return True, utils.hash_password(password)
+    return True, None
+
+
+class HashingPool:
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._warm_up = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: never fork a process that already runs server threads
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def start(self, wait_ready: bool = False) -> None:
+        """Spin up the worker processes ahead of the first login.
+
+        Each worker hashes once, which imports passlib and loads bcrypt in it.
+        With wait_ready=True this blocks until those hashes are done.
+        """
+        executor = self._get_executor()
+        if executor is None:
+            return
+        with self._lock:
+            if self._warm_up is None:
+                self._warm_up = [executor.submit(_hash, "warm-up") for _ in range(self.workers)]
+        if wait_ready:
+            wait(self._warm_up)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._warm_up = None
+
+    async def _run(self, operation: str, fn, *args):
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        started = time.perf_counter()
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.BCRYPT_SECONDS.observe(elapsed, operation=operation)
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self._run("verify", _verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queue_depth": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "total_seconds": round(self.total_seconds, 3),
+        }
+
+
+hashing_pool = HashingPool(HASH_POOL_WORKERS, HASH_QUEUE_LIMIT)
@@ -0,0 +1,162 @@
+"""`Idempotency-Key` support for retried writes (checkout, add to cart).
+
+The first request with a given key runs normally and its response is stored
+in a bounded, expiring in-process store, keyed by user, route and key. Retries
+replay the stored response (with an `Idempotent-Replayed: true` header)
+instead of running the write again. A duplicate that arrives while the first
+request is still running waits for it rather than starting a second
+transaction.
+
+Responses are stored for 2xx results and for deterministic client errors.
+Server errors, 409 and 429 are not stored, so a retry runs the request again.
+Reusing a key with a different request body is rejected with 422.
+"""
+import os
+import threading
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from app.cache import MISSING, LRUCache
+from app.serialization import FastJSONResponse
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+# How long a duplicate waits for the in-flight original before giving up with 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 30))
+MAX_KEY_LENGTH = 255
+
+# Errors a retry may legitimately resolve; never replayed
+_RETRYABLE_STATUS = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "done", "response")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response = None   # ("ok", status_code, content) or ("error", status_code, detail, headers)
+
+
+class IdempotencyStore:
+    def __init__(self, maxsize: int, ttl: float, wait_timeout: float):
+        self.entries = LRUCache(maxsize, ttl)
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    def _claim(self, key: tuple, fingerprint) -> tuple[_Entry, bool]:
+        """Return (entry, owner); the owner runs the request, everyone else waits on it."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is MISSING:
+                entry = _Entry(fingerprint)
+                self.entries.set(key, entry)
+                return entry, True
+        if entry.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request",
+            )
+        return entry, False
+
+    def _finish(self, key: tuple, entry: _Entry, response) -> None:
+        entry.response = response
+        if response is None:
+            # nothing worth replaying; let the next retry run the request again
+            self.entries.delete(key)
+        entry.done.set()
+
+    def _replay(self, entry: _Entry):
+        if entry.response is None:
+            return None
+        self.replays += 1
+        kind, status_code, *rest = entry.response
+        if kind == "error":
+            detail, headers = rest
+            raise HTTPException(status_code=status_code, detail=detail, headers=headers)
+        return FastJSONResponse(rest[0], status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+    def _in_progress(self):
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress",
+            headers={"Retry-After": "1"},
+        )
+
+    @staticmethod
+    def _scope_key(idempotency_key: str, scope: tuple) -> tuple:
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key is limited to {MAX_KEY_LENGTH} characters")
+        return scope + (idempotency_key,)
+
+    @staticmethod
+    def _outcome(error: HTTPException):
+        if error.status_code >= 500 or error.status_code in _RETRYABLE_STATUS:
+            return None
+        return ("error", error.status_code, error.detail, error.headers)
+
+    def run(self, idempotency_key: str | None, scope: tuple, fingerprint, handler, status_code: int = 200):
+        """Run `handler()` at most once per key (sync routes).
+
+        Without a key the handler's result is returned untouched, so the route
+        behaves exactly as before.
+        """
+        if idempotency_key is None:
+            return handler()
+        key = self._scope_key(idempotency_key, scope)
+        while True:
+            entry, owner = self._claim(key, fingerprint)
+            if owner:
+                break
+            if not entry.done.wait(self.wait_timeout):
+                raise self._in_progress()
+            replay = self._replay(entry)
+            if replay is not None:
+                return replay
+            # the original failed without a stored response: try to run it ourselves
+
+        response = None
+        try:
+            content = jsonable_encoder(handler())
+            response = ("ok", status_code, content)
+            return FastJSONResponse(content, status_code=status_code)
+        except HTTPException as e:
+            response = self._outcome(e)
+            raise
+        finally:
+            self._finish(key, entry, response)
+
+    async def run_async(self, idempotency_key: str | None, scope: tuple, fingerprint, handler, status_code: int = 200):
+        """`run` for async routes; `handler` is a coroutine function."""
+        if idempotency_key is None:
+            return await handler()
+        key = self._scope_key(idempotency_key, scope)
+        while True:
+            entry, owner = self._claim(key, fingerprint)
+            if owner:
+                break
+            if not await run_in_threadpool(entry.done.wait, self.wait_timeout):
+                raise self._in_progress()
+            replay = self._replay(entry)
+            if replay is not None:
+                return replay
+
+        response = None
+        try:
+            content = jsonable_encoder(await handler())
+            response = ("ok", status_code, content)
+            return FastJSONResponse(content, status_code=status_code)
+        except HTTPException as e:
+            response = self._outcome(e)
+            raise
+        finally:
+            self._finish(key, entry, response)
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), "replays": self.replays}
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL, IDEMPOTENCY_WAIT_TIMEOUT)
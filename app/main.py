@@ -1,29 +1,105 @@
-from fastapi import FastAPI
-from app.routers import auth
-from app import models
-from app.database import Base, engine
-from app.routers import cart
-from app.routers.product import router as product_router
-from app.routers.orders import router as order_router  # Importing the orders router
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
+from app.routers import auth, reports
+from app import models, startup
+from app.cart_store import get_cart_store
+from app.compression import CompressionMiddleware
+from app.database import ASYNC_DB, SessionLocal, engine, get_pool_status
+from app.flash_sale import flash_sale
+from app.group_commit import GROUP_COMMIT_CHECKOUT, get_writer
+from app.hashing import hashing_pool
+from app.metrics import MetricsMiddleware, render_metrics
+from app.ratelimit import RateLimitMiddleware
+from app.serialization import FastJSONResponse
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema, migrations and search index, then pool/query/bcrypt warm-up (see app.startup)
+    startup.startup(engine, SessionLocal)
+    if ASYNC_DB and startup.STARTUP_WARMUP:
+        await startup.warm_async_pool()
+
+    hashing_pool.start()
+    if GROUP_COMMIT_CHECKOUT:
+        get_writer().start()
+    if get_cart_store() is not None:
+        get_cart_store().start()
+    flash_sale.start()
+    try:
+        yield
+    finally:
+        # place everything still queued before the process exits
+        if GROUP_COMMIT_CHECKOUT:
+            get_writer().shutdown()
+        # then write pending cart edits to cart_items
+        if get_cart_store() is not None:
+            get_cart_store().shutdown()
+        # hand unsold escrow back to products.stock
+        flash_sale.shutdown()
+        hashing_pool.shutdown()
+
+
+# orjson-backed JSON for every route (stdlib json if orjson is not installed)
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# gzip/brotli for JSON, NDJSON and CSV bodies above COMPRESSION_MIN_SIZE (innermost: sees the raw body)
+app.add_middleware(CompressionMiddleware)
+
+# Per-user/IP token buckets and the global in-flight cap (inside metrics, so 429/503s are counted)
+app.add_middleware(RateLimitMiddleware, router_app=app)
+
+# Per-route latency, status and SQL accounting for /metrics
+app.add_middleware(MetricsMiddleware, router_app=app)
 
 # Root endpoint
 @app.get("/")
 def root():
     return {"message": "FastAPI E-commerce Backend is up!"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Connection pool occupancy and checkout/wait counters (admin only)
+@app.get("/db/pool")
+def read_pool_status(admin_user: models.User = Depends(auth.get_current_admin_user)):
+    return get_pool_status()
+
 # Include auth routes
 app.include_router(auth.router)
 
-# Include product routes
-app.include_router(product_router)
+# Admin sales reports (served from the rollup tables)
+app.include_router(reports.router)
+
+# Admin routes served the same way in both modes (bulk import/export, flash sales,
+# product cache stats).
+# Mounted first, so /products/export is not taken for a /products/{product_id}
+from app.routers.orders import admin_router as order_admin_router
+from app.routers.product import admin_router as product_admin_router
+app.include_router(product_admin_router)
+app.include_router(order_admin_router)
+
+# Only the CRUD routers of the active mode are imported
+if ASYNC_DB:
+    # Same endpoints served by async def handlers on an AsyncSession
+    from app.routers import async_routes
+    app.include_router(async_routes.product_router)
+    app.include_router(async_routes.cart_router)
+    app.include_router(async_routes.order_router)
+else:
+    from app.routers import cart
+    from app.routers.product import router as product_router
+    from app.routers.orders import router as order_router
+
+    # Include product routes
+    app.include_router(product_router)
 
-# Include cart routes
-app.include_router(cart.router)
+    # Include cart routes
+    app.include_router(cart.router)
 
-# Include order routes (added)
-app.include_router(order_router)  # Registering the orders router
+    # Include order routes (added)
+    app.include_router(order_router)  # Registering the orders router
@@ -0,0 +1,265 @@
+"""Request/SQL/pool/bcrypt metrics rendered in the Prometheus text format.
+
+`MetricsMiddleware` times every request and opens a per-request `RequestStats`
+in a context variable; SQLAlchemy cursor events (see `instrument_engine`) add
+each statement and its duration to it. Requests slower than SLOW_REQUEST_MS
+are logged together with the SQL they issued.
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from starlette.routing import Match
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))  # 0 disables the slow-request log
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+slow_logger = logging.getLogger("app.slow_requests")
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, (bucket_counts, total, count) in sorted(self._series.items()):
+            for bound, n in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_label_text(names, key + (bound,))} {n}")
+            lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+def _sample(name: str, help: str, value, kind: str = "gauge") -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route"))
+REQUESTS = Counter(
+    "http_requests_total", "Responses by route and status code", ("method", "route", "status"))
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements issued per request", ("method", "route"), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_seconds", "Time spent in SQL per request", ("method", "route"))
+SQL_STATEMENTS = Counter("sql_statements_total", "SQL statements executed")
+SQL_SECONDS = Counter("sql_seconds_total", "Time spent executing SQL")
+BCRYPT_SECONDS = Histogram(
+    "bcrypt_duration_seconds", "Password hash/verify time including pool queueing", ("operation",))
+RATE_LIMITED = Counter("http_rate_limited_total", "Requests rejected by the rate limiter", ("route", "policy"))
+SHED = Counter("http_shed_total", "Requests shed by the global concurrency limit")
+
+_METRICS = (REQUEST_LATENCY, REQUESTS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS,
+            SQL_STATEMENTS, SQL_SECONDS, BCRYPT_SECONDS, RATE_LIMITED, SHED)
+
+
+# ---------------------- Per-request SQL accounting ----------------------
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "log")
+
+    def __init__(self, keep_statements: bool):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.log = [] if keep_statements else None
+
+
+_current_request: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+    SQL_STATEMENTS.inc()
+    SQL_SECONDS.inc(elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+        if stats.log is not None and len(stats.log) < SLOW_REQUEST_MAX_STATEMENTS:
+            stats.log.append((round(elapsed * 1000, 2), " ".join(statement.split())[:500]))
+
+
+def instrument_engine(engine) -> None:
+    """Attach SQL timing hooks to a (sync) Engine."""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------------------- Middleware ----------------------
+
+def _matching_path(candidates, scope) -> str | None:
+    for candidate in candidates:
+        match, _ = candidate.matches(scope)
+        if match != Match.FULL:
+            continue
+        path = getattr(candidate, "path", None)
+        if path is not None:
+            return path
+        # newer FastAPI keeps included routers as one nested route
+        nested = getattr(candidate, "effective_candidates", None)
+        if nested is not None:
+            return _matching_path(nested(), scope)
+    return None
+
+
+def route_template(app, scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # unknown paths share one label so clients cannot blow up cardinality
+    return _matching_path(getattr(app, "routes", ()), scope) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, router_app=None):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(keep_statements=SLOW_REQUEST_MS > 0)
+        token = _current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            method = scope["method"]
+            route = route_template(self.router_app or self.app, scope)
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+            REQUESTS.inc(method=method, route=route, status=status_code)
+            REQUEST_SQL_STATEMENTS.observe(stats.statements, method=method, route=route)
+            REQUEST_SQL_SECONDS.observe(stats.sql_seconds, method=method, route=route)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                slow_logger.warning(
+                    "slow request %s %s (%s) %.1f ms, %d SQL statements in %.1f ms: %s",
+                    method, scope.get("path"), route, elapsed * 1000, stats.statements,
+                    stats.sql_seconds * 1000, stats.log,
+                )
+
+
+# ---------------------- Exposition ----------------------
+
+def render_metrics() -> str:
+    from app.database import get_pool_status
+    from app.hashing import hashing_pool
+    from app.idempotency import idempotency_store
+    from app.product_cache import product_cache
+
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+
+    pool = get_pool_status()
+    lines += _sample("db_pool_checkouts_total", "Connections checked out of the pool", pool["checkouts"], "counter")
+    lines += _sample("db_pool_waits_total", "Checkouts that waited for a free connection", pool["waits"], "counter")
+    lines += _sample("db_pool_wait_seconds_total", "Time spent waiting in pool checkout", pool["wait_seconds"], "counter")
+    lines += _sample("db_pool_timeouts_total", "Checkouts that timed out", pool["timeouts"], "counter")
+    for key in ("size", "checked_out", "overflow"):
+        if key in pool:
+            lines += _sample(f"db_pool_{key}", f"Pool {key.replace('_', ' ')}", pool[key])
+
+    hashing = hashing_pool.stats()
+    lines += _sample("bcrypt_queue_depth", "Hash jobs pending in the bcrypt pool", hashing["queue_depth"])
+    lines += _sample("bcrypt_rejected_total", "Hash jobs shed because the queue was full", hashing["rejected"], "counter")
+
+    for cache_name, stats in product_cache.stats().items():
+        for key in ("hits", "misses", "evictions"):
+            lines += _sample(f"product_cache_{cache_name}_{key}_total", f"Product cache ({cache_name}) {key}",
+                             stats[key], "counter")
+        lines += _sample(f"product_cache_{cache_name}_size", f"Product cache ({cache_name}) entries", stats["size"])
+
+    idempotency = idempotency_store.stats()
+    lines += _sample("idempotency_replays_total", "Retried writes answered from the idempotency store",
+                     idempotency["replays"], "counter")
+    lines += _sample("idempotency_keys", "Idempotency keys currently stored", idempotency["size"])
+
+    from app.startup import timings
+    for step, seconds in timings.items():
+        lines += _sample(f"startup_{step}_seconds", f"Time spent in startup step {step}", seconds)
+
+    from app.group_commit import GROUP_COMMIT_CHECKOUT, get_writer
+    if GROUP_COMMIT_CHECKOUT:
+        writer = get_writer().stats()
+        lines += _sample("checkout_queue_depth", "Checkouts waiting for the group-commit writer", writer["queue_depth"])
+        lines += _sample("checkout_batches_total", "Group-commit transactions written", writer["batches"], "counter")
+        lines += _sample("checkout_batched_orders_total", "Orders placed by the group-commit writer",
+                         writer["orders"], "counter")
+
+    from app.cart_store import get_cart_store
+    if get_cart_store() is not None:
+        carts = get_cart_store().stats()
+        if carts["carts"] is not None:
+            lines += _sample("cart_store_carts", "Carts held by the write-behind cart store", carts["carts"])
+        lines += _sample("cart_store_dirty", "Carts changed since their last flush", carts["dirty"])
+        lines += _sample("cart_store_flushes_total", "Cart flush transactions written", carts["flushes"], "counter")
+        lines += _sample("cart_store_flushed_carts_total", "Carts written to cart_items", carts["flushed_carts"], "counter")
+        lines += _sample("cart_store_flush_errors_total", "Cart flushes that failed and were retried",
+                         carts["flush_errors"], "counter")
+
+    return "\n".join(lines) + "\n"
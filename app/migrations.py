@@ -0,0 +1,116 @@
+"""In-place upgrades for databases created by an older version of the app.
+
+`Base.metadata.create_all` only creates missing tables; it never adds columns
+or indexes to a table that already exists. `upgrade` fills that gap and is
+safe to run on every startup (it only touches what is missing):
+
+- adds columns declared on the models that the database lacks (they must be
+  nullable or have a server default), and stamps `products.updated_at` on
+  rows that predate it;
+- folds duplicate (user_id, product_id) cart lines into the oldest line,
+  which the unique cart index requires;
+- creates any index declared on the models that the database lacks.
+
+It can also be run by hand:
+
+    python -m app.migrations
+"""
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.schema import CreateColumn
+
+from app.database import Base
+from app.models import CartItem, Product
+
+
+def dedupe_cart_items(conn) -> int:
+    """Merge duplicate cart lines (quantities summed, newest price kept); returns lines removed."""
+    cart = CartItem.__table__
+    duplicates = conn.execute(
+        select(cart.c.user_id, cart.c.product_id)
+        .where(cart.c.user_id.isnot(None), cart.c.product_id.isnot(None))
+        .group_by(cart.c.user_id, cart.c.product_id)
+        .having(func.count() > 1)
+    ).all()
+    removed = 0
+    for user_id, product_id in duplicates:
+        lines = conn.execute(
+            select(cart.c.id, cart.c.quantity, cart.c.price)
+            .where(cart.c.user_id == user_id, cart.c.product_id == product_id)
+            .order_by(cart.c.id)
+        ).all()
+        keep, rest = lines[0], lines[1:]
+        conn.execute(
+            cart.update().where(cart.c.id == keep.id)
+            .values(quantity=sum(line.quantity or 0 for line in lines), price=lines[-1].price)
+        )
+        conn.execute(cart.delete().where(cart.c.id.in_([line.id for line in rest])))
+        removed += len(rest)
+    return removed
+
+
+def add_missing_columns(conn) -> list[str]:
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                spec = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {spec}")
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def stamp_products(conn) -> int:
+    products = Product.__table__
+    return conn.execute(
+        products.update().where(products.c.updated_at.is_(None))
+        # version stays as it is; only rows added before the column get a timestamp
+        .values(updated_at=datetime.utcnow(), version=products.c.version)
+    ).rowcount
+
+
+def create_missing_indexes(conn) -> list[str]:
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    return created
+
+
+def upgrade(engine) -> dict:
+    """Bring an existing database up to the current models; returns what was changed."""
+    with engine.begin() as conn:
+        added = add_missing_columns(conn)
+        if "products.updated_at" in added:
+            stamp_products(conn)
+        existing = {index["name"] for index in inspect(conn).get_indexes(CartItem.__tablename__)}
+        removed = 0 if "uq_cart_items_user_product" in existing else dedupe_cart_items(conn)
+        created = create_missing_indexes(conn)
+    return {"columns_added": added, "cart_lines_merged": removed, "indexes_created": created}
+
+
+def main():
+    from app.database import engine
+
+    Base.metadata.create_all(bind=engine)
+    result = upgrade(engine)
+    print(f"added columns: {', '.join(result['columns_added']) or 'none'}; "
+          f"merged {result['cart_lines_merged']} duplicate cart lines; "
+          f"created indexes: {', '.join(result['indexes_created']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+# Hard upper bound for any list endpoint page
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor pointing just past the row with id `last_id`."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the id encoded in `cursor`, or raise 400 if it was tampered with."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(last_id)
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def split_page(rows: list, limit: int):
+    """Given up to `limit + 1` rows (ORM objects or row dicts), return (page, next_cursor)."""
+    if len(rows) > limit:
+        page = rows[:limit]
+        last = page[-1]
+        return page, encode_cursor(last["id"] if isinstance(last, dict) else last.id)
+    return rows, None
@@ -0,0 +1,98 @@
+"""Read-through cache for catalog reads (single products and non-search list pages).
+
+Values are plain product row dicts (see `crud.PRODUCT_COLUMNS`), never ORM
+instances, so they are safe to share across sessions and threads; callers
+must treat them as read-only. Writers call the `on_product_*` hooks after
+committing; a generation counter stops a reader that started before a write
+from re-filling the cache with the pre-write rows.
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+from app.cache import LRUCache
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 10000))
+PRODUCT_PAGE_CACHE_SIZE = int(os.getenv("PRODUCT_PAGE_CACHE_SIZE", 1000))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", 30))
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    items: tuple
+    ids: frozenset
+    last_id: int | None
+    full: bool              # page returned `limit` rows, so later ids cannot land on it
+    offset_mode: bool       # offset pages shift when an earlier row is deleted
+    next_cursor: str | None = None
+
+
+class ProductCache:
+    def __init__(self, maxsize: int, page_maxsize: int, ttl: float):
+        self.products = LRUCache(maxsize, ttl)
+        self.pages = LRUCache(page_maxsize, ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _bump(self) -> None:
+        with self._lock:
+            self._generation += 1
+
+    # ---- reads ----
+
+    def get_product(self, product_id: int):
+        return self.products.get(product_id)
+
+    # check and set under the lock `_bump` takes: an invalidation either lands
+    # first (and the stale value is dropped) or deletes the value after it is set
+
+    def put_product(self, product: dict, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self.products.set(product["id"], product)
+
+    def get_page(self, key):
+        return self.pages.get(key)
+
+    def put_page(self, key, page: CachedPage, generation: int) -> None:
+        with self._lock:
+            if generation == self._generation:
+                self.pages.set(key, page)
+
+    # ---- invalidation ----
+
+    def on_product_changed(self, *product_ids: int) -> None:
+        """Price/name/stock changed: drop the product and every page listing it."""
+        ids = set(product_ids)
+        self._bump()
+        for product_id in ids:
+            self.products.delete(product_id)
+        self.pages.delete_where(lambda key, page: not page.ids.isdisjoint(ids))
+
+    def on_product_created(self, product_id: int) -> None:
+        """New ids are the highest, so only pages that were not full can gain a row."""
+        self._bump()
+        self.pages.delete_where(lambda key, page: not page.full)
+
+    def on_product_deleted(self, product_id: int) -> None:
+        self._bump()
+        self.products.delete(product_id)
+        self.pages.delete_where(
+            lambda key, page: product_id in page.ids
+            or (page.offset_mode and page.last_id is not None and page.last_id > product_id)
+        )
+
+    def clear(self) -> None:
+        self._bump()
+        self.products.clear()
+        self.pages.clear()
+
+    def stats(self) -> dict:
+        return {"products": self.products.stats(), "pages": self.pages.stats()}
+
+
+product_cache = ProductCache(PRODUCT_CACHE_SIZE, PRODUCT_PAGE_CACHE_SIZE, PRODUCT_CACHE_TTL)
@@ -0,0 +1,257 @@
+"""Token-bucket rate limiting and a global concurrency cap, as ASGI middleware.
+
+Every route gets a policy ("count/seconds", keyed by user, username + IP
+or client IP); expensive routes (bcrypt in /login and /register, write locks
+in checkout) get tighter ones. The user key is the verified token subject,
+read from the Authorization header without touching the database, so
+limiting happens before any route work. The decoded claims are left in the
+request state for `get_current_user`. Requests without a valid token are
+keyed by IP. /login and /register take a token from two buckets: one per
+submitted username plus client IP, so failed logins for one account do not
+lock out the others, and a looser one per client IP, so rotating usernames
+does not buy unlimited bcrypt work. Their bodies are read before routing to
+find the username, and bodies over RATE_LIMIT_MAX_BODY_BYTES get 413.
+
+Limiting is on by default (RATE_LIMIT_ENABLED=1). Behind a reverse proxy or
+load balancer, set RATE_LIMIT_TRUST_FORWARDED=1 so the client IP comes from
+X-Forwarded-For; otherwise every IP-keyed limit is shared by all clients.
+
+Buckets live in a `RateLimitBackend`; the default keeps them in process
+memory. A shared store (e.g. Redis) can be plugged in with `set_backend` so
+that several workers enforce one limit.
+
+MAX_CONCURRENT_REQUESTS caps requests in flight; beyond it requests are
+shed immediately with 503 + Retry-After instead of queueing without bound.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import parse_qs
+
+from app.metrics import RATE_LIMITED, SHED, route_template
+from app.serialization import dumps
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 0))  # 0 = no cap
+# Largest login/register body buffered to read the username
+RATE_LIMIT_MAX_BODY_BYTES = int(os.getenv("RATE_LIMIT_MAX_BODY_BYTES", 16384))
+
+# Never limited: scrapers and probes must keep working under load
+EXEMPT_PATHS = {"/metrics", "/"}
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    name: str
+    count: int
+    seconds: float
+    key: str = "user"  # "user" (falls back to IP without a valid token), "username" (+ IP) or "ip"
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.seconds
+
+    @classmethod
+    def from_env(cls, name: str, default: str, key: str = "user") -> "RatePolicy":
+        """Read "count/seconds" from RATE_LIMIT_<NAME>."""
+        count, _, seconds = os.getenv(f"RATE_LIMIT_{name.upper()}", default).partition("/")
+        return cls(name, int(count), float(seconds or 1), key)
+
+
+DEFAULT_POLICY = RatePolicy.from_env("default", "600/60")
+_CART_POLICY = RatePolicy.from_env("cart", "120/60")
+ROUTE_POLICIES = {
+    ("POST", "/login"): RatePolicy.from_env("login", "10/60", key="username"),
+    ("POST", "/register"): RatePolicy.from_env("register", "5/60", key="username"),
+    ("POST", "/orders/place_order"): RatePolicy.from_env("checkout", "10/60"),
+    ("POST", "/cart/"): _CART_POLICY,
+    ("POST", "/cart/batch"): _CART_POLICY,
+}
+# Per-IP buckets checked before the username buckets above
+IP_POLICIES = {
+    ("POST", "/login"): RatePolicy.from_env("login_ip", "30/60", key="ip"),
+    ("POST", "/register"): RatePolicy.from_env("register_ip", "10/60", key="ip"),
+}
+
+
+# ---------------------- Backends ----------------------
+
+class RateLimitBackend:
+    """Bucket storage. `take` spends one token; returns (allowed, retry_after_seconds)."""
+
+    def take(self, key: str, policy: RatePolicy) -> tuple[bool, float]:
+        raise NotImplementedError
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Buckets in a bounded LRU dict; idle buckets are the first to go."""
+
+    def __init__(self, max_keys: int, clock=time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, policy: RatePolicy) -> tuple[bool, float]:
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (policy.count, now))
+            tokens = min(policy.count, tokens + (now - updated) * policy.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / policy.rate
+
+
+_backend: RateLimitBackend = InMemoryBackend(RATE_LIMIT_MAX_KEYS)
+
+
+def set_backend(backend: RateLimitBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def get_backend() -> RateLimitBackend:
+    return _backend
+
+
+# ---------------------- Middleware ----------------------
+
+def _client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _token_subject(scope) -> str | None:
+    """The verified token subject; the claims are kept in the request state for get_current_user."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            from app.routers.auth import decode_access_token
+            try:
+                claims = decode_access_token(token)
+            except Exception:
+                return None
+            scope.setdefault("state", {})["token_claims"] = (token, claims)
+            return claims.get("sub")
+    return None
+
+
+async def _read_body(scope, receive, limit: int) -> tuple[bytes, list] | None:
+    """The whole request body, plus the messages to replay to the app; None past `limit` bytes."""
+    for name, value in scope.get("headers", ()):
+        if name == b"content-length" and value.isdigit() and int(value) > limit:
+            return None
+    body, messages = b"", []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return body, messages
+        body += message.get("body", b"")
+        if len(body) > limit:
+            return None
+        if not message.get("more_body", False):
+            return body, messages
+
+
+def _replay(messages: list, receive):
+    async def replayed():
+        return messages.pop(0) if messages else await receive()
+    return replayed
+
+
+def _body_username(scope, body: bytes) -> str | None:
+    """The `username` field of a JSON or form-encoded body (register / login)."""
+    content_type = next((value for name, value in scope.get("headers", ()) if name == b"content-type"), b"")
+    try:
+        if content_type.startswith(b"application/json"):
+            username = json.loads(body).get("username")
+        elif content_type.startswith(b"application/x-www-form-urlencoded"):
+            username = parse_qs(body.decode("utf-8")).get("username", [None])[0]
+        else:
+            return None
+    except (ValueError, AttributeError):
+        return None
+    return username.strip().lower()[:150] if isinstance(username, str) and username.strip() else None
+
+
+async def _reject(send, status_code: int, detail: str, retry_after: float | None, extra_headers=()) -> None:
+    body = dumps({"detail": detail})
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        *extra_headers,
+    ]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(max(1, math.ceil(retry_after))).encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, router_app=None, max_concurrent: int = MAX_CONCURRENT_REQUESTS):
+        self.app = app
+        self.router_app = router_app
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0  # only touched on the event loop thread
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if RATE_LIMIT_ENABLED:
+            route = route_template(self.router_app or self.app, scope)
+            policy = ROUTE_POLICIES.get((scope["method"], route), DEFAULT_POLICY)
+            buckets = []
+            ip_policy = IP_POLICIES.get((scope["method"], route))
+            if ip_policy is not None:
+                buckets.append((ip_policy, f"{ip_policy.name}:ip:{_client_ip(scope)}"))
+            if policy.key == "username":
+                read = await _read_body(scope, receive, RATE_LIMIT_MAX_BODY_BYTES)
+                if read is None:
+                    await _reject(send, 413, "Request body too large", None)
+                    return
+                body, messages = read
+                receive = _replay(messages, receive)
+                username = _body_username(scope, body)
+                buckets.append((policy, f"{policy.name}:username:{username}:ip:{_client_ip(scope)}"))
+            else:
+                subject = _token_subject(scope) if policy.key == "user" else None
+                key = f"{policy.name}:user:{subject}" if subject else f"{policy.name}:ip:{_client_ip(scope)}"
+                buckets.append((policy, key))
+            for bucket_policy, key in buckets:
+                allowed, retry_after = _backend.take(key, bucket_policy)
+                if not allowed:
+                    RATE_LIMITED.inc(route=route, policy=bucket_policy.name)
+                    await _reject(send, 429, "Too many requests", retry_after, [
+                        (b"x-ratelimit-limit", f"{bucket_policy.count};w={bucket_policy.seconds:g}".encode()),
+                    ])
+                    return
+
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            SHED.inc()
+            await _reject(send, 503, "Server busy, please retry", 1)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
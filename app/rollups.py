@@ -0,0 +1,221 @@
+"""Sales rollups: per-day totals kept current inside the order transactions.
+
+`record_order` and `move_order` are called by crud.create_order and
+crud.update_order_status before they commit, so the rollups always agree with
+`orders`/`order_items`. Report queries read only the rollup tables, whose size
+depends on days x products x statuses rather than on the number of orders.
+
+`rebuild` recomputes both tables from scratch with GROUP BY, e.g. to backfill
+a database that has orders from before the rollups existed:
+
+    python -m app.rollups rebuild
+"""
+import argparse
+from datetime import date
+
+from sqlalchemy import and_, bindparam, func, select
+from sqlalchemy.orm import Session
+
+from app.models import Order, OrderItem, OrderStatus, Product, ProductSalesDaily, SalesDaily
+
+_sales = SalesDaily.__table__
+_product_sales = ProductSalesDaily.__table__
+
+_SALES_KEYS = ("day", "status")
+_SALES_AMOUNTS = ("orders", "units", "revenue")
+_PRODUCT_KEYS = ("day", "product_id", "status")
+_PRODUCT_AMOUNTS = ("units", "revenue")
+
+
+def _status_value(status) -> str:
+    return getattr(status, "value", status)
+
+
+# ---------------------- Incremental maintenance ----------------------
+
+def _increment_statement(db: Session, table, keys: tuple, amounts: tuple):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + stmt.excluded[column] for column in amounts}
+    )
+
+def _increment(db: Session, table, keys: tuple, amounts: tuple, rows: list[dict]) -> None:
+    """Add each row's `amounts` onto the rollup row identified by `keys`, creating it if missing."""
+    if not rows:
+        return
+    stmt = _increment_statement(db, table, keys, amounts)
+    if stmt is not None:
+        db.execute(stmt, rows)
+        return
+    # other dialects: update in place, insert where nothing matched
+    update = (
+        table.update()
+        .where(and_(*(table.c[key] == bindparam(f"key_{key}") for key in keys)))
+        .values({column: table.c[column] + bindparam(f"add_{column}") for column in amounts})
+    )
+    for row in rows:
+        params = {f"key_{key}": row[key] for key in keys}
+        params.update({f"add_{column}": row[column] for column in amounts})
+        if db.execute(update, params).rowcount == 0:
+            db.execute(table.insert(), row)
+
+def _apply(db: Session, orders, sign: int) -> None:
+    """Add (sign=1) or subtract (sign=-1) `orders`, given as (day, status, items) tuples."""
+    sales, per_product = {}, {}
+    for day, status, items in orders:
+        count, order_units, order_revenue = sales.get((day, status), (0, 0, 0.0))
+        for product_id, quantity, price in items:
+            units, revenue = per_product.get((day, product_id, status), (0, 0.0))
+            per_product[(day, product_id, status)] = (units + quantity, revenue + quantity * price)
+            order_units += quantity
+            order_revenue += quantity * price
+        sales[(day, status)] = (count + 1, order_units, order_revenue)
+
+    # sorted so concurrent transactions lock rollup rows in the same order
+    _increment(db, _sales, _SALES_KEYS, _SALES_AMOUNTS, [
+        {"day": day, "status": status, "orders": sign * count, "units": sign * units, "revenue": sign * revenue}
+        for (day, status), (count, units, revenue) in sorted(sales.items())
+    ])
+    _increment(db, _product_sales, _PRODUCT_KEYS, _PRODUCT_AMOUNTS, [
+        {"day": day, "product_id": product_id, "status": status, "units": sign * units, "revenue": sign * revenue}
+        for (day, product_id, status), (units, revenue) in sorted(per_product.items())
+    ])
+
+def record_order(db: Session, day: date, status, items) -> None:
+    """Add a new order to the rollups; `items` are (product_id, quantity, price) tuples."""
+    _apply(db, [(day, _status_value(status), items)], 1)
+
+def record_orders(db: Session, orders) -> None:
+    """`record_order` for many orders, given as (day, status, items), in two statements."""
+    _apply(db, [(day, _status_value(status), items) for day, status, items in orders], 1)
+
+def move_order(db: Session, order_id: int, day: date | None, old_status, new_status) -> None:
+    """Move an order's totals from `old_status` to `new_status`."""
+    old, new = _status_value(old_status), _status_value(new_status)
+    if old == new or day is None:
+        return
+    items = db.execute(
+        select(OrderItem.product_id, OrderItem.quantity, OrderItem.price).where(OrderItem.order_id == order_id)
+    ).all()
+    _apply(db, [(day, old, items)], -1)
+    _apply(db, [(day, new, items)], 1)
+
+
+# ---------------------- Rebuild ----------------------
+
+def rebuild(db: Session) -> dict:
+    """Recompute both rollup tables from orders/order_items in one transaction."""
+    day = func.date(Order.created_at)
+    order_units = (
+        select(OrderItem.order_id, func.sum(OrderItem.quantity).label("units"))
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+    sales_rows = (
+        select(day, Order.status, func.count(Order.id),
+               func.coalesce(func.sum(order_units.c.units), 0), func.sum(Order.total_price))
+        .select_from(Order)
+        .outerjoin(order_units, order_units.c.order_id == Order.id)
+        .where(Order.created_at.isnot(None))
+        .group_by(day, Order.status)
+    )
+    product_rows = (
+        select(day, OrderItem.product_id, Order.status,
+               func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price))
+        .select_from(OrderItem)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.created_at.isnot(None))
+        .group_by(day, OrderItem.product_id, Order.status)
+    )
+    try:
+        db.execute(_sales.delete())
+        db.execute(_product_sales.delete())
+        db.execute(_sales.insert().from_select(list(_SALES_KEYS + _SALES_AMOUNTS), sales_rows))
+        db.execute(_product_sales.insert().from_select(list(_PRODUCT_KEYS + _PRODUCT_AMOUNTS), product_rows))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {
+        "sales_daily": db.execute(select(func.count()).select_from(_sales)).scalar(),
+        "product_sales_daily": db.execute(select(func.count()).select_from(_product_sales)).scalar(),
+    }
+
+
+# ---------------------- Reports ----------------------
+
+def _filter(query, table, start: date, end: date, status):
+    query = query.where(table.c.day >= start, table.c.day <= end)
+    if status is not None:
+        return query.where(table.c.status == _status_value(status))
+    # revenue figures leave out cancelled orders unless asked for explicitly
+    return query.where(table.c.status != OrderStatus.CANCELLED.value)
+
+def daily_sales(db: Session, start: date, end: date, status=None) -> list[dict]:
+    query = _filter(
+        select(_sales.c.day, func.sum(_sales.c.orders), func.sum(_sales.c.units), func.sum(_sales.c.revenue)),
+        _sales, start, end, status,
+    ).group_by(_sales.c.day).order_by(_sales.c.day)
+    return [
+        {"day": day, "orders": orders, "units": units, "revenue": round(revenue, 2)}
+        for day, orders, units, revenue in db.execute(query)
+    ]
+
+def sales_by_status(db: Session, start: date, end: date) -> list[dict]:
+    query = (
+        select(_sales.c.status, func.sum(_sales.c.orders), func.sum(_sales.c.units), func.sum(_sales.c.revenue))
+        .where(_sales.c.day >= start, _sales.c.day <= end)
+        .group_by(_sales.c.status)
+        .order_by(_sales.c.status)
+    )
+    return [
+        {"status": status, "orders": orders, "units": units, "revenue": round(revenue, 2)}
+        for status, orders, units, revenue in db.execute(query)
+    ]
+
+def top_products(db: Session, start: date, end: date, by: str = "units", limit: int = 10, status=None) -> list[dict]:
+    units = func.sum(_product_sales.c.units).label("units")
+    revenue = func.sum(_product_sales.c.revenue).label("revenue")
+    ranked = _filter(
+        select(_product_sales.c.product_id, units, revenue), _product_sales, start, end, status
+    ).group_by(_product_sales.c.product_id).order_by(
+        (revenue if by == "revenue" else units).desc(), _product_sales.c.product_id
+    ).limit(limit).subquery()
+    query = (
+        select(ranked.c.product_id, Product.name, ranked.c.units, ranked.c.revenue)
+        .outerjoin(Product, Product.id == ranked.c.product_id)
+        .order_by((ranked.c.revenue if by == "revenue" else ranked.c.units).desc(), ranked.c.product_id)
+    )
+    return [
+        {"product_id": product_id, "name": name, "units": units, "revenue": round(revenue, 2)}
+        for product_id, name, units, revenue in db.execute(query)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sales rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)  # the rollup tables may not exist yet
+    db = SessionLocal()
+    try:
+        counts = rebuild(db)
+    finally:
+        db.close()
+    print(f"rebuilt sales_daily ({counts['sales_daily']} rows) and "
+          f"product_sales_daily ({counts['product_sales_daily']} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""`async def` versions of the product, cart and order routes (ASYNC_DB=1).
+
+Same paths, parameters and response models as app/routers/product.py,
+cart.py and orders.py, but every DB round-trip is awaited on an AsyncSession
+instead of holding a threadpool worker. The admin routes that run on sync
+sessions (the admin_router of product.py and orders.py: bulk import/export,
+flash sales, cache stats) are not duplicated here; app.main mounts them in both modes.
+"""
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import async_crud, schemas
+from app.conditional import cache_headers, is_not_modified, not_modified, page_etag, product_etag, product_modified
+from app.database import get_async_db
+from app.fieldsets import CART_FIELDS, ORDER_FIELDS, PRODUCT_FIELDS, parse_fields, trim
+from app.flash_sale import flash_sale
+from app.group_commit import GROUP_COMMIT_CHECKOUT, get_writer
+from app.idempotency import idempotency_store
+from app.models import User
+from app.pagination import MAX_PAGE_SIZE, decode_cursor, split_page
+from app.routers.auth import (
+    CREDENTIALS_EXCEPTION, admin_principal, cached_principal, remember_principal, request_claims,
+)
+from app.serialization import FastJSONResponse
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_async_db)) -> User:
+    payload = request_claims(request, token)
+    admin_user = admin_principal(payload)
+    if admin_user:
+        return admin_user
+
+    user = cached_principal(payload)
+    if user:
+        return user
+
+    user = await async_crud.get_user_by_username(db, payload["sub"])
+    if not user:
+        raise CREDENTIALS_EXCEPTION
+    remember_principal(user)
+    return user
+
+
+async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+
+# ---------------------- Products ----------------------
+
+product_router = APIRouter(prefix="/products", tags=["Products"])
+
+@product_router.get("/", response_model=Union[List[schemas.ProductOut], schemas.ProductPage])
+async def read_products(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    search: str = Query(None, description="Search products by name/description"),
+    pagination: schemas.PaginationMode = Query(schemas.PaginationMode.OFFSET),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (sparse fieldset); id is always included"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    fieldset = parse_fields(fields, PRODUCT_FIELDS)
+    if pagination == schemas.PaginationMode.CURSOR or cursor is not None:
+        after_id = decode_cursor(cursor) if cursor else None
+        key = ("cursor", after_id, limit, search, fieldset)
+        rows = await async_crud.get_products_after_validator(db, after_id=after_id, limit=limit, search=search)
+        rows, next_cursor = split_page(rows, limit)
+        etag = page_etag(key, rows, next_cursor)
+        if is_not_modified(request, etag):
+            return not_modified("products.list", etag)
+        if fieldset is not None:
+            rows = await async_crud.get_product_rows_after(db, after_id=after_id, limit=limit, search=search,
+                                                           fields=fieldset)
+            items, next_cursor = split_page(rows, limit)
+            headers = cache_headers("products.list", page_etag(key, items, next_cursor))
+            items = flash_sale.with_escrow_all(items)
+            return FastJSONResponse({"items": trim(items, fieldset), "next_cursor": next_cursor}, headers=headers)
+        rows = await async_crud.get_products_after(db, after_id=after_id, limit=limit, search=search)
+        items, next_cursor = split_page(rows, limit)
+        response.headers.update(cache_headers("products.list", page_etag(key, items, next_cursor)))
+        return schemas.ProductPage(items=flash_sale.with_escrow_all(items), next_cursor=next_cursor)
+
+    key = ("offset", skip, limit, search, fieldset)
+    rows = await async_crud.get_products_validator(db, skip=skip, limit=limit, search=search)
+    etag = page_etag(key, rows)
+    if is_not_modified(request, etag):
+        return not_modified("products.list", etag)
+    if fieldset is not None:
+        items = await async_crud.get_product_rows(db, skip=skip, limit=limit, search=search, fields=fieldset)
+        headers = cache_headers("products.list", page_etag(key, items))
+        return FastJSONResponse(trim(flash_sale.with_escrow_all(items), fieldset), headers=headers)
+    items = await async_crud.get_products(db, skip=skip, limit=limit, search=search)
+    response.headers.update(cache_headers("products.list", page_etag(key, items)))
+    return flash_sale.with_escrow_all(items)
+
+@product_router.get("/{product_id}", response_model=schemas.ProductOut)
+async def read_product(product_id: int, request: Request, response: Response,
+                       db: AsyncSession = Depends(get_async_db)):
+    validator = await async_crud.get_product_validator(db, product_id)
+    if validator and is_not_modified(request, product_etag(validator), product_modified(validator)):
+        return not_modified("products.detail", product_etag(validator), product_modified(validator))
+    product = await async_crud.get_product(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    response.headers.update(cache_headers("products.detail", product_etag(product), product_modified(product)))
+    return flash_sale.with_escrow(product)
+
+@product_router.post("/", response_model=schemas.ProductOut, status_code=status.HTTP_201_CREATED)
+async def create_new_product(
+    product: schemas.ProductCreate,
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    return await async_crud.create_product(db, product)
+
+@product_router.put("/{product_id}", response_model=schemas.ProductOut)
+async def update_existing_product(
+    product_id: int,
+    updates: schemas.ProductUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    db_product = await async_crud.get_product(db, product_id)
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return await async_crud.update_product(db, db_product, updates)
+
+@product_router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_existing_product(
+    product_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    db_product = await async_crud.get_product(db, product_id)
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    await async_crud.delete_product(db, db_product)
+    return
+
+
+# ---------------------- Cart ----------------------
+
+cart_router = APIRouter(prefix="/cart", tags=["Cart"])
+
+@cart_router.get("/", response_model=List[schemas.CartItemOut])
+async def read_cart_items(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (sparse fieldset); id is always included"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    fieldset = parse_fields(fields, CART_FIELDS)
+    return FastJSONResponse(trim(await async_crud.get_cart_rows(db, current_user.id, fields=fieldset), fieldset))
+
+@cart_router.post("/", response_model=schemas.CartItemOut, status_code=status.HTTP_201_CREATED)
+async def add_to_cart(
+    item: schemas.CartItemCreate,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    async def add():
+        return await async_crud.add_cart_item(db, current_user.id, item.product_id, item.quantity)
+
+    return await idempotency_store.run_async(
+        idempotency_key, ("add_to_cart", current_user.id), (item.product_id, item.quantity), add,
+        status_code=status.HTTP_201_CREATED,
+    )
+
+@cart_router.put("/{product_id}", response_model=schemas.CartItemOut)
+async def update_cart_item_quantity(product_id: int, update: schemas.CartItemUpdate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    cart_item = await async_crud.update_cart_item(db, current_user.id, product_id, update.quantity)
+    if not cart_item:
+        raise HTTPException(status_code=404, detail="Cart item not found")
+    return cart_item
+
+@cart_router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_from_cart(product_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    await async_crud.remove_cart_item(db, current_user.id, product_id)
+    return
+
+@cart_router.post("/batch", response_model=schemas.CartOut)
+async def apply_cart_operations(batch: schemas.CartBatchRequest, current_user: User = Depends(get_current_user),
+                                db: AsyncSession = Depends(get_async_db)):
+    """Apply a list of add/set/remove operations in one transaction and return the whole cart."""
+    return await async_crud.apply_cart_batch(db, current_user.id, batch.operations)
+
+
+# ---------------------- Orders ----------------------
+
+order_router = APIRouter(prefix="/orders", tags=["Orders"])
+
+@order_router.post("/place_order", response_model=Union[schemas.Order, schemas.CheckoutTicket])
+async def place_order(
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    async def checkout():
+        order = await async_crud.create_order(db, current_user.id)
+        if not order:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        return schemas.Order.model_validate(order)
+
+    async def enqueue():
+        if not await async_crud.has_cart_items(db, current_user.id):
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        return schemas.CheckoutTicket(**get_writer().submit(current_user.id))
+
+    if GROUP_COMMIT_CHECKOUT:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return await idempotency_store.run_async(
+            idempotency_key, ("place_order", current_user.id), None, enqueue, status_code=status.HTTP_202_ACCEPTED
+        )
+    return await idempotency_store.run_async(idempotency_key, ("place_order", current_user.id), None, checkout)
+
+@order_router.get("/checkout/{ticket}", response_model=schemas.CheckoutTicket)
+async def get_checkout(ticket: str, current_user: User = Depends(get_current_user)):
+    found = get_writer().get_ticket(ticket, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Checkout ticket not found")
+    return schemas.CheckoutTicket(**found)
+
+@order_router.get("/user_orders", response_model=Union[list[schemas.Order], schemas.OrderPage])
+async def get_orders(
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    pagination: schemas.PaginationMode = Query(schemas.PaginationMode.OFFSET),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (sparse fieldset); id is always included"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    fieldset = parse_fields(fields, ORDER_FIELDS)
+    user_id = None if current_user.is_admin else current_user.id
+    if fieldset is not None:
+        # sparse rows skip the ORM and response_model, like the sync list path
+        if pagination == schemas.PaginationMode.CURSOR or cursor is not None:
+            after_id = decode_cursor(cursor) if cursor else None
+            rows = await async_crud.get_order_rows_after(db, user_id, after_id, limit, fieldset)
+            items, next_cursor = split_page(rows, limit)
+            return FastJSONResponse({"items": items, "next_cursor": next_cursor})
+        return FastJSONResponse(await async_crud.get_order_rows(db, user_id, skip, limit, fieldset))
+
+    if pagination == schemas.PaginationMode.CURSOR or cursor is not None:
+        after_id = decode_cursor(cursor) if cursor else None
+        rows = await async_crud.get_orders_after(db, user_id=user_id, after_id=after_id, limit=limit)
+        items, next_cursor = split_page(rows, limit)
+        return schemas.OrderPage(items=items, next_cursor=next_cursor)
+
+    if current_user.is_admin:
+        return await async_crud.get_all_orders(db, skip=skip, limit=limit)
+    return await async_crud.get_orders(db, current_user.id, skip=skip, limit=limit)
+
+@order_router.get("/order/{order_id}", response_model=schemas.Order)
+async def get_order(
+    order_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    order = await async_crud.get_order(db, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    if not current_user.is_admin and order.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this order")
+
+    return order
+
+@order_router.put("/order/{order_id}/status", response_model=schemas.Order)
+async def update_order_status(
+    order_id: int,
+    status: schemas.OrderStatus,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can update order status")
+
+    order = await async_crud.update_order_status(db, order_id, status)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
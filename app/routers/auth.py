@@ -1,29 +1,22 @@
 import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer,OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
 from app import schemas, crud
-from app.database import SessionLocal
+from app.cache import MISSING, LRUCache
+from app.database import get_db
+from app.hashing import hashing_pool
 from app.models import User
 
 
-# Load environment variables from .env file
-load_dotenv()
-
 # --- Password hashing setup ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    """Hash a plain-text password using bcrypt."""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify that a plain-text password matches the hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
+# The single CryptContext lives in app.utils; request handlers go through the
+# bounded process pool in app.hashing so bcrypt never runs on request workers.
 
 # --- JWT Token settings ---
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -40,29 +33,74 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# --- Principal cache ---
+# get_current_user runs on every authenticated request; cache the user row by
+# token subject for a short TTL. With EMBED_TOKEN_CLAIMS=1, login also puts
+# id/email/admin flag into the token so the lookup is skipped entirely.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+EMBED_TOKEN_CLAIMS = os.getenv("EMBED_TOKEN_CLAIMS", "0") == "1"
+
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+_PRINCIPAL_FIELDS = ("id", "username", "email", "hashed_password", "is_admin")
+
+
+def token_claims(user: User) -> dict:
+    """Claims for a user's access token."""
+    claims = {"sub": user.username}
+    if EMBED_TOKEN_CLAIMS:
+        claims.update({"uid": user.id, "email": user.email, "adm": bool(user.is_admin)})
+    return claims
+
+
+def cached_principal(payload: dict) -> User | None:
+    """Resolve the user from embedded claims or the principal cache, without touching the DB."""
+    if EMBED_TOKEN_CLAIMS and "uid" in payload:
+        return User(
+            id=payload["uid"],
+            username=payload["sub"],
+            email=payload.get("email"),
+            is_admin=payload.get("adm", False),
+        )
+    fields = principal_cache.get(payload["sub"])
+    if fields is MISSING:
+        return None
+    # A fresh detached instance per request; cached rows are never shared
+    return User(**fields)
+
+
+def remember_principal(user: User) -> None:
+    principal_cache.set(user.username, {name: getattr(user, name) for name in _PRINCIPAL_FIELDS})
+
+
+def invalidate_principal(username: str) -> None:
+    principal_cache.delete(username)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_principal(target.username)
+    for old_username in get_history(target, "username").deleted or ():
+        invalidate_principal(old_username)
+
 # --- FastAPI router and dependencies ---
 router = APIRouter()
 
-def get_db():
-    """Dependency to get DB session."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 # --- Auth API endpoints ---
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register a new user with a unique username."""
-    db_user = crud.get_user_by_username(db, user.username)
+    db_user = await run_in_threadpool(crud.get_user_by_username, db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    hashed_pw = hash_password(user.password)
-    return crud.create_user(db, schemas.UserCreate(username=user.username, email=user.email, password=user.password, hashed_password=hashed_pw))
+    # Hash exactly once, off the request workers
+    hashed_pw = await hashing_pool.hash(user.password)
+    return await run_in_threadpool(crud.create_user, db, user, hashed_pw)
 
 
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
@@ -73,14 +111,15 @@ if not ADMIN_HASHED_PASSWORD:
 
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
     Login user by verifying credentials and returning a JWT token.
     Accepts form data for compatibility with Swagger UI OAuth2.
     """
      # --- Admin Login Check ---
     if form_data.username == ADMIN_USERNAME:
-        if not verify_password(form_data.password, ADMIN_HASHED_PASSWORD):
+        valid, _ = await hashing_pool.verify_and_update(form_data.password, ADMIN_HASHED_PASSWORD)
+        if not valid:
             raise HTTPException(status_code=400, detail="Invalid admin credentials")
 
         # Create admin token
@@ -91,45 +130,74 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         return {"access_token": access_token, "token_type": "bearer"}
     
 
-    db_user = crud.get_user_by_username(db, form_data.username)
-    if not db_user or not verify_password(form_data.password, db_user.hashed_password):
+    db_user = await run_in_threadpool(crud.get_user_by_username, db, form_data.username)
+    if not db_user:
         raise HTTPException(status_code=400, detail="Invalid username or password")
+    valid, new_hash = await hashing_pool.verify_and_update(form_data.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid username or password")
+    if new_hash:
+        # bcrypt cost changed since this hash was made; upgrade it transparently
+        await run_in_threadpool(crud.update_user_password, db, db_user, new_hash)
 
-    access_token = create_access_token(data={"sub": db_user.username})
+    access_token = create_access_token(data=token_claims(db_user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """Decode JWT token, verify user exists, and return current user object."""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid or missing token",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+CREDENTIALS_EXCEPTION = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid or missing token",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def decode_access_token(token: str) -> dict:
+    """Decode and validate a JWT, returning its claims (raises 401 if invalid)."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
-        role: str | None = payload.get("role")
-        if username is None:
-            raise credentials_exception
-        
-          # If admin token
-        if role == "admin" and username == ADMIN_USERNAME:
-            admin_user = User(
-                id=0,
-                username=ADMIN_USERNAME,
-                email="admin@example.com",
-                hashed_password=ADMIN_HASHED_PASSWORD,
-                is_admin=True
-            )
-            return admin_user
-        
     except JWTError:
-        raise credentials_exception
+        raise CREDENTIALS_EXCEPTION
+    if payload.get("sub") is None:
+        raise CREDENTIALS_EXCEPTION
+    return payload
+
+
+def request_claims(request: Request, token: str) -> dict:
+    """The token's claims, reusing the ones RateLimitMiddleware already decoded for this request."""
+    decoded = request.scope.get("state", {}).get("token_claims")
+    if decoded is not None and decoded[0] == token:
+        return decoded[1]
+    return decode_access_token(token)
+
+
+def admin_principal(payload: dict) -> User | None:
+    """Return the built-in admin user if the claims belong to the admin token."""
+    if payload.get("role") == "admin" and payload.get("sub") == ADMIN_USERNAME:
+        return User(
+            id=0,
+            username=ADMIN_USERNAME,
+            email="admin@example.com",
+            hashed_password=ADMIN_HASHED_PASSWORD,
+            is_admin=True
+        )
+    return None
+
+
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """Decode JWT token, verify user exists, and return current user object."""
+    payload = request_claims(request, token)
+    admin_user = admin_principal(payload)
+    if admin_user:
+        return admin_user
 
-    user = db.query(User).filter(User.username == username).first()
+    user = cached_principal(payload)
+    if user:
+        return user
+
+    user = db.query(User).filter(User.username == payload["sub"]).first()
     if not user:
-        raise credentials_exception
+        raise CREDENTIALS_EXCEPTION
+    remember_principal(user)
     return user
 
 
@@ -146,3 +214,9 @@ def get_current_admin_user(current_user: User = Depends(get_current_user)) -> Us
 def read_profile(current_user: User = Depends(get_current_user)):
     """Return the profile of the logged-in user."""
     return current_user
+
+
+@router.get("/hash_pool/stats")
+def read_hash_pool_stats(admin_user: User = Depends(get_current_admin_user)):
+    """Queue depth and throughput of the password hashing pool (admin only)."""
+    return hashing_pool.stats()
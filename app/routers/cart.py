@@ -1,47 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app import schemas, crud
-from app.database import SessionLocal
+from app.database import get_db
+from app.fieldsets import CART_FIELDS, parse_fields, trim
+from app.idempotency import idempotency_store
 from app.routers.auth import get_current_user
+from app.serialization import FastJSONResponse
 from app.models import User
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=List[schemas.CartItemOut])
-def read_cart_items(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    items = crud.get_cart_items(db, current_user.id)
-    # enrich with product name for response
-    for item in items:
-        item.product_name = item.product.name
-    return items
+def read_cart_items(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (sparse fieldset); id is always included"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # column rows with the product name joined in; returned without re-validation
+    fieldset = parse_fields(fields, CART_FIELDS)
+    return FastJSONResponse(trim(crud.get_cart_rows(db, current_user.id, fields=fieldset), fieldset))
 
 @router.post("/", response_model=schemas.CartItemOut, status_code=status.HTTP_201_CREATED)
-def add_to_cart(item: schemas.CartItemCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    product = crud.get_product(db, item.product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    cart_item = crud.add_cart_item(db, current_user.id, item.product_id, item.quantity)
-    cart_item.product_name = product.name
-    return cart_item
+def add_to_cart(
+    item: schemas.CartItemCreate,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the first response"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    def add():
+        # one upsert statement; 404s when the product does not exist
+        return crud.add_cart_item(db, current_user.id, item.product_id, item.quantity)
+
+    return idempotency_store.run(
+        idempotency_key, ("add_to_cart", current_user.id), (item.product_id, item.quantity), add,
+        status_code=status.HTTP_201_CREATED,
+    )
 
 @router.put("/{product_id}", response_model=schemas.CartItemOut)
 def update_cart_item_quantity(product_id: int, update: schemas.CartItemUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     cart_item = crud.update_cart_item(db, current_user.id, product_id, update.quantity)
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
-    cart_item.product_name = cart_item.product.name
     return cart_item
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 def remove_from_cart(product_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     crud.remove_cart_item(db, current_user.id, product_id)
     return
+
+@router.post("/batch", response_model=schemas.CartOut)
+def apply_cart_operations(batch: schemas.CartBatchRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Apply a list of add/set/remove operations in one transaction and return the whole cart."""
+    return crud.apply_cart_batch(db, current_user.id, batch.operations)
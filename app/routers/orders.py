@@ -1,39 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Optional, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app import crud, models, schemas
-from app.database import get_db
+from app import bulk, crud, models, schemas
+from app.database import SessionLocal, get_db
+from app.fieldsets import ORDER_FIELDS, parse_fields
+from app.group_commit import GROUP_COMMIT_CHECKOUT, get_writer
+from app.idempotency import idempotency_store
+from app.pagination import MAX_PAGE_SIZE, decode_cursor, split_page
 from app.routers.auth import get_current_user
+from app.serialization import FastJSONResponse
 from app.schemas import OrderStatus
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
+# Admin routes that run on sync sessions in either mode; app.main mounts these in both ASYNC_DB modes
+admin_router = APIRouter(prefix="/orders", tags=["Orders"])
 
 
 # Route 1: Place an order (User only)
-@router.post("/place_order", response_model=schemas.Order)
+@router.post("/place_order", response_model=Union[schemas.Order, schemas.CheckoutTicket])
 def place_order(
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the first response"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    cart_items = crud.get_cart_items(db, current_user.id)
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    order = crud.create_order(db, current_user.id)
-    if not order:
-        raise HTTPException(status_code=400, detail="Order creation failed")
-    
-    return order
+    def checkout():
+        order = crud.create_order(db, current_user.id)
+        if not order:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        return schemas.Order.model_validate(order)
+
+    def enqueue():
+        if not crud.has_cart_items(db, current_user.id):
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        return schemas.CheckoutTicket(**get_writer().submit(current_user.id))
+
+    if GROUP_COMMIT_CHECKOUT:
+        # 202 + ticket; the background writer places the order (see app/group_commit.py)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return idempotency_store.run(
+            idempotency_key, ("place_order", current_user.id), None, enqueue, status_code=status.HTTP_202_ACCEPTED
+        )
+    return idempotency_store.run(idempotency_key, ("place_order", current_user.id), None, checkout)
+
+
+# Route 1b: Poll a queued checkout (GROUP_COMMIT_CHECKOUT=1)
+@router.get("/checkout/{ticket}", response_model=schemas.CheckoutTicket)
+def get_checkout(ticket: str, current_user: models.User = Depends(get_current_user)):
+    found = get_writer().get_ticket(ticket, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Checkout ticket not found")
+    return schemas.CheckoutTicket(**found)
 
 
 # Route 2: Get orders (User sees their own, Admin sees all)
-@router.get("/user_orders", response_model=list[schemas.Order])
+@router.get("/user_orders", response_model=Union[list[schemas.Order], schemas.OrderPage])
 def get_orders(
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    pagination: schemas.PaginationMode = Query(schemas.PaginationMode.OFFSET),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (implies cursor mode)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (sparse fieldset); id is always included"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    if current_user.is_admin:
-        return crud.get_all_orders(db)
-    return crud.get_orders(db, current_user.id)
+    # orders and items are read as column rows and returned without re-validation
+    fieldset = parse_fields(fields, ORDER_FIELDS)
+    user_id = None if current_user.is_admin else current_user.id
+    if pagination == schemas.PaginationMode.CURSOR or cursor is not None:
+        after_id = decode_cursor(cursor) if cursor else None
+        rows = crud.get_order_rows_after(db, user_id=user_id, after_id=after_id, limit=limit, fields=fieldset)
+        items, next_cursor = split_page(rows, limit)
+        return FastJSONResponse({"items": items, "next_cursor": next_cursor})
+
+    return FastJSONResponse(crud.get_order_rows(db, user_id=user_id, skip=skip, limit=limit, fields=fieldset))
 
 
 # Route 3: View a specific order
@@ -64,8 +106,43 @@ def update_order_status(
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can update order status")
 
-    order = crud.get_orders(db, order_id)
+    order = crud.update_order_status(db, order_id, status)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    return crud.update_order_status(db, order_id, status)
+    return order
+
+
+# Route 5: Stream all orders for export (Admin only)
+@admin_router.get("/export")
+def export_orders(
+    format: schemas.BulkFormat = Query(schemas.BulkFormat.NDJSON),
+    start: Optional[datetime] = Query(None, description="created_at >= start"),
+    end: Optional[datetime] = Query(None, description="created_at < end"),
+    status: Optional[OrderStatus] = Query(None),
+    user_id: Optional[int] = Query(None),
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can export orders")
+
+    status_filter = models.OrderStatus(status.value) if status else None
+
+    def generate():
+        # own session: the request-scoped one may be closed before streaming ends
+        db = SessionLocal()
+        try:
+            orders = crud.iter_orders_for_export(db, start=start, end=end, status=status_filter, user_id=user_id)
+            if format == schemas.BulkFormat.CSV:
+                yield from bulk.csv_lines(bulk.flatten_order_items(orders), bulk.ORDER_EXPORT_FIELDS)
+            else:
+                yield from bulk.ndjson_lines(orders)
+        finally:
+            db.close()
+
+    media_type = "text/csv" if format == schemas.BulkFormat.CSV else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format.value}"'},
+    )
@@ -1,21 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Union
 
-from app.schemas import ProductCreate, ProductUpdate, ProductOut
-from app.crud import get_products, get_product, create_product, update_product, delete_product
-from app.database import SessionLocal
+from app import bulk
+from app.schemas import (
+    BulkFormat, ImportRowError, ProductCreate, ProductUpdate, ProductOut, ProductPage, ProductImportResult,
+    PaginationMode,
+)
+from app.conditional import cache_headers, is_not_modified, not_modified, page_etag, product_etag, product_modified
+from app.crud import (
+    get_product_rows, get_product_rows_after, get_product, create_product, update_product, delete_product,
+    get_product_cached, get_products_cached, get_products_after_cached,
+    get_product_validator, get_products_validator, get_products_after_validator,
+    bulk_upsert_products, iter_product_rows,
+)
+from app.database import SessionLocal, get_db
+from app.fieldsets import PRODUCT_FIELDS, parse_fields, trim
+from app.pagination import MAX_PAGE_SIZE, decode_cursor, split_page
+from app.flash_sale import flash_sale
+from app.product_cache import product_cache
 from app.routers.auth import get_current_user  # your existing auth function
+from app.serialization import FastJSONResponse
 from app.models import User
 
 router = APIRouter(prefix="/products", tags=["Products"])
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Admin routes that run on sync sessions in either mode; app.main mounts these
+# in both ASYNC_DB modes, ahead of /products/{product_id}
+admin_router = APIRouter(prefix="/products", tags=["Products"])
 
 # Optional: Admin-check dependency
 def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
@@ -26,21 +40,94 @@ def get_current_admin_user(current_user: User = Depends(get_current_user)) -> Us
         )
     return current_user
 
-@router.get("/", response_model=List[ProductOut])
+# List/detail reads return row dicts in a FastJSONResponse, skipping per-row
+# response_model validation; response_model still documents the shape.
+# Both answer conditional requests with 304 from the version columns (app.conditional).
+@router.get("/", response_model=Union[List[ProductOut], ProductPage])
 def read_products(
+    request: Request,
     skip: int = 0,
-    limit: int = Query(20, le=100),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
     search: str = Query(None, description="Search products by name/description"),
+    pagination: PaginationMode = Query(PaginationMode.OFFSET, description="`cursor` returns {items, next_cursor}"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (implies cursor mode)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (sparse fieldset); id is always included"),
     db: Session = Depends(get_db)
 ):
-    return get_products(db, skip=skip, limit=limit, search=search)
+    fieldset = parse_fields(fields, PRODUCT_FIELDS)
+    if pagination == PaginationMode.CURSOR or cursor is not None:
+        after_id = decode_cursor(cursor) if cursor else None
+        key = ("cursor", after_id, limit, search, fieldset)
+        rows, next_cursor = get_products_after_validator(db, after_id=after_id, limit=limit, search=search)
+        etag = page_etag(key, rows, next_cursor)
+        if is_not_modified(request, etag):
+            return not_modified("products.list", etag)
+        if search:
+            rows = get_product_rows_after(db, after_id=after_id, limit=limit, search=search, fields=fieldset)
+            items, next_cursor = split_page(rows, limit)
+        else:
+            items, next_cursor = get_products_after_cached(db, after_id=after_id, limit=limit, fields=fieldset)
+        headers = cache_headers("products.list", page_etag(key, items, next_cursor))
+        items = flash_sale.with_escrow_all(items)
+        return FastJSONResponse({"items": trim(items, fieldset), "next_cursor": next_cursor}, headers=headers)
+
+    key = ("offset", skip, limit, search, fieldset)
+    rows = get_products_validator(db, skip=skip, limit=limit, search=search)
+    etag = page_etag(key, rows)
+    if is_not_modified(request, etag):
+        return not_modified("products.list", etag)
+    if search:
+        items = get_product_rows(db, skip=skip, limit=limit, search=search, fields=fieldset)
+    else:
+        items = get_products_cached(db, skip=skip, limit=limit, fields=fieldset)
+    headers = cache_headers("products.list", page_etag(key, items))
+    return FastJSONResponse(trim(flash_sale.with_escrow_all(items), fieldset), headers=headers)
+
+@admin_router.get("/cache/stats")
+def read_product_cache_stats(admin_user: User = Depends(get_current_admin_user)):
+    """Hit/miss/eviction counters for the product cache (admin only)."""
+    return product_cache.stats()
+
+@admin_router.get("/flash_sale")
+def read_flash_sale_stats(admin_user: User = Depends(get_current_admin_user)):
+    """Escrow and allocation counters for products in flash-sale mode (admin only)."""
+    return flash_sale.stats()
+
+@admin_router.get("/export")
+def export_products(
+    format: BulkFormat = Query(BulkFormat.NDJSON),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Stream the whole catalog as NDJSON or CSV without loading it into memory."""
+    def generate():
+        # own session: the request-scoped one may be closed before streaming ends
+        db = SessionLocal()
+        try:
+            rows = iter_product_rows(db)
+            if format == BulkFormat.CSV:
+                yield from bulk.csv_lines(rows, bulk.PRODUCT_EXPORT_FIELDS)
+            else:
+                yield from bulk.ndjson_lines(rows)
+        finally:
+            db.close()
+
+    media_type = "text/csv" if format == BulkFormat.CSV else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="products.{format.value}"'},
+    )
 
 @router.get("/{product_id}", response_model=ProductOut)
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    product = get_product(db, product_id)
+def read_product(product_id: int, request: Request, db: Session = Depends(get_db)):
+    validator = get_product_validator(db, product_id)
+    if validator and is_not_modified(request, product_etag(validator), product_modified(validator)):
+        return not_modified("products.detail", product_etag(validator), product_modified(validator))
+    product = get_product_cached(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    headers = cache_headers("products.detail", product_etag(product), product_modified(product))
+    return FastJSONResponse(flash_sale.with_escrow(product), headers=headers)
 
 @router.post("/", response_model=ProductOut, status_code=status.HTTP_201_CREATED)
 def create_new_product(
@@ -73,3 +160,69 @@ def delete_existing_product(
         raise HTTPException(status_code=404, detail="Product not found")
     delete_product(db, db_product)
     return
+
+@admin_router.post("/{product_id}/flash_sale")
+def enable_flash_sale(
+    product_id: int,
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Serve this product's checkouts from the in-process flash-sale allocator."""
+    if not get_product(db, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    flash_sale.enable(product_id)
+    return flash_sale.stats()["products"][product_id]
+
+@admin_router.delete("/{product_id}/flash_sale", status_code=status.HTTP_204_NO_CONTENT)
+def disable_flash_sale(product_id: int, admin_user: User = Depends(get_current_admin_user)):
+    """Leave flash-sale mode and return unsold escrow to the product's stock."""
+    flash_sale.disable(product_id)
+    return
+
+@admin_router.post("/import", response_model=ProductImportResult)
+async def import_products(
+    request: Request,
+    format: Optional[BulkFormat] = Query(None, description="Defaults from Content-Type (text/csv or NDJSON)"),
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Stream an NDJSON/CSV upload into the catalog in chunked bulk writes.
+
+    Every row is validated against ProductCreate; rows with an `id` upsert that
+    product. Invalid rows are reported by line number and skipped.
+    """
+    fmt = bulk.detect_format(request.headers.get("content-type"), format)
+    parse = bulk.iter_csv_records if fmt == BulkFormat.CSV else bulk.iter_ndjson_records
+    result = ProductImportResult()
+
+    def report(line: int, errors: list):
+        result.failed += 1
+        if len(result.errors) < bulk.IMPORT_MAX_REPORTED_ERRORS:
+            result.errors.append(ImportRowError(line=line, errors=errors))
+
+    async def flush(chunk: list):
+        try:
+            inserted, updated = await run_in_threadpool(bulk_upsert_products, db, [row for _, row in chunk])
+        except SQLAlchemyError as e:
+            for line, _ in chunk:
+                report(line, [{"field": None, "error": f"chunk rejected by database: {getattr(e, 'orig', e)}"}])
+            return
+        result.inserted += inserted
+        result.updated += updated
+
+    chunk = []
+    async for line, record, error in parse(bulk.iter_lines(request.stream())):
+        if error:
+            report(line, [{"field": None, "error": error}])
+            continue
+        row, errors = bulk.validate_product_row(record)
+        if errors:
+            report(line, errors)
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= bulk.IMPORT_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    return result
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app import models, rollups, schemas
+from app.database import get_db
+from app.routers.auth import get_current_admin_user
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+# Reports read the rollup tables only; a range is capped so a query stays bounded
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+
+
+def date_range(
+    start: Optional[date] = Query(None, description="First day (UTC), default 30 days before `end`"),
+    end: Optional[date] = Query(None, description="Last day (UTC, inclusive), default today"),
+) -> tuple[date, date]:
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+# Revenue, units and order count per day (cancelled orders excluded unless `status` is given)
+@router.get("/sales/daily", response_model=List[schemas.SalesDay])
+def read_daily_sales(
+    days: tuple[date, date] = Depends(date_range),
+    status: Optional[schemas.OrderStatus] = Query(None),
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user)
+):
+    return rollups.daily_sales(db, *days, status=status)
+
+
+# Totals per order status over the range
+@router.get("/sales/status", response_model=List[schemas.SalesByStatus])
+def read_sales_by_status(
+    days: tuple[date, date] = Depends(date_range),
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user)
+):
+    return rollups.sales_by_status(db, *days)
+
+
+# Best-selling products by units or revenue
+@router.get("/products/top", response_model=List[schemas.TopProduct])
+def read_top_products(
+    days: tuple[date, date] = Depends(date_range),
+    by: schemas.ReportMetric = Query(schemas.ReportMetric.UNITS),
+    limit: int = Query(10, ge=1, le=100),
+    status: Optional[schemas.OrderStatus] = Query(None),
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user)
+):
+    return rollups.top_products(db, *days, by=by.value, limit=limit, status=status)
@@ -1,7 +1,15 @@
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+
+# -------------------------
+# Pagination Schemas
+# -------------------------
+
+class PaginationMode(str, Enum):
+    OFFSET = "offset"
+    CURSOR = "cursor"
 
 # -------------------------
 # User Schemas
@@ -22,8 +30,7 @@ class UserOut(BaseModel):
     email: EmailStr
     is_admin: bool = False
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # -------------------------
 # Product Schemas
@@ -48,9 +55,28 @@ class ProductUpdate(BaseModel):
 
 class ProductOut(ProductBase):
     id: int
+    version: int = 1
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ProductPage(BaseModel):
+    items: List[ProductOut]
+    next_cursor: Optional[str] = None
+
+class BulkFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
 
-    class Config:
-        orm_mode = True
+class ImportRowError(BaseModel):
+    line: int
+    errors: List[dict]
+
+class ProductImportResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
 
 # -------------------------
 # Cart Schemas
@@ -64,14 +90,30 @@ class CartItemUpdate(BaseModel):
     quantity: int
 
 class CartItemOut(BaseModel):
-    id: int
+    id: Optional[int]  # None until a write-behind cart line is first flushed
     product_id: int
     quantity: int
     price: float
     product_name: Optional[str] = None  # Optional for convenience
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class CartOperationType(str, Enum):
+    ADD = "add"        # increase quantity (creates the line if missing)
+    SET = "set"        # set exact quantity; 0 removes the line
+    REMOVE = "remove"  # drop the line
+
+class CartOperation(BaseModel):
+    op: CartOperationType
+    product_id: int
+    quantity: Optional[int] = Field(None, ge=0)
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=200)
+
+class CartOut(BaseModel):
+    items: List[CartItemOut]
+    total: float
 
 # -------------------------
 # Order Schemas
@@ -88,8 +130,7 @@ class OrderItemOut(BaseModel):
     quantity: int
     price: float
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class OrderBase(BaseModel):
     id: int
@@ -98,14 +139,53 @@ class OrderBase(BaseModel):
     status: OrderStatus
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Order(OrderBase):
     items: List[OrderItemOut]  # ✅ updated from cart_items → items
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderPage(BaseModel):
+    items: List[Order]
+    next_cursor: Optional[str] = None
 
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
+
+class CheckoutStatus(str, Enum):
+    QUEUED = "queued"
+    PLACED = "placed"
+    FAILED = "failed"
+
+class CheckoutTicket(BaseModel):
+    ticket: str
+    status: CheckoutStatus
+    order_id: Optional[int] = None  # set once the order is placed
+    detail: Optional[str] = None    # reason when the checkout failed
+
+# -------------------------
+# Report Schemas
+# -------------------------
+
+class ReportMetric(str, Enum):
+    UNITS = "units"
+    REVENUE = "revenue"
+
+class SalesDay(BaseModel):
+    day: date
+    orders: int
+    units: int
+    revenue: float
+
+class SalesByStatus(BaseModel):
+    status: OrderStatus
+    orders: int
+    units: int
+    revenue: float
+
+class TopProduct(BaseModel):
+    product_id: int
+    name: Optional[str] = None  # None once the product has been deleted
+    units: int
+    revenue: float
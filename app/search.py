@@ -0,0 +1,166 @@
+import json
+import os
+import re
+
+from sqlalchemy import Float, Integer, false, or_, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Query, Session
+
+from app.models import Product
+
+# "fts5" (default on SQLite) or "like" (portable fallback, same as the old ILIKE path)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "fts5")
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(search: str) -> list[str]:
+    """Split a user search string into lower-cased word terms."""
+    return _TERM_RE.findall(search.lower())
+
+
+class SearchBackend:
+    """Interface for product search indexes.
+
+    `index`/`remove` are called by crud inside the same transaction as the
+    product write, so the index never drifts from the `products` table.
+    """
+
+    name = "base"
+
+    def setup(self, engine) -> None:
+        pass
+
+    def index(self, db: Session, product: Product) -> None:
+        pass
+
+    def remove(self, db: Session, product_id: int) -> None:
+        pass
+
+    def index_many(self, db: Session, product_ids: list[int]) -> None:
+        pass
+
+    def apply(self, query: Query, search: str, ranked: bool = True) -> Query:
+        raise NotImplementedError
+
+
+class LikeSearchBackend(SearchBackend):
+    """Substring match with ILIKE. Works everywhere, but scans the whole table."""
+
+    name = "like"
+
+    def apply(self, query: Query, search: str, ranked: bool = True) -> Query:
+        pattern = f"%{search.lower()}%"
+        query = query.filter(or_(
+            Product.name.ilike(pattern),
+            Product.description.ilike(pattern)
+        ))
+        return query.order_by(Product.id) if ranked else query
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """SQLite FTS5 index over name/description with bm25 ranking and prefix matching.
+
+    The virtual table keeps its own copy of the text and uses the product id as
+    its rowid, so updates and deletes never need the previous column values.
+    """
+
+    name = "fts5"
+    table = "product_search"
+    # bm25 column weights: a hit in the name outranks a hit in the description
+    weights = (10.0, 1.0)
+
+    def setup(self, engine) -> None:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "name, description, "
+                "tokenize = 'unicode61 remove_diacritics 2', "
+                "prefix = '2 3')"
+            ))
+            indexed = conn.execute(text(f"SELECT count(*) FROM {self.table}")).scalar()
+            total = conn.execute(text("SELECT count(*) FROM products")).scalar()
+            if indexed != total:
+                self._rebuild(conn)
+
+    def _rebuild(self, conn) -> None:
+        conn.execute(text(f"DELETE FROM {self.table}"))
+        conn.execute(text(
+            f"INSERT INTO {self.table} (rowid, name, description) "
+            "SELECT id, name, coalesce(description, '') FROM products"
+        ))
+
+    def index(self, db: Session, product: Product) -> None:
+        self.remove(db, product.id)
+        db.execute(
+            text(f"INSERT INTO {self.table} (rowid, name, description) VALUES (:id, :name, :description)"),
+            {"id": product.id, "name": product.name, "description": product.description or ""},
+        )
+
+    def remove(self, db: Session, product_id: int) -> None:
+        db.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), {"id": product_id})
+
+    def index_many(self, db: Session, product_ids: list[int]) -> None:
+        """Re-index a batch of products straight from the `products` table."""
+        if not product_ids:
+            return
+        # ids travel as one JSON array parameter, so batch size is not bound by SQLite's variable limit
+        params = {"ids": json.dumps(list(product_ids))}
+        db.execute(text(f"DELETE FROM {self.table} WHERE rowid IN (SELECT value FROM json_each(:ids))"), params)
+        db.execute(text(
+            f"INSERT INTO {self.table} (rowid, name, description) "
+            "SELECT id, name, coalesce(description, '') FROM products "
+            "WHERE id IN (SELECT value FROM json_each(:ids))"
+        ), params)
+
+    @staticmethod
+    def match_expression(search: str) -> str | None:
+        """Build an FTS5 MATCH expression: every term must match, each as a prefix."""
+        terms = tokenize(search)
+        if not terms:
+            return None
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def apply(self, query: Query, search: str, ranked: bool = True) -> Query:
+        expression = self.match_expression(search)
+        if expression is None:
+            return query.filter(false())
+
+        w_name, w_description = self.weights
+        hits = (
+            text(
+                f"SELECT rowid AS id, bm25({self.table}, {w_name}, {w_description}) AS rank "
+                f"FROM {self.table} WHERE {self.table} MATCH :match"
+            )
+            .bindparams(match=expression)
+            .columns(id=Integer, rank=Float)
+            .subquery("search_hits")
+        )
+        query = query.join(hits, hits.c.id == Product.id)
+        # bm25() is lower-is-better; id breaks ties so pages are stable
+        return query.order_by(hits.c.rank, Product.id) if ranked else query
+
+
+_backend: SearchBackend = LikeSearchBackend()
+
+
+def configure_search(engine) -> SearchBackend:
+    """Pick and initialise the search backend for `engine`.
+
+    Falls back to ILIKE on non-SQLite databases or SQLite builds without FTS5.
+    """
+    global _backend
+    backend: SearchBackend = LikeSearchBackend()
+    if SEARCH_BACKEND == "fts5" and engine.dialect.name == "sqlite":
+        try:
+            candidate = SQLiteFTS5Backend()
+            candidate.setup(engine)
+            backend = candidate
+        except OperationalError:
+            pass
+    _backend = backend
+    return backend
+
+
+def get_search_backend() -> SearchBackend:
+    return _backend
@@ -0,0 +1,137 @@
+"""Startup work, run from the app's lifespan instead of at import time.
+
+Importing `app.main` only builds the app. The lifespan then:
+
+- prepares the schema: `create_all`, `app.migrations.upgrade` and the search
+  index (`prepare_database`);
+- warms up (STARTUP_WARMUP=1, the default). It opens STARTUP_WARM_CONNECTIONS
+  pooled connections (`warm_pool`), runs the hot read queries once so their
+  SQL is compiled and cached before the first request (`precompile_queries`),
+  and waits until every bcrypt worker process has started and hashed once
+  (`warm_hashing`).
+
+Without the warm-up, the first requests after a deploy pay for the
+connection setup, the statement compilation and, for the first logins, the
+start of a hashing worker process. `timings` records how long each step took, for /metrics and
+benchmarks/startup_benchmark.py.
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import text
+
+from app.database import Base
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+STARTUP_WARM_CONNECTIONS = int(os.getenv("STARTUP_WARM_CONNECTIONS", 4))
+
+logger = logging.getLogger("app.startup")
+
+# step -> seconds, filled in as the lifespan runs
+timings: dict[str, float] = {}
+
+
+def _timed(step: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[step] = round(time.perf_counter() - started, 4)
+
+
+def prepare_database(engine) -> None:
+    from app.migrations import upgrade
+    from app.search import configure_search
+
+    Base.metadata.create_all(bind=engine)
+    # Add columns/indexes (and merge duplicate cart lines) on databases created before they existed
+    upgrade(engine)
+    # Build/attach the product search index (FTS5 on SQLite, ILIKE elsewhere)
+    configure_search(engine)
+
+
+def warm_pool(engine, connections: int = STARTUP_WARM_CONNECTIONS) -> int:
+    """Open up to `connections` pooled connections (pragmas applied) and hand them back to the pool."""
+    size = getattr(engine.pool, "size", None)
+    if size is not None:
+        connections = min(connections, size())
+    opened = []
+    try:
+        for _ in range(max(connections, 1)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+def precompile_queries(session_factory) -> None:
+    """Run the hot read paths once with ids that match nothing, filling SQLAlchemy's compiled cache."""
+    from app import crud
+
+    db = session_factory()
+    try:
+        crud.get_user_by_username(db, "")
+        crud.get_product_row(db, -1)
+        crud.get_product_rows(db, limit=1)
+        crud.get_product_rows_after(db, limit=1)
+        crud.get_products_validator(db, limit=1)
+        crud.get_products_after_validator(db, limit=1)
+        crud.get_product_validator(db, -1)
+        crud.get_cart_items(db, -1)
+        crud.get_carts(db, [-1])
+        crud.get_order_rows(db, user_id=-1, limit=1)
+        crud.get_order_rows_after(db, user_id=-1, limit=1)
+        crud.get_order(db, -1)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def warm_hashing() -> None:
+    """Start the bcrypt workers and wait until each has hashed once, so the first logins skip that.
+
+    With HASH_POOL_WORKERS=0 hashing runs in this process, so the bcrypt backend is loaded here.
+    """
+    from app import utils
+    from app.hashing import hashing_pool
+
+    if hashing_pool.workers > 0:
+        hashing_pool.start(wait_ready=True)
+    else:
+        utils.pwd_context.handler("bcrypt").get_backend()
+
+
+async def warm_async_pool() -> None:
+    """ASYNC_DB=1: open the async engine's first connection as well."""
+    from app.database import get_async_engine
+
+    started = time.perf_counter()
+    try:
+        async with get_async_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        logger.exception("startup step warm_async_pool failed")
+    timings["warm_async_pool"] = round(time.perf_counter() - started, 4)
+
+
+def warm_up(engine, session_factory) -> None:
+    for step, fn, args in (
+        ("warm_pool", warm_pool, (engine,)),
+        ("precompile_queries", precompile_queries, (session_factory,)),
+        ("warm_hashing", warm_hashing, ()),
+    ):
+        try:
+            _timed(step, fn, *args)
+        except Exception:
+            # a failed warm-up only costs the first requests some latency
+            logger.exception("startup step %s failed", step)
+
+
+def startup(engine, session_factory) -> None:
+    _timed("prepare_database", prepare_database, engine)
+    if STARTUP_WARMUP:
+        warm_up(engine, session_factory)
@@ -0,0 +1,101 @@
+"""Sync vs async request path under high concurrency.
+
+    python -m benchmarks.async_benchmark --concurrency 400 --requests 4000
+
+Each mode runs in its own subprocess (ASYNC_DB=0 / ASYNC_DB=1) against a fresh
+SQLite database and drives GET /products and GET /products/{id} through an
+in-process ASGI transport.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import prepare_env, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def drive(app, total: int, concurrency: int, product_count: int) -> dict:
+    import httpx
+
+    rng = random.Random(1)
+    paths = [
+        f"/products/{rng.randint(1, product_count)}" if rng.random() < 0.7 else "/products/?limit=20"
+        for _ in range(total)
+    ]
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(path):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(path) for path in paths))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed)
+
+
+def child(mode: str, total: int, concurrency: int, product_count: int) -> None:
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_env(tmp, ASYNC_DB="1" if mode == "async" else "0")
+        from app.main import app
+        from app.database import SessionLocal, engine
+        from app.models import Product
+        from app.startup import prepare_database
+
+        # the ASGI transport does not run the lifespan, so create the schema here
+        prepare_database(engine)
+
+        db = SessionLocal()
+        db.bulk_insert_mappings(Product, [
+            {"name": f"Product {i}", "description": "benchmark item", "price": 10.0, "stock": 100}
+            for i in range(product_count)
+        ])
+        db.commit()
+        db.close()
+
+        result = asyncio.run(drive(app, total, concurrency, product_count))
+        engine.dispose()
+        os.chdir(ROOT)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=400)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--child", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.requests, args.concurrency, args.products)
+        return
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.products} products")
+    for mode in ("sync", "async"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.async_benchmark", "--child", mode,
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+             "--products", str(args.products)],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<6} {r['throughput_rps']:>8} req/s   p50 {r['p50_ms']:>7} ms   "
+              f"p95 {r['p95_ms']:>7} ms   p99 {r['p99_ms']:>7} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Cart churn: every edit committed to cart_items vs. the write-behind cart store.
+
+    python -m benchmarks.cart_store_benchmark --users 500 --ops 20 --workers 16
+
+Each user makes --ops random cart edits (add / set quantity / remove) through
+app.crud, then every cart is flushed. Reported per mode: edits per second and
+the INSERT/UPDATE/DELETE statements that reached the database. Afterwards
+cart_items must hold exactly the carts the edits produced.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.cart_store import KeyValueCarts, LocalKeyValueClient, MemoryCarts, WriteBehindCartStore, set_cart_store
+from app.database import Base, apply_sqlite_pragmas
+from app.models import CartItem, Product, User
+
+PRODUCTS = 200
+
+
+def edits(user_id: int, ops: int) -> list[tuple]:
+    rng = random.Random(user_id)
+    plan = []
+    for _ in range(ops):
+        product_id = rng.randint(1, 20)
+        roll = rng.random()
+        if roll < 0.6:
+            plan.append(("add", product_id, rng.randint(1, 3)))
+        elif roll < 0.85:
+            plan.append(("set", product_id, rng.randint(1, 5)))
+        else:
+            plan.append(("remove", product_id, None))
+    return plan
+
+
+def expected_cart(plan: list[tuple]) -> dict:
+    cart = {}
+    for op, product_id, quantity in plan:
+        if op == "add":
+            cart[product_id] = cart.get(product_id, 0) + quantity
+        elif op == "set" and product_id in cart:
+            cart[product_id] = quantity
+        elif op == "remove":
+            cart.pop(product_id, None)
+    return cart
+
+
+def shop(SessionLocal, user_id: int, plan: list[tuple]) -> None:
+    db = SessionLocal()
+    try:
+        for op, product_id, quantity in plan:
+            if op == "add":
+                crud.add_cart_item(db, user_id, product_id, quantity)
+            elif op == "set":
+                crud.update_cart_item(db, user_id, product_id, quantity)
+            else:
+                crud.remove_cart_item(db, user_id, product_id)
+    finally:
+        db.close()
+
+
+def run(label: str, args, store: WriteBehindCartStore | None) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                               connect_args={"check_same_thread": False, "timeout": 30},
+                               pool_size=args.workers + 4)
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+        db = SessionLocal()
+        db.bulk_insert_mappings(Product, [
+            {"name": f"Product {i}", "price": 10.0 + i, "stock": 1000} for i in range(PRODUCTS)
+        ])
+        db.bulk_insert_mappings(User, [
+            {"username": f"shopper{i}", "email": f"shopper{i}@example.com", "hashed_password": "x"}
+            for i in range(args.users)
+        ])
+        db.commit()
+        db.close()
+
+        writes = [0]
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count_writes(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+                writes[0] += 1
+
+        if store is not None:
+            store.bind(SessionLocal)
+        set_cart_store(store)
+        plans = {user_id: edits(user_id, args.ops) for user_id in range(1, args.users + 1)}
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                list(pool.map(lambda uid: shop(SessionLocal, uid, plans[uid]), plans))
+            elapsed = time.perf_counter() - started
+            if store is not None:
+                store.flush(wait=True)
+        finally:
+            set_cart_store(None)
+
+        db = SessionLocal()
+        carts = {}
+        for item in db.query(CartItem):
+            carts.setdefault(item.user_id, {})[item.product_id] = item.quantity
+        db.close()
+        engine.dispose()
+
+    edits_done = args.users * args.ops
+    print(f"{label:<8} {edits_done / elapsed:9.1f} edits/s  ({elapsed * 1000:.0f} ms)  "
+          f"{writes[0]} write statements")
+    for user_id, plan in plans.items():
+        assert carts.get(user_id, {}) == expected_cart(plan), f"user {user_id}: cart_items does not match the edits"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--ops", type=int, default=20, help="cart edits per user")
+    parser.add_argument("--workers", type=int, default=16, help="client threads")
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.ops} edits, {args.workers} client threads")
+    run("sql", args, None)
+    run("memory", args, WriteBehindCartStore(MemoryCarts(args.users)))
+    run("kv", args, WriteBehindCartStore(KeyValueCarts(LocalKeyValueClient())))
+
+
+if __name__ == "__main__":
+    main()
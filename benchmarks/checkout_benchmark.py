@@ -0,0 +1,95 @@
+"""Fire concurrent checkouts at one low-stock product and check it is never oversold.
+
+    python -m benchmarks.checkout_benchmark --buyers 200 --stock 25 --workers 32
+
+Each buyer has one unit of the same product in their cart; exactly `stock`
+checkouts must succeed, the rest must fail cleanly, and stock must end at 0.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base
+from app.models import CartItem, Order, OrderItem, Product, User
+
+
+def seed(SessionLocal, buyers: int, stock: int) -> int:
+    db = SessionLocal()
+    try:
+        product = Product(name="Limited sneaker", price=120.0, stock=stock)
+        db.add(product)
+        db.flush()
+        for i in range(buyers):
+            user = User(username=f"buyer{i}", email=f"buyer{i}@example.com", hashed_password="x")
+            db.add(user)
+            db.flush()
+            db.add(CartItem(user_id=user.id, product_id=product.id, quantity=1, price=product.price))
+        db.commit()
+        return product.id
+    finally:
+        db.close()
+
+
+def checkout(SessionLocal, user_id: int) -> str:
+    db = SessionLocal()
+    try:
+        crud.create_order(db, user_id)
+        return "ok"
+    except HTTPException as e:
+        return f"http_{e.status_code}"
+    except OperationalError:
+        return "locked"
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_size=args.workers,
+        )
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+        product_id = seed(SessionLocal, args.buyers, args.stock)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            outcomes = list(pool.map(lambda uid: checkout(SessionLocal, uid), range(1, args.buyers + 1)))
+        elapsed = time.perf_counter() - started
+
+        db = SessionLocal()
+        final_stock = db.query(Product.stock).filter(Product.id == product_id).scalar()
+        orders = db.query(Order).count()
+        order_items = db.query(OrderItem).count()
+        db.close()
+        engine.dispose()
+
+    counts = {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))}
+    print(f"{args.buyers} checkouts, {args.workers} workers, initial stock {args.stock}")
+    print(f"outcomes: {counts}")
+    print(f"final stock {final_stock}, orders {orders}, order items {order_items}")
+    print(f"throughput {args.buyers / elapsed:.1f} checkouts/s ({elapsed * 1000:.0f} ms total)")
+
+    assert final_stock >= 0, "stock went negative"
+    assert orders == counts.get("ok", 0) == order_items, "orders and successful checkouts disagree"
+    assert orders + final_stock == args.stock, "stock and orders do not add up"
+
+
+if __name__ == "__main__":
+    main()
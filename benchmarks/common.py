@@ -0,0 +1,39 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import statistics
+
+# app.routers.auth refuses to import without these; benchmarks never log in as admin.
+# Load is generated from one client on purpose, so rate limiting is off unless overridden.
+BENCH_ENV = {
+    "SECRET_KEY": "benchmark-secret",
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_HASHED_PASSWORD": "$2b$12$benchmarkbenchmarkbenchmarkbenchmarkbenchmarkbenchm",
+    "RATE_LIMIT_ENABLED": "0",
+}
+
+
+def prepare_env(workdir: str, **overrides: str) -> None:
+    """Point the app at a throwaway ./ecommerce.db inside `workdir` before importing it."""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ.update(overrides)
+    os.chdir(workdir)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies_ms: list[float], elapsed_s: float) -> dict:
+    return {
+        "requests": len(latencies_ms),
+        "throughput_rps": round(len(latencies_ms) / elapsed_s, 1) if elapsed_s else 0.0,
+        "mean_ms": round(statistics.mean(latencies_ms), 2) if latencies_ms else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
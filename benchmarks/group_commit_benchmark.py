@@ -0,0 +1,125 @@
+"""Checkout throughput: one commit per order vs. the group-commit writer at several batch sizes.
+
+    python -m benchmarks.group_commit_benchmark --buyers 2000 --workers 32 --batch-sizes 1,8,32,128
+
+Every buyer has 1-3 lines in their cart. Each run uses a fresh database;
+afterwards orders + remaining stock must equal the initial stock for every
+product (no oversell, nothing lost).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database import Base, apply_sqlite_pragmas
+from app.group_commit import QUEUED, GroupCommitWriter, writer_session_factory
+from app.models import CartItem, Order, OrderItem, Product, SalesDaily, User
+
+PRODUCTS = 50
+
+
+def seed(SessionLocal, buyers: int, stock: int) -> None:
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Product, [
+            {"name": f"Product {i}", "price": 10.0 + i, "stock": stock} for i in range(PRODUCTS)
+        ])
+        db.bulk_insert_mappings(User, [
+            {"username": f"buyer{i}", "email": f"buyer{i}@example.com", "hashed_password": "x"}
+            for i in range(buyers)
+        ])
+        db.bulk_insert_mappings(CartItem, [
+            {"user_id": user_id, "product_id": product_id, "quantity": rng.randint(1, 2), "price": 10.0}
+            for user_id in range(1, buyers + 1)
+            for product_id in rng.sample(range(1, PRODUCTS + 1), rng.randint(1, 3))
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def checkout(SessionLocal, user_id: int) -> str:
+    db = SessionLocal()
+    try:
+        crud.create_order(db, user_id)
+        return "placed"
+    except HTTPException as e:
+        return f"http_{e.status_code}"
+    except OperationalError:
+        return "locked"
+    finally:
+        db.close()
+
+
+def run(label: str, args, batch_size: int | None) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30},
+                               pool_size=args.workers + 4)
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+        seed(SessionLocal, args.buyers, args.stock)
+
+        writer = None
+        started = time.perf_counter()
+        if batch_size is None:
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                outcomes = list(pool.map(lambda uid: checkout(SessionLocal, uid), range(1, args.buyers + 1)))
+        else:
+            writer = GroupCommitWriter(SessionLocal, writer_session_factory(url), batch_size, args.max_wait_ms,
+                                       queue_limit=args.buyers)
+            writer.start()
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                tickets = list(pool.map(writer.submit, range(1, args.buyers + 1)))
+            while any(ticket["status"] == QUEUED for ticket in tickets):
+                time.sleep(0.001)
+            outcomes = [ticket["status"] for ticket in tickets]
+        elapsed = time.perf_counter() - started
+        if writer is not None:
+            writer.shutdown()
+            stats = writer.stats()
+
+        db = SessionLocal()
+        stock = dict(db.query(Product.id, Product.stock))
+        sold = dict(db.query(OrderItem.product_id, func.sum(OrderItem.quantity)).group_by(OrderItem.product_id))
+        rollup = db.query(func.sum(SalesDaily.orders), func.sum(SalesDaily.units)).one()
+        totals = (db.query(func.count(Order.id)).scalar(), db.query(func.sum(OrderItem.quantity)).scalar())
+        db.close()
+        engine.dispose()
+
+    counts = {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))}
+    extra = f", {stats['batches']} commits (avg batch {stats['avg_batch']})" if writer is not None else ""
+    print(f"{label:<10} {args.buyers / elapsed:8.1f} orders/s  ({elapsed * 1000:.0f} ms){extra}  {counts}")
+    assert tuple(rollup) == totals, f"sales rollup {tuple(rollup)} != orders {totals}"
+    for product_id, remaining in stock.items():
+        assert remaining >= 0, "stock went negative"
+        assert remaining + sold.get(product_id, 0) == args.stock, f"product {product_id}: units lost or oversold"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=2000)
+    parser.add_argument("--stock", type=int, default=100000, help="initial stock per product")
+    parser.add_argument("--workers", type=int, default=32, help="client threads")
+    parser.add_argument("--batch-sizes", default="1,8,32,128", help="GROUP_COMMIT_BATCH_SIZE values to try")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="GROUP_COMMIT_MAX_WAIT_MS")
+    args = parser.parse_args()
+
+    print(f"{args.buyers} buyers, {PRODUCTS} products, {args.workers} client threads")
+    run("per-order", args, None)
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        run(f"batch={batch_size}", args, batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""In-process load test for every router.
+
+Seeds a throwaway SQLite database at the requested scale, then drives a
+weighted mix of browse/search/cart/checkout/login/orders traffic against the
+ASGI app through httpx's in-process transport. Prints p50/p95/p99 latency and
+throughput per route and writes a JSON result that later runs can compare to.
+
+    python -m benchmarks.loadtest --products 20000 --users 500 --concurrency 64 --requests 5000
+    python -m benchmarks.loadtest --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from benchmarks.common import prepare_env, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "browse=45,search=15,cart=20,checkout=5,orders=10,login=5"
+WORDS = "red blue black leather cotton steel classic modern running office wireless shoe shirt lamp desk watch".split()
+PASSWORD = "benchmark-password"
+
+
+def parse_mix(spec: str) -> dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+# ---------------------- Seeding ----------------------
+
+def seed(args) -> list[str]:
+    """Populate the database; returns one access token per user."""
+    from app.database import SessionLocal, engine
+    from app.models import CartItem, Order, OrderItem, Product, User
+    from app.routers.auth import create_access_token, token_claims
+    from app.search import configure_search
+    from app.utils import hash_password
+
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Product, [
+            {
+                "name": " ".join(rng.sample(WORDS, 3)).title(),
+                "description": " ".join(rng.choices(WORDS, k=25)),
+                "price": round(rng.uniform(2, 400), 2),
+                "image_url": f"https://img.example.com/{i}.jpg",
+                "stock": rng.randint(1000, 100000),
+            }
+            for i in range(args.products)
+        ])
+        hashed = hash_password(PASSWORD)  # one bcrypt call, shared by every seeded user
+        db.bulk_insert_mappings(User, [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": hashed, "is_admin": False}
+            for i in range(args.users)
+        ])
+        db.commit()
+
+        users = db.query(User).order_by(User.id).all()
+        tokens = [create_access_token(token_claims(user)) for user in users]
+
+        carts = []
+        for user in users[: args.carts]:
+            for product_id in rng.sample(range(1, args.products + 1), k=min(3, args.products)):
+                carts.append({"user_id": user.id, "product_id": product_id, "quantity": rng.randint(1, 3), "price": 10.0})
+        db.bulk_insert_mappings(CartItem, carts)
+
+        now = datetime.utcnow()
+        orders = [
+            {
+                "user_id": users[i % len(users)].id,
+                "total_price": 0.0,
+                "status": "pending",
+                "created_at": now - timedelta(minutes=i),
+            }
+            for i in range(args.orders)
+        ]
+        db.bulk_insert_mappings(Order, orders)
+        db.flush()
+        db.bulk_insert_mappings(OrderItem, [
+            {"order_id": order_id, "product_id": rng.randint(1, args.products), "quantity": 1, "price": 10.0}
+            for (order_id,) in db.query(Order.id)
+            for _ in range(2)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    configure_search(engine)
+    return tokens
+
+
+# ---------------------- Scenarios ----------------------
+# Each scenario issues one or more requests via `call(route, method, url, ...)`.
+
+async def browse(call, ctx, rng):
+    if rng.random() < 0.5:
+        await call("GET /products", "GET", f"/products/?skip={rng.randint(0, max(0, ctx.products - 20))}&limit=20")
+    else:
+        await call("GET /products/{id}", "GET", f"/products/{rng.randint(1, ctx.products)}")
+
+async def search(call, ctx, rng):
+    term = rng.choice(WORDS)[: rng.randint(3, 6)]
+    await call("GET /products?search", "GET", f"/products/?search={term}&limit=20")
+
+async def cart(call, ctx, rng):
+    headers = ctx.auth(rng)
+    await call("POST /cart", "POST", "/cart/", headers=headers,
+               json={"product_id": rng.randint(1, ctx.products), "quantity": 1})
+    await call("GET /cart", "GET", "/cart/", headers=headers)
+
+async def checkout(call, ctx, rng):
+    headers = ctx.auth(rng)
+    await call("POST /cart", "POST", "/cart/", headers=headers,
+               json={"product_id": rng.randint(1, ctx.products), "quantity": 1})
+    await call("POST /orders/place_order", "POST", "/orders/place_order", headers=headers)
+
+async def orders(call, ctx, rng):
+    await call("GET /orders/user_orders", "GET", "/orders/user_orders?limit=20", headers=ctx.auth(rng))
+
+async def login(call, ctx, rng):
+    await call("POST /login", "POST", "/login",
+               data={"username": f"user{rng.randrange(ctx.users)}", "password": PASSWORD})
+
+SCENARIOS = {
+    "browse": browse,
+    "search": search,
+    "cart": cart,
+    "checkout": checkout,
+    "orders": orders,
+    "login": login,
+}
+
+
+class Context:
+    def __init__(self, tokens, products, users):
+        self.tokens = tokens
+        self.products = products
+        self.users = users
+
+    def auth(self, rng):
+        return {"Authorization": f"Bearer {rng.choice(self.tokens)}"}
+
+
+async def drive(app, ctx, mix, args) -> dict:
+    import httpx
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    names, weights = zip(*mix.items())
+    remaining = args.requests
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest") as client:
+        async def call(route, method, url, **kwargs):
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies[route].append((time.perf_counter() - started) * 1000)
+            statuses[route][response.status_code] += 1
+
+        async def worker(worker_id):
+            nonlocal remaining
+            rng = random.Random(args.seed * 1000 + worker_id)
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                else:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                scenario = SCENARIOS[rng.choices(names, weights)[0]]
+                await scenario(call, ctx, rng)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route, values in sorted(latencies.items()):
+        routes[route] = summarize(values, elapsed)
+        routes[route]["status"] = {str(code): n for code, n in sorted(statuses[route].items())}
+    everything = [v for values in latencies.values() for v in values]
+    return {"elapsed_s": round(elapsed, 3), "overall": summarize(everything, elapsed), "routes": routes}
+
+
+# ---------------------- Reporting ----------------------
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: dict, baseline: dict | None = None) -> None:
+    header = f"{'route':<28}{'reqs':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  status"
+    print(header)
+    print("-" * len(header))
+    for route, r in result["routes"].items():
+        line = f"{route:<28}{r['requests']:>7}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}  {r['status']}"
+        before = (baseline or {}).get("routes", {}).get(route)
+        if before and before["p95_ms"]:
+            change = (r["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            line += f"  p95 {change:+.1f}% vs {baseline.get('revision') or 'baseline'}"
+        print(line)
+    o = result["overall"]
+    print(f"{'overall':<28}{o['requests']:>7}{o['throughput_rps']:>9}{o['p50_ms']:>9}{o['p95_ms']:>9}{o['p99_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--carts", type=int, default=100, help="users that start with a non-empty cart")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=3000, help="scenario iterations (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="run for N seconds instead of --requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted scenarios (default {DEFAULT_MIX})")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", help="JSON results of an earlier run to diff against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    # the run happens inside a temp dir; resolve file arguments first
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_env(tmp, BCRYPT_ROUNDS=str(args.bcrypt_rounds))
+        from app.database import engine
+        from app.hashing import hashing_pool
+        from app.main import app
+        from app.startup import prepare_database
+
+        # the ASGI transport does not run the lifespan, so create the schema here
+        prepare_database(engine)
+        tokens = seed(args)
+        ctx = Context(tokens, args.products, args.users)
+        print(f"seeded {args.products} products, {args.users} users, {args.orders} orders; "
+              f"concurrency {args.concurrency}, mix {args.mix}")
+        result = asyncio.run(drive(app, ctx, mix, args))
+        hashing_pool.shutdown()
+        engine.dispose()
+        os.chdir(ROOT)
+
+    result.update({
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    })
+    baseline = None
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
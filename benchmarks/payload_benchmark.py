@@ -0,0 +1,83 @@
+"""Product list payloads: full rows vs. a sparse fieldset, raw vs. gzip/brotli.
+
+For each variant, an uncached page is read with crud.get_product_rows and
+rendered the way GET /products does it. The benchmark reports the time per
+page, the bytes read out of the result rows, and the bytes on the wire
+for each encoding.
+
+    python -m benchmarks.payload_benchmark --products 5000 --page 100 --description-bytes 2000
+"""
+import argparse
+import gzip
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.compression import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, brotli
+from app.database import Base
+from app.fieldsets import PRODUCT_FIELDS, parse_fields, trim
+from app.models import Product
+from app.serialization import dumps
+
+LIST_VIEW = "id,name,price,image_url"
+
+
+def seed(db, products: int, description_bytes: int) -> None:
+    db.bulk_insert_mappings(Product, [
+        {
+            "name": f"Product {i}",
+            "description": ("lorem ipsum dolor sit amet %d " % i * description_bytes)[:description_bytes],
+            "price": 10.0 + i % 500,
+            "image_url": f"https://img.example.com/{i}.jpg",
+            "stock": i % 1000,
+        }
+        for i in range(products)
+    ])
+    db.commit()
+
+
+def run(label: str, db, args, fields: str | None) -> None:
+    fieldset = parse_fields(fields, PRODUCT_FIELDS)
+    timings, row_bytes = [], 0
+    pages = max(args.products // args.page, 1)
+    for round_ in range(args.rounds):
+        skip = (round_ % pages) * args.page
+        started = time.perf_counter()
+        rows = crud.get_product_rows(db, skip=skip, limit=args.page, fields=fieldset)
+        body = dumps(trim(rows, fieldset))
+        timings.append(time.perf_counter() - started)
+        row_bytes = sum(len(str(value)) for row in rows for value in row.values())
+    gzipped = len(gzip.compress(body, COMPRESSION_GZIP_LEVEL))
+    br = f"{len(brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)):>8}" if brotli else "     n/a"
+    print(f"{label:<14} {statistics.median(timings) * 1000:8.2f} ms  {row_bytes:>9} B read  "
+          f"{len(body):>9} B raw  {gzipped:>8} B gzip  {br} B br")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--description-bytes", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        seed(db, args.products, args.description_bytes)
+        print(f"{args.products} products, page {args.page}, {args.description_bytes} B descriptions "
+              f"(median of {args.rounds} pages); list view is fields={LIST_VIEW}")
+        run("full rows", db, args, None)
+        run("list view", db, args, LIST_VIEW)
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
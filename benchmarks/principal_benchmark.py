@@ -0,0 +1,87 @@
+"""Per-request latency of GET /cart with and without the principal cache.
+
+    python -m benchmarks.principal_benchmark --requests 3000
+
+Modes: `db` (PRINCIPAL_CACHE_TTL=0, one user lookup per request), `cache`
+(default short-TTL principal cache) and `claims` (EMBED_TOKEN_CLAIMS=1, no
+lookup at all). Each runs in its own subprocess on a fresh database.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import prepare_env, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    "db": {"PRINCIPAL_CACHE_TTL": "0"},
+    "cache": {},
+    "claims": {"EMBED_TOKEN_CLAIMS": "1"},
+}
+
+
+def child(mode: str, total: int, users: int) -> None:
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_env(tmp, **MODES[mode])
+        from fastapi.testclient import TestClient
+
+        from app.database import SessionLocal, engine
+        from app.main import app
+        from app.models import User
+        from app.routers.auth import create_access_token, token_claims
+        from app.startup import prepare_database
+
+        prepare_database(engine)  # seeded before the lifespan runs
+        db = SessionLocal()
+        tokens = []
+        for i in range(users):
+            user = User(username=f"shopper{i}", email=f"shopper{i}@example.com", hashed_password="x")
+            db.add(user)
+            db.flush()
+            tokens.append(create_access_token(token_claims(user)))
+        db.commit()
+        db.close()
+
+        latencies = []
+        with TestClient(app) as client:
+            started = time.perf_counter()
+            for i in range(total):
+                headers = {"Authorization": f"Bearer {tokens[i % users]}"}
+                t0 = time.perf_counter()
+                client.get("/cart/", headers=headers).raise_for_status()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            elapsed = time.perf_counter() - started
+        engine.dispose()
+        os.chdir(ROOT)
+    print(json.dumps(summarize(latencies, elapsed)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--child", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.requests, args.users)
+        return
+
+    print(f"GET /cart x {args.requests}, {args.users} users")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.principal_benchmark", "--child", mode,
+             "--requests", str(args.requests), "--users", str(args.users)],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<7} mean {r['mean_ms']:>7} ms   p50 {r['p50_ms']:>7} ms   p99 {r['p99_ms']:>7} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Compare catalog search latency: ILIKE table scan vs. the SQLite FTS5 index.
+
+The catalog looks like a real one: names combine one of a few thousand
+brands with a category and a model code, and descriptions mix common words
+with rarer ones. Two query sets are timed:
+
+* selective  brand, model and rare-word prefixes, each matching well under 1% of
+             the catalog, which is what shoppers usually type
+* common     color/material/category prefixes that match a large share of the catalog
+
+FTS5 reads only the matching rows from its index, so it wins on selective
+terms. On a common term ILIKE stops after the first `--limit` matches it
+finds, while FTS5 ranks every hit with bm25 before it can return the top ones.
+
+    python -m benchmarks.search_benchmark --products 50000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app import search
+from app.database import Base
+from app.models import Product
+
+COMMON = (
+    "red blue green black white leather cotton wool steel wooden vintage classic "
+    "modern slim running hiking office gaming wireless portable organic premium"
+).split()
+CATEGORIES = "shoe shirt jacket lamp chair desk headphones keyboard backpack bottle watch".split()
+SYLLABLES = "ka lo mi ra ven tor ix zu pel dan sor bri que nal fen gro lux mar tek vo sil dur".split()
+LETTERS = "ABCDEFGHJKLMNPRSTUVWXZ"
+
+
+def vocabulary(rng, count: int, syllables: tuple) -> list[str]:
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.sample(SYLLABLES, rng.randint(*syllables))))
+    return sorted(words)
+
+
+def seed(db, count: int) -> dict:
+    """Insert `count` products; returns the brand, model and rare-word vocabularies used."""
+    rng = random.Random(42)
+    brands = vocabulary(rng, max(count // 25, 50), (2, 3))
+    rare = vocabulary(rng, max(count // 5, 200), (3, 4))
+    models = []
+    batch = []
+    for i in range(count):
+        model = f"{rng.choice(LETTERS)}{rng.randint(100, 9999)}"
+        models.append(model)
+        name = f"{rng.choice(brands).capitalize()} {rng.choice(COMMON)} {rng.choice(CATEGORIES)} {model}"
+        description = " ".join(rng.choices(COMMON + CATEGORIES, k=16) + rng.sample(rare, 3))
+        batch.append({"name": name, "description": description, "price": 9.99, "stock": 10})
+        if len(batch) == 5000:
+            db.bulk_insert_mappings(Product, batch)
+            batch = []
+    if batch:
+        db.bulk_insert_mappings(Product, batch)
+    db.commit()
+    return {"brands": brands, "models": models, "rare": rare}
+
+
+def selective_terms(rng, vocab: dict, queries: int) -> list[str]:
+    terms = []
+    for _ in range(queries):
+        kind = rng.choice(("brands", "models", "rare"))
+        word = rng.choice(vocab[kind])
+        if kind != "models" and len(word) > 5:
+            # a prefix of at least five letters, as typed in a search box
+            word = word[: rng.randint(5, len(word))]
+        terms.append(word)
+    return terms
+
+
+def common_terms(rng, queries: int) -> list[str]:
+    return [word[: rng.randint(3, 6)] for word in rng.choices(COMMON + CATEGORIES, k=queries)]
+
+
+def run(session_factory, backend, terms, limit):
+    timings = []
+    db = session_factory()
+    try:
+        for term in terms:
+            started = time.perf_counter()
+            backend.apply(db.query(Product), term).limit(limit).all()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        db.close()
+    return timings
+
+
+def matches(session_factory, backend, terms) -> float:
+    db = session_factory()
+    try:
+        return statistics.mean(
+            backend.apply(db.query(func.count(Product.id)), term, ranked=False).scalar() for term in terms
+        )
+    finally:
+        db.close()
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    return f"{label:<6} mean {statistics.mean(timings):8.2f} ms   p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine)
+
+        db = SessionLocal()
+        vocab = seed(db, args.products)
+        db.close()
+
+        fts = search.configure_search(engine)
+        if fts.name != "fts5":
+            raise SystemExit("FTS5 is not available in this SQLite build")
+
+        rng = random.Random(7)
+        cases = {"selective": selective_terms(rng, vocab, args.queries), "common": common_terms(rng, args.queries)}
+
+        print(f"{args.products} products, {args.queries} queries per case, limit {args.limit}")
+        for case, terms in cases.items():
+            print(f"{case}: {matches(SessionLocal, fts, terms):.0f} matching products per term on average")
+            print("  " + report("ilike", run(SessionLocal, search.LikeSearchBackend(), terms, args.limit)))
+            print("  " + report("fts5", run(SessionLocal, fts, terms, args.limit)))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Per-row cost of building list responses: ORM + response_model vs. column rows + orjson.
+
+Each strategy fetches a page and renders the JSON body the client receives:
+
+* orm+pydantic  ORM instances -> Schema.model_validate -> jsonable_encoder -> json (FastAPI's default path)
+* rows+json     column tuples -> dicts -> stdlib json
+* rows+orjson   column tuples -> dicts -> FastJSONResponse (what the list endpoints now do)
+
+    python -m benchmarks.serialization_benchmark --page 100 --rounds 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.database import Base
+from app.models import Order, OrderItem, Product
+from app.serialization import FastJSONResponse, json_default, orjson
+
+
+def seed(db, products: int, orders: int) -> None:
+    rng = random.Random(42)
+    db.bulk_insert_mappings(Product, [
+        {
+            "name": f"Product {i}",
+            "description": "lorem ipsum dolor sit amet " * 4,
+            "price": round(rng.uniform(1, 500), 2),
+            "image_url": f"https://img.example.com/{i}.jpg",
+            "stock": rng.randint(0, 1000),
+        }
+        for i in range(products)
+    ])
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(Order, [
+        {"user_id": 1, "total_price": 42.0, "status": "pending", "created_at": now - timedelta(minutes=i)}
+        for i in range(orders)
+    ])
+    db.flush()
+    db.bulk_insert_mappings(OrderItem, [
+        {"order_id": order_id, "product_id": rng.randint(1, products), "quantity": 1, "price": 10.0}
+        for (order_id,) in db.query(Order.id)
+        for _ in range(3)
+    ])
+    db.commit()
+
+
+def orm_products(db, page):
+    products = crud.get_products(db, limit=page)
+    body = jsonable_encoder([schemas.ProductOut.model_validate(p) for p in products])
+    return json.dumps(body).encode()
+
+def row_products_json(db, page):
+    return json.dumps(crud.get_product_rows(db, limit=page), default=json_default).encode()
+
+def row_products_fast(db, page):
+    return FastJSONResponse(crud.get_product_rows(db, limit=page)).body
+
+def orm_orders(db, page):
+    orders = crud.get_orders(db, user_id=1, limit=page)
+    body = jsonable_encoder([schemas.Order.model_validate(o) for o in orders])
+    return json.dumps(body).encode()
+
+def row_orders_json(db, page):
+    return json.dumps(crud.get_order_rows(db, user_id=1, limit=page), default=json_default).encode()
+
+def row_orders_fast(db, page):
+    return FastJSONResponse(crud.get_order_rows(db, user_id=1, limit=page)).body
+
+STRATEGIES = {
+    "products": [("orm+pydantic", orm_products), ("rows+json", row_products_json), ("rows+orjson", row_products_fast)],
+    "orders": [("orm+pydantic", orm_orders), ("rows+json", row_orders_json), ("rows+orjson", row_orders_fast)],
+}
+
+
+def run(session_factory, fn, page: int, rounds: int) -> list[float]:
+    timings = []
+    db = session_factory()
+    try:
+        fn(db, page)  # warm the statement cache
+        for _ in range(rounds):
+            started = time.perf_counter()
+            fn(db, page)
+            timings.append((time.perf_counter() - started) * 1_000_000 / page)
+            db.expunge_all()  # no identity-map reuse between rounds
+    finally:
+        db.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", type=int, default=100, help="rows per response")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine)
+        db = SessionLocal()
+        seed(db, products=max(args.page, 1000), orders=args.page)
+        db.close()
+
+        print(f"page {args.page} rows, {args.rounds} rounds, orjson {'available' if orjson else 'NOT installed'}")
+        for dataset, strategies in STRATEGIES.items():
+            baseline = None
+            for label, fn in strategies:
+                per_row = statistics.median(run(SessionLocal, fn, args.page, args.rounds))
+                baseline = baseline or per_row
+                print(f"{dataset:<9}{label:<14} {per_row:8.2f} us/row   {baseline / per_row:5.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cold start: import, lifespan startup and the first requests, with and without the warm-up.
+
+    python -m benchmarks.startup_benchmark --runs 5
+
+Every run is a fresh process against the same seeded SQLite database. The
+process imports app.main, runs the lifespan startup, then sends the first
+request to each hot route twice: login, product list, product detail, cart
+and orders. Reported (median over runs):
+
+* import      time to import app.main
+* startup     lifespan startup (schema checks, plus the warm-up when enabled)
+* ttfb        process start to the end of the first response (import + startup + first request)
+* first/2nd   latency of the first and the second call to each route
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import prepare_env
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "benchmark-password"
+ENV = {"BCRYPT_ROUNDS": "4"}
+
+
+def seed(workdir: str, products: int) -> None:
+    prepare_env(workdir, **ENV)
+    from app.database import SessionLocal, engine
+    from app.models import Product, User
+    from app.startup import prepare_database
+    from app.utils import hash_password
+
+    prepare_database(engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(Product, [
+        {"name": f"Product {i}", "description": "benchmark item", "price": 10.0, "stock": 100}
+        for i in range(products)
+    ])
+    db.add(User(username="shopper", email="shopper@example.com", hashed_password=hash_password(PASSWORD)))
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+async def measure(process_started: float) -> dict:
+    import httpx
+
+    started = time.perf_counter()
+    from app.main import app
+    result = {"import_ms": (time.perf_counter() - started) * 1000}
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        result["startup_ms"] = (time.perf_counter() - started) * 1000
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            routes = [
+                ("login", "POST", "/login", {"data": {"username": "shopper", "password": PASSWORD}}),
+                ("products", "GET", "/products/?limit=20", {}),
+                ("product", "GET", "/products/1", {}),
+                ("cart", "GET", "/cart/", {}),
+                ("orders", "GET", "/orders/user_orders", {}),
+            ]
+            headers = {}
+            for name, method, path, kwargs in routes:
+                for attempt in ("first", "second"):
+                    t0 = time.perf_counter()
+                    response = await client.request(method, path, headers=headers, **kwargs)
+                    result[f"{name}_{attempt}_ms"] = (time.perf_counter() - t0) * 1000
+                    response.raise_for_status()
+                    if "ttfb_ms" not in result:
+                        result["ttfb_ms"] = (time.perf_counter() - process_started) * 1000
+                    if name == "login":
+                        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return result
+
+
+def child(workdir: str, warmup: bool) -> None:
+    process_started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    prepare_env(workdir, STARTUP_WARMUP="1" if warmup else "0", **ENV)
+    result = asyncio.run(measure(process_started))
+    os.chdir(ROOT)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.workdir, args.products)
+        return
+    if args.child:
+        child(args.workdir, args.child == "warm")
+        return
+
+    def run(*extra):
+        return subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup_benchmark", *extra],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # seeded in its own process so the measured ones start with a cold pool and query cache
+        run("--seed", "--workdir", tmp, "--products", str(args.products))
+        results = {}
+        for mode in ("cold", "warm"):
+            runs = [json.loads(run("--child", mode, "--workdir", tmp).strip().splitlines()[-1])
+                    for _ in range(args.runs)]
+            results[mode] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+
+    print(f"median of {args.runs} fresh processes; cold = STARTUP_WARMUP=0, warm = STARTUP_WARMUP=1")
+    print(f"{'':<22}{'cold':>10}{'warm':>10}")
+    for key in results["cold"]:
+        print(f"{key:<22}{results['cold'][key]:>8.1f}ms{results['warm'][key]:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Settings are read at import, so point the app at a throwaway database first
+_tmp = tempfile.mkdtemp(prefix="ecommerce-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    SECRET_KEY="test-secret",
+    ADMIN_USERNAME="admin",
+    ADMIN_HASHED_PASSWORD="unused",
+    RATE_LIMIT_ENABLED="0",
+    STARTUP_WARMUP="0",
+    HASH_POOL_WORKERS="0",
+    BCRYPT_ROUNDS="4",
+    CART_STORE="sql",
+    GROUP_COMMIT_CHECKOUT="0",
+    ASYNC_DB=os.environ.get("ASYNC_DB", "0"),  # ASYNC_DB=1 pytest runs the suite on the async routes
+)
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import ASYNC_DB, SessionLocal, engine, get_async_engine
+from app.main import app
+from app.models import Product, User
+from app.product_cache import product_cache
+from app.routers.auth import create_access_token
+
+_names = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def cold_product_cache():
+    product_cache.clear()
+    yield
+    product_cache.clear()
+
+
+def make_products(db, count: int, price: float = 10.0, stock: int = 100) -> list[int]:
+    products = [Product(name=f"Product {next(_names)}", price=price, stock=stock) for _ in range(count)]
+    db.add_all(products)
+    db.commit()
+    return [product.id for product in products]
+
+
+def make_user(db) -> tuple[User, dict]:
+    """A new user and the Authorization header for it."""
+    name = f"user{next(_names)}"
+    user = User(username=name, email=f"{name}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user, {"Authorization": f"Bearer {create_access_token({'sub': name})}"}
+
+
+def admin_headers() -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': os.environ['ADMIN_USERNAME'], 'role': 'admin'})}"}
+
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements run on the app's engines inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [engine, get_async_engine().sync_engine] if ASYNC_DB else [engine]
+    for target in engines:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", record)
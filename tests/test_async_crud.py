@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from app import async_crud, crud
+from app.database import get_async_db
+from app.schemas import ProductUpdate
+from conftest import make_products
+
+
+def run_async(work):
+    async def main():
+        sessions = get_async_db()
+        db = await sessions.__anext__()
+        try:
+            return await work(db)
+        finally:
+            await sessions.aclose()
+
+    return asyncio.run(main())
+
+
+def test_async_writes_invalidate_the_product_cache(db):
+    product_id, = make_products(db, 1, price=10.0)
+    assert crud.get_product_cached(db, product_id)["price"] == 10.0
+
+    async def update(session):
+        product = await async_crud.get_product(session, product_id)
+        await async_crud.update_product(session, product, ProductUpdate(price=12.5))
+
+    run_async(update)
+    assert crud.get_product_cached(db, product_id)["price"] == 12.5
+
+    async def delete(session):
+        await async_crud.delete_product(session, await async_crud.get_product(session, product_id))
+
+    run_async(delete)
+    assert crud.get_product_cached(db, product_id) is None
@@ -0,0 +1,48 @@
+"""Catalog import/export, served in both ASYNC_DB modes."""
+import json
+from datetime import datetime
+
+from app import bulk
+from conftest import admin_headers, make_products, make_user
+
+
+def test_import_then_export(client):
+    body = "\n".join(json.dumps({"name": f"Imported {i}", "price": 5.0 + i, "stock": i}) for i in range(3))
+    body += '\n{"name": "", "price": -1}\n'
+    response = client.post("/products/import", content=body, headers={
+        **admin_headers(), "Content-Type": "application/x-ndjson",
+    })
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["inserted"], result["failed"]) == (3, 1)
+    assert result["errors"][0]["line"] == 4
+
+    exported = client.get("/products/export", headers=admin_headers())
+    assert exported.status_code == 200
+    rows = [json.loads(line) for line in exported.text.splitlines()]
+    assert {row["name"]: row["stock"] for row in rows if row["name"].startswith("Imported")} == {
+        "Imported 0": 0, "Imported 1": 1, "Imported 2": 2,
+    }
+
+
+def test_order_export(client, db):
+    user, headers = make_user(db)
+    [product_id] = make_products(db, 1)
+    client.post("/cart/", json={"product_id": product_id, "quantity": 2}, headers=headers)
+    order_id = client.post("/orders/place_order", headers=headers).json()["id"]
+
+    exported = client.get("/orders/export", params={"user_id": user.id}, headers=admin_headers())
+    assert exported.status_code == 200
+    [order] = [json.loads(line) for line in exported.text.splitlines()]
+    assert order["id"] == order_id
+    assert [(item["product_id"], item["quantity"]) for item in order["items"]] == [(product_id, 2)]
+    assert datetime.fromisoformat(order["created_at"]).isoformat() == order["created_at"]
+
+    csv_export = client.get("/orders/export", params={"user_id": user.id, "format": "csv"}, headers=admin_headers())
+    assert csv_export.text.splitlines()[1].startswith(f"{order_id},{user.id},")
+
+
+def test_ndjson_lines_use_the_app_encoder():
+    created = datetime(2024, 5, 1, 12, 30)
+    [line] = b"".join(bulk.ndjson_lines([{"id": 1, "created_at": created}])).splitlines()
+    assert json.loads(line) == {"id": 1, "created_at": "2024-05-01T12:30:00"}
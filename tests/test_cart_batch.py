@@ -0,0 +1,25 @@
+"""POST /cart/batch: an add without a quantity adds one unit, an explicit quantity is taken as given."""
+import pytest
+
+from app.cart_store import MemoryCarts, WriteBehindCartStore, get_cart_store, set_cart_store
+from conftest import make_products, make_user
+
+
+@pytest.fixture(params=["sql", "memory"])
+def cart_store(request):
+    previous = get_cart_store()
+    set_cart_store(WriteBehindCartStore(MemoryCarts(1000)) if request.param == "memory" else None)
+    yield
+    set_cart_store(previous)
+
+
+def test_add_quantities(client, db, cart_store):
+    default, zero, three = make_products(db, 3)
+    _, headers = make_user(db)
+    response = client.post("/cart/batch", json={"operations": [
+        {"op": "add", "product_id": default},
+        {"op": "add", "product_id": zero, "quantity": 0},
+        {"op": "add", "product_id": three, "quantity": 3},
+    ]}, headers=headers)
+    assert response.status_code == 200
+    assert {item["product_id"]: item["quantity"] for item in response.json()["items"]} == {default: 1, three: 3}
@@ -0,0 +1,35 @@
+"""Concurrent checkouts against the last units of stock never oversell."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models import Product
+from conftest import make_products, make_user
+
+BUYERS = 20
+STOCK = 5
+
+
+def test_parallel_place_order_sells_exactly_the_stock(client, db):
+    product_id, = make_products(db, 1, stock=STOCK)
+    buyers = []
+    for _ in range(BUYERS):
+        user, headers = make_user(db)
+        assert client.post("/cart/", json={"product_id": product_id, "quantity": 1}, headers=headers).status_code == 201
+        buyers.append(headers)
+
+    start = threading.Barrier(BUYERS)
+
+    def place_order(headers):
+        start.wait()
+        return client.post("/orders/place_order", headers=headers)
+
+    with ThreadPoolExecutor(max_workers=BUYERS) as pool:
+        responses = list(pool.map(place_order, buyers))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] * STOCK + [400] * (BUYERS - STOCK)
+    for response in responses:
+        if response.status_code == 400:
+            assert response.json()["detail"].startswith("Not enough stock")
+    db.expire_all()
+    assert db.get(Product, product_id).stock == 0
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from app.pagination import encode_cursor
+from conftest import admin_headers, make_products
+
+
+def page_of(product_ids) -> str:
+    return f"/products/?cursor={encode_cursor(product_ids[0] - 1)}&limit={len(product_ids)}"
+
+
+def test_list_pages_send_only_an_etag(client, db):
+    product_ids = make_products(db, 3)
+    response = client.get(page_of(product_ids))
+    assert "etag" in response.headers
+    assert "last-modified" not in response.headers
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(days=1), usegmt=True)
+    # If-Modified-Since alone can no longer produce a 304 for a list
+    assert client.get(page_of(product_ids), headers={"If-Modified-Since": future}).status_code == 200
+
+
+def test_list_etag_changes_when_a_product_is_deleted(client, db):
+    product_ids = make_products(db, 3)
+    etag = client.get(page_of(product_ids)).headers["etag"]
+    assert client.get(page_of(product_ids), headers={"If-None-Match": etag}).status_code == 304
+    assert client.delete(f"/products/{product_ids[1]}", headers=admin_headers()).status_code in (200, 204)
+    response = client.get(page_of(product_ids), headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert product_ids[1] not in [row["id"] for row in response.json()["items"]]
+
+
+def test_single_product_keeps_last_modified(client, db):
+    product_id, = make_products(db, 1)
+    response = client.get(f"/products/{product_id}")
+    assert "last-modified" in response.headers
+    headers = {"If-Modified-Since": response.headers["last-modified"]}
+    assert client.get(f"/products/{product_id}", headers=headers).status_code == 304
@@ -0,0 +1,10 @@
+from app.database import async_url
+
+
+def test_async_url_follows_database_url():
+    assert async_url("sqlite:////tmp/shop/main.db") == "sqlite+aiosqlite:////tmp/shop/main.db"
+    assert async_url("postgresql+psycopg2://shop:s%40cret@db/shop") == "postgresql+asyncpg://shop:s%40cret@db/shop"
+
+
+def test_async_url_keeps_unknown_backends():
+    assert async_url("mssql+pyodbc://db/shop") == "mssql+pyodbc://db/shop"
@@ -0,0 +1,52 @@
+"""Units held in flash-sale escrow still count as stock in product reads."""
+import pytest
+
+from app.flash_sale import flash_sale
+from app.models import Product
+from app.pagination import encode_cursor
+from conftest import admin_headers, make_products, make_user
+
+
+@pytest.fixture
+def on_sale(db, monkeypatch):
+    monkeypatch.setattr(flash_sale, "chunk", 10)
+    [product_id] = make_products(db, 1, stock=100)
+    flash_sale.enable(product_id)
+    yield product_id
+    flash_sale.disable(product_id)
+
+
+def test_escrow_counts_as_stock(client, db, on_sale):
+    before = client.get(f"/products/{on_sale}")
+    _, headers = make_user(db)
+    assert client.post("/cart/", json={"product_id": on_sale, "quantity": 1}, headers=headers).status_code < 300
+    assert client.post("/orders/place_order", headers=headers).status_code == 200
+
+    assert db.get(Product, on_sale).stock == 90  # one chunk moved to escrow
+    detail = client.get(f"/products/{on_sale}")
+    assert detail.json()["stock"] == 99
+    assert "last-modified" not in detail.headers
+    assert detail.headers["etag"] != before.headers["etag"]
+    listed = client.get("/products/", params={"cursor": encode_cursor(on_sale - 1), "limit": 1})
+    assert listed.json()["items"][0]["stock"] == 99
+
+    # the next sale comes out of escrow: the row stays put, the read and the ETag move
+    _, headers = make_user(db)
+    client.post("/cart/", json={"product_id": on_sale, "quantity": 1}, headers=headers)
+    assert client.post("/orders/place_order", headers=headers).status_code == 200
+    assert client.get(f"/products/{on_sale}", headers={"If-None-Match": detail.headers["etag"]}).json()["stock"] == 98
+
+    flash_sale.disable(on_sale)
+    db.expire_all()
+    assert db.get(Product, on_sale).stock == 98
+
+
+def test_admin_routes(client, db):
+    [product_id] = make_products(db, 1, stock=100)
+    enabled = client.post(f"/products/{product_id}/flash_sale", headers=admin_headers())
+    assert enabled.status_code == 200
+    assert enabled.json()["escrow"] == 0
+    assert str(product_id) in client.get("/products/flash_sale", headers=admin_headers()).json()["products"]
+    assert client.delete(f"/products/{product_id}/flash_sale", headers=admin_headers()).status_code == 204
+    assert not flash_sale.is_active(product_id)
+    assert client.post("/products/999999/flash_sale", headers=admin_headers()).status_code == 404
@@ -0,0 +1,84 @@
+"""Group-commit checkout writer (app.group_commit)."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import group_commit
+from app.flash_sale import flash_sale
+from app.group_commit import FAILED, PLACED, QUEUED, get_writer
+from app.models import Order, Product
+from app.routers import async_routes, orders
+from conftest import make_products, make_user
+
+BUYERS = 12
+STOCK = 5
+
+
+def new_ticket(user_id: int) -> dict:
+    return {"ticket": f"t{user_id}", "user_id": user_id, "status": group_commit.QUEUED,
+            "order_id": None, "detail": None, "status_code": None}
+
+
+def test_failure_after_commit_keeps_the_orders(client, db, monkeypatch):
+    monkeypatch.setattr(flash_sale, "chunk", 10)
+    [product_id] = make_products(db, 1, stock=100)
+    flash_sale.enable(product_id)
+    try:
+        user, headers = make_user(db)
+        client.post("/cart/", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+        class BrokenCache:
+            def on_product_changed(self, *product_ids):
+                raise RuntimeError("cache unavailable")
+
+        monkeypatch.setattr(group_commit, "product_cache", BrokenCache())
+        ticket = new_ticket(user.id)
+        get_writer().process([ticket])
+
+        assert ticket["status"] == PLACED
+        assert db.query(Order).filter(Order.user_id == user.id).count() == 1
+        assert flash_sale.escrowed(product_id) == 9  # the sold unit stays sold
+    finally:
+        flash_sale.disable(product_id)
+
+
+def test_queued_checkouts_sell_exactly_the_stock(client, db, monkeypatch):
+    monkeypatch.setattr(orders, "GROUP_COMMIT_CHECKOUT", True)
+    monkeypatch.setattr(async_routes, "GROUP_COMMIT_CHECKOUT", True)
+    [product_id] = make_products(db, 1, stock=STOCK)
+    buyers = []
+    for _ in range(BUYERS):
+        user, headers = make_user(db)
+        assert client.post("/cart/", json={"product_id": product_id, "quantity": 1}, headers=headers).status_code == 201
+        buyers.append(headers)
+
+    writer = get_writer()
+    writer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=BUYERS) as pool:
+            responses = list(pool.map(lambda headers: client.post("/orders/place_order", headers=headers), buyers))
+        assert [response.status_code for response in responses] == [202] * BUYERS
+
+        tickets = []
+        deadline = time.monotonic() + 10
+        for headers, response in zip(buyers, responses):
+            while True:
+                ticket = client.get(f"/orders/checkout/{response.json()['ticket']}", headers=headers).json()
+                if ticket["status"] != QUEUED or time.monotonic() > deadline:
+                    break
+                time.sleep(0.01)
+            tickets.append(ticket)
+    finally:
+        writer.shutdown()
+
+    statuses = [ticket["status"] for ticket in tickets]
+    assert statuses.count(PLACED) == STOCK
+    assert statuses.count(FAILED) == BUYERS - STOCK
+    db.expire_all()
+    assert db.get(Product, product_id).stock == 0
+    for headers, ticket in zip(buyers, tickets):
+        cart = client.get("/cart/", headers=headers).json()
+        if ticket["status"] == PLACED:
+            assert ticket["order_id"] is not None and cart == []
+        else:
+            assert ticket["detail"].startswith("Not enough stock")
+            assert [(line["product_id"], line["quantity"]) for line in cart] == [(product_id, 1)]
@@ -0,0 +1,104 @@
+"""Idempotency-Key replays the first response instead of repeating the write."""
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from app import async_crud, crud
+from app.idempotency import idempotency_store
+from app.models import Order, Product
+from conftest import make_products, make_user
+
+
+def add(client, headers, product_id, quantity=1, key="add-1"):
+    return client.post(
+        "/cart/", json={"product_id": product_id, "quantity": quantity},
+        headers={**headers, "Idempotency-Key": key},
+    )
+
+
+def cart_quantity(client, headers, product_id):
+    return {row["product_id"]: row["quantity"] for row in client.get("/cart/", headers=headers).json()}[product_id]
+
+
+def test_retry_replays_the_first_response(client, db):
+    user, headers = make_user(db)
+    [product_id] = make_products(db, 1)
+    first = add(client, headers, product_id)
+    retry = add(client, headers, product_id)
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert cart_quantity(client, headers, product_id) == 1
+
+
+def test_key_reused_with_a_different_body(client, db):
+    user, headers = make_user(db)
+    [product_id] = make_products(db, 1)
+    assert add(client, headers, product_id).status_code == 201
+    assert add(client, headers, product_id, quantity=2).status_code == 422
+    assert cart_quantity(client, headers, product_id) == 1
+
+
+def test_order_retry_places_one_order(client, db):
+    user, headers = make_user(db)
+    [product_id] = make_products(db, 1, stock=5)
+    client.post("/cart/", json={"product_id": product_id, "quantity": 2}, headers=headers)
+    keyed = {**headers, "Idempotency-Key": "order-1"}
+    first = client.post("/orders/place_order", headers=keyed)
+    retry = client.post("/orders/place_order", headers=keyed)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert db.query(Order).filter(Order.user_id == user.id).count() == 1
+    assert db.get(Product, product_id).stock == 3
+
+
+def test_duplicate_waits_for_the_request_in_flight(client, db, monkeypatch):
+    user, headers = make_user(db)
+    [product_id] = make_products(db, 1)
+    calls, release, duplicate_waiting = [], threading.Event(), threading.Event()
+
+    add_cart_item, async_add_cart_item = crud.add_cart_item, async_crud.add_cart_item
+
+    def slow_add(*args):
+        calls.append(args)
+        release.wait(5)
+        return add_cart_item(*args)
+
+    async def slow_async_add(*args):
+        calls.append(args)
+        await run_in_threadpool(release.wait, 5)
+        return await async_add_cart_item(*args)
+
+    claim = idempotency_store._claim
+
+    def watched_claim(key, fingerprint):
+        entry, owner = claim(key, fingerprint)
+        if not owner:
+            duplicate_waiting.set()
+        return entry, owner
+
+    monkeypatch.setattr(crud, "add_cart_item", slow_add)
+    monkeypatch.setattr(async_crud, "add_cart_item", slow_async_add)
+    monkeypatch.setattr(idempotency_store, "_claim", watched_claim)
+
+    responses = []
+    first = threading.Thread(target=lambda: responses.append(add(client, headers, product_id, key="slow")))
+    first.start()
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    duplicate = threading.Thread(target=lambda: responses.append(add(client, headers, product_id, key="slow")))
+    duplicate.start()
+    assert duplicate_waiting.wait(5)
+    release.set()
+    first.join(5)
+    duplicate.join(5)
+
+    assert len(calls) == 1
+    assert [response.status_code for response in responses] == [201, 201]
+    assert responses[0].json() == responses[1].json()
+    assert sorted(response.headers.get("Idempotent-Replayed", "") for response in responses) == ["", "true"]
+    assert cart_quantity(client, headers, product_id) == 1
@@ -0,0 +1,45 @@
+"""Product cache: a value read before an invalidation never outlives it."""
+import threading
+import time
+
+from app.cache import MISSING
+from app.product_cache import ProductCache
+from conftest import admin_headers
+
+
+def test_invalidation_during_put_wins():
+    cache = ProductCache(100, 100, ttl=60)
+    entered, proceed = threading.Event(), threading.Event()
+    real_set = cache.products.set
+
+    def slow_set(key, value):
+        entered.set()
+        proceed.wait(5)
+        real_set(key, value)
+
+    cache.products.set = slow_set
+    generation = cache.generation
+    put = threading.Thread(target=cache.put_product, args=({"id": 1, "stock": 5}, generation))
+    put.start()
+    assert entered.wait(5)
+    invalidate = threading.Thread(target=cache.on_product_changed, args=(1,))
+    invalidate.start()
+    time.sleep(0.05)  # let the invalidation reach the lock
+    proceed.set()
+    put.join(5)
+    invalidate.join(5)
+    assert cache.get_product(1) is MISSING
+
+
+def test_stale_generation_is_not_cached():
+    cache = ProductCache(100, 100, ttl=60)
+    generation = cache.generation
+    cache.on_product_changed(1)
+    cache.put_product({"id": 1, "stock": 5}, generation)
+    assert cache.get_product(1) is MISSING
+
+
+def test_stats_route(client):
+    response = client.get("/products/cache/stats", headers=admin_headers())
+    assert response.status_code == 200
+    assert set(response.json()) == {"products", "pages"}
@@ -0,0 +1,88 @@
+"""The cart, order and checkout endpoints run a fixed number of queries, whatever the number of rows."""
+import pytest
+
+from app.cart_store import MemoryCarts, WriteBehindCartStore, get_cart_store, set_cart_store
+from app.models import Order, OrderItem
+from app.product_cache import product_cache
+from conftest import admin_headers, count_queries, make_products, make_user
+
+
+@pytest.fixture(params=["sql", "memory"])
+def cart_store(request):
+    previous = get_cart_store()
+    store = WriteBehindCartStore(MemoryCarts(1000)) if request.param == "memory" else None
+    set_cart_store(store)
+    yield store
+    set_cart_store(previous)
+
+
+def fill_cart(client, headers, product_ids):
+    response = client.post(
+        "/cart/batch", json={"operations": [{"op": "add", "product_id": pid} for pid in product_ids]}, headers=headers
+    )
+    assert response.status_code == 200
+
+
+def make_orders(db, user, product_ids, orders: int):
+    for _ in range(orders):
+        db.add(Order(
+            user_id=user.id, total_price=10.0 * len(product_ids),
+            items=[OrderItem(product_id=pid, quantity=1, price=10.0) for pid in product_ids],
+        ))
+    db.commit()
+
+
+def queries(client, method, path, headers, **kwargs) -> int:
+    # a first call resolves the user into the principal cache and loads the cart into the store
+    client.get("/cart/", headers=headers)
+    product_cache.clear()
+    with count_queries() as statements:
+        response = client.request(method, path, headers=headers, **kwargs)
+    assert response.status_code < 300, response.text
+    return len(statements)
+
+
+def test_read_cart(client, db, cart_store):
+    counts = []
+    for size in (1, 20):
+        user, headers = make_user(db)
+        fill_cart(client, headers, make_products(db, size))
+        counts.append(queries(client, "GET", "/cart/", headers))
+        assert len(client.get("/cart/", headers=headers).json()) == size
+    assert counts[0] == counts[1]
+
+
+def test_cart_batch(client, db, cart_store):
+    counts = []
+    for size in (1, 30):
+        user, headers = make_user(db)
+        operations = [{"op": "add", "product_id": pid, "quantity": 2} for pid in make_products(db, size)]
+        counts.append(queries(client, "POST", "/cart/batch", headers, json={"operations": operations}))
+    assert counts[0] == counts[1]
+
+
+def test_user_orders(client, db):
+    counts = []
+    for orders, lines in ((1, 1), (10, 8)):
+        user, headers = make_user(db)
+        make_orders(db, user, make_products(db, lines), orders)
+        counts.append(queries(client, "GET", "/orders/user_orders", headers))
+        assert len(client.get("/orders/user_orders", headers=headers).json()) == orders
+    assert counts[0] == counts[1]
+
+
+def test_all_orders_for_admin(client, db):
+    user, _ = make_user(db)
+    make_orders(db, user, make_products(db, 1), 1)
+    before = queries(client, "GET", "/orders/user_orders", admin_headers())
+    make_orders(db, user, make_products(db, 8), 20)
+    assert queries(client, "GET", "/orders/user_orders", admin_headers()) == before
+
+
+def test_place_order(client, db, cart_store):
+    counts = []
+    for size in (1, 15):
+        user, headers = make_user(db)
+        fill_cart(client, headers, make_products(db, size))
+        counts.append(queries(client, "POST", "/orders/place_order", headers))
+    assert counts[0] == counts[1]
@@ -0,0 +1,53 @@
+"""Login limits are per username and IP and per IP, and the token is decoded once per request."""
+import pytest
+
+from app import ratelimit
+from app.routers import auth
+from conftest import make_user
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    previous = ratelimit.get_backend()
+    ratelimit.set_backend(ratelimit.InMemoryBackend(1000))
+    yield
+    ratelimit.set_backend(previous)
+
+
+def login(client, username):
+    return client.post("/login", data={"username": username, "password": "wrong"})
+
+
+def test_login_limit_is_per_username(client, limited):
+    statuses = [login(client, "alice").status_code for _ in range(11)]
+    assert statuses[:10] == [400] * 10
+    assert statuses[10] == 429
+    assert login(client, " Alice ").status_code == 429
+    assert login(client, "bob").status_code == 400
+
+
+def test_login_limit_per_ip_across_usernames(client, limited):
+    policy = ratelimit.IP_POLICIES[("POST", "/login")]
+    statuses = [login(client, f"stranger{i}").status_code for i in range(policy.count + 1)]
+    assert statuses[:-1] == [400] * policy.count
+    assert statuses[-1] == 429
+
+
+def test_oversized_login_body_rejected(client, limited):
+    response = client.post("/login", data={"username": "alice", "password": "x" * (ratelimit.RATE_LIMIT_MAX_BODY_BYTES + 1)})
+    assert response.status_code == 413
+
+
+def test_token_decoded_once(client, db, limited, monkeypatch):
+    _, headers = make_user(db)
+    calls = []
+    decode = auth.decode_access_token
+
+    def counting(token):
+        calls.append(token)
+        return decode(token)
+
+    monkeypatch.setattr(auth, "decode_access_token", counting)
+    assert client.get("/cart/", headers=headers).status_code == 200
+    assert len(calls) == 1
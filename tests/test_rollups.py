@@ -0,0 +1,41 @@
+"""Reports served from the incrementally kept rollups match a full rebuild."""
+from app import rollups
+from conftest import admin_headers, make_products, make_user
+
+REPORTS = [
+    ("/reports/sales/daily", {}),
+    ("/reports/sales/daily", {"status": "cancelled"}),
+    ("/reports/sales/status", {}),
+    ("/reports/products/top", {"limit": 100}),
+    ("/reports/products/top", {"limit": 100, "by": "revenue"}),
+]
+
+
+def reports(client):
+    responses = [client.get(path, params=params, headers=admin_headers()) for path, params in REPORTS]
+    assert all(response.status_code == 200 for response in responses)
+    return [response.json() for response in responses]
+
+
+def test_reports_match_rebuild(client, db):
+    rollups.rebuild(db)  # other tests insert orders directly, bypassing the rollups
+    cheap, dear = make_products(db, 1, price=2.5) + make_products(db, 1, price=40.0)
+    order_ids = []
+    for lines in ([(cheap, 3)], [(cheap, 1), (dear, 2)], [(dear, 1)]):
+        user, headers = make_user(db)
+        for product_id, quantity in lines:
+            client.post("/cart/", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+        response = client.post("/orders/place_order", headers=headers)
+        assert response.status_code == 200
+        order_ids.append(response.json()["id"])
+
+    for order_id, status in ((order_ids[0], "completed"), (order_ids[1], "cancelled")):
+        response = client.put(f"/orders/order/{order_id}/status", params={"status": status}, headers=admin_headers())
+        assert response.status_code == 200
+
+    incremental = reports(client)
+    top = {row["product_id"]: row for row in incremental[3]}
+    assert (top[cheap]["units"], top[dear]["units"]) == (3, 1)  # the cancelled order is left out
+
+    rollups.rebuild(db)
+    assert reports(client) == incremental
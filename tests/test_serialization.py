@@ -0,0 +1,15 @@
+import json
+from datetime import datetime
+
+from app import crud, serialization
+from conftest import make_products
+
+
+def test_product_rows_encode_without_orjson(db, monkeypatch):
+    make_products(db, 2)
+    rows = crud.get_product_rows(db, limit=2)
+    assert isinstance(rows[0]["updated_at"], datetime)
+    monkeypatch.setattr(serialization, "orjson", None)
+    decoded = json.loads(serialization.dumps(rows))
+    assert decoded[0]["updated_at"] == rows[0]["updated_at"].isoformat()
+    assert json.loads(json.dumps(rows, default=serialization.json_default)) == decoded